@@ -0,0 +1,46 @@
+"""Seeding helpers for benchmarks that need a local Postgres."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Reserved server ids (not valid Discord snowflakes) so benchmark rows never mix with real guilds
+BENCH_SERVER_ID = -4343
+
+
+async def connect(database_url: str):
+    """Connect the application's Database singleton (running its migrations) to `database_url`."""
+    os.environ['DATABASE_URL'] = database_url
+    from src.database import db
+    if db.pool is None or db.pool.is_closing():
+        await db.connect()
+    return db
+
+
+async def seed(db, users: int, days: int, server_id: int = BENCH_SERVER_ID):
+    """Insert `users` users with `days` daily rank_history rows each, ending today."""
+    await cleanup(db, server_id)
+    async with db.pool.acquire() as conn:
+        await conn.execute("""
+            INSERT INTO users (server_id, discord_id, riot_id, puuid)
+            SELECT $1, g, 'benchuser' || g || '#BNCH', 'OPGG:bench' || g
+            FROM generate_series(1, $2) AS g
+        """, server_id, users)
+        if days > 0:
+            await conn.execute("""
+                INSERT INTO rank_history (server_id, discord_id, riot_id, tier, rank, lp, wins, losses, games, fetch_date)
+                SELECT $1, u, 'benchuser' || u || '#BNCH',
+                       (ARRAY['SILVER','GOLD','PLATINUM','EMERALD'])[1 + (u + d) % 4],
+                       (ARRAY['IV','III','II','I'])[1 + (u * 3 + d) % 4],
+                       (u * 7 + d * 13) % 100, 100 + d, 90 + d / 2, 190 + d + d / 2,
+                       CURRENT_DATE - d
+                FROM generate_series(1, $2) AS u, generate_series(0, $3 - 1) AS d
+            """, server_id, users, days)
+
+
+async def cleanup(db, server_id: int = BENCH_SERVER_ID):
+    async with db.pool.acquire() as conn:
+        # rank_history rows go with their users (ON DELETE CASCADE)
+        await conn.execute("DELETE FROM users WHERE server_id = $1", server_id)
+        await conn.execute("DELETE FROM collection_runs WHERE server_id = $1", server_id)
+        await conn.execute("DELETE FROM fetch_jobs WHERE riot_id LIKE 'benchuser%#BNCH'")
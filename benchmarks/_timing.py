@@ -0,0 +1,37 @@
+"""Shared timing helpers for the benchmark suite."""
+import statistics
+import time
+
+
+def summarize(samples_s) -> dict:
+    samples_ms = [s * 1000 for s in samples_s]
+    return {
+        'best_ms': round(min(samples_ms), 4),
+        'median_ms': round(statistics.median(samples_ms), 4),
+        'mean_ms': round(statistics.fmean(samples_ms), 4),
+        'runs': len(samples_ms),
+    }
+
+
+def measure(func, *args, repeat: int = 5, warmup: int = 1, **kwargs) -> dict:
+    """Time a synchronous call `repeat` times after `warmup` untimed calls."""
+    for _ in range(warmup):
+        func(*args, **kwargs)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+async def measure_async(func, *args, repeat: int = 5, warmup: int = 1, **kwargs) -> dict:
+    """Async counterpart of measure()."""
+    for _ in range(warmup):
+        await func(*args, **kwargs)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await func(*args, **kwargs)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
@@ -0,0 +1,90 @@
+"""
+Benchmark `Scheduler.fetch_all_users_rank` with a stubbed OP.GG client.
+
+The stub answers instantly (or after a fixed simulated latency) without any
+network, so this measures the collection loop and its DB writes against a
+local Postgres. Per-user pacing sleeps are disabled.
+
+Usage: python benchmarks/bench_collection.py postgresql://localhost/lolanalyzer_bench [users] [latency_ms]
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _seed import BENCH_SERVER_ID, cleanup, connect, seed
+
+
+class StubOPGGClient:
+    """Stands in for the global OPGGClient with deterministic, network-free answers."""
+
+    def __init__(self, latency_ms: float = 0.0):
+        from src.utils.opgg_resilience import CircuitBreaker
+        self.latency = latency_ms / 1000
+        self.calls = 0
+        self.breaker = CircuitBreaker()
+
+    async def _wait(self):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+
+    async def get_summoner(self, name, tag, region=None):
+        await self._wait()
+        return SimpleNamespace(summoner_id=f"stub-{name}-{tag}")
+
+    async def renew_summoner(self, summoner):
+        await self._wait()
+        return True
+
+    async def get_rank_info(self, summoner):
+        await self._wait()
+        seed = sum(map(ord, summoner.summoner_id))
+        return ["SILVER", "GOLD", "PLATINUM"][seed % 3], ["IV", "III", "II", "I"][seed % 4], seed % 100, 100, 90
+
+    async def get_tier_history(self, summoner_id, region=None):
+        await self._wait()
+        return []
+
+
+async def run(database_url: str, users: int = 200, latency_ms: float = 0.0) -> dict:
+    db = await connect(database_url)
+    from src.cogs import scheduler as scheduler_module
+
+    stub = StubOPGGClient(latency_ms)
+    original_client = scheduler_module.opgg_client
+    original_pacing = scheduler_module.FETCH_INTERVAL_SECONDS, scheduler_module.RENEWAL_WAIT_SECONDS
+    scheduler_module.opgg_client = stub
+    scheduler_module.FETCH_INTERVAL_SECONDS = scheduler_module.RENEWAL_WAIT_SECONDS = 0
+    cog = scheduler_module.Scheduler(bot=None)
+    cog.fetch_queue.start()
+    try:
+        await seed(db, users, days=0)
+        started = time.perf_counter()
+        results = await cog.fetch_all_users_rank(server_id=BENCH_SERVER_ID)
+        elapsed = time.perf_counter() - started
+        return {
+            'users': users,
+            'latency_ms': latency_ms,
+            'elapsed_ms': round(elapsed * 1000, 2),
+            'per_user_ms': round(elapsed * 1000 / users, 3),
+            'opgg_calls': stub.calls,
+            'results': results,
+        }
+    finally:
+        await cog.fetch_queue.stop()
+        cog.scheduler.shutdown(wait=False)
+        scheduler_module.opgg_client = original_client
+        scheduler_module.FETCH_INTERVAL_SECONDS, scheduler_module.RENEWAL_WAIT_SECONDS = original_pacing
+        await cleanup(db)
+        await db.close()
+
+
+if __name__ == '__main__':
+    url = sys.argv[1]
+    n_users = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    print(json.dumps(asyncio.run(run(url, n_users, latency)), indent=2))
@@ -0,0 +1,65 @@
+"""
+Benchmark the Database history and report queries against a local Postgres
+seeded with N users x D days.
+
+Usage: python benchmarks/bench_db.py postgresql://localhost/lolanalyzer_bench [users] [days]
+"""
+import asyncio
+import json
+import os
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _seed import BENCH_SERVER_ID, cleanup, connect, seed
+from _timing import measure_async
+from src.utils import rank_history
+
+
+async def run(database_url: str, users: int = 50, days: int = 180, repeat: int = 5) -> dict:
+    db = await connect(database_url)
+    try:
+        await seed(db, users, days)
+        today = date.today()
+        server_users = await db.get_users_by_server(BENCH_SERVER_ID)
+        first = server_users[0]
+
+        async def graph_all(period_days):
+            start = today - timedelta(days=period_days)
+            for u in server_users:
+                await db.get_rank_history_for_graph(BENCH_SERVER_ID, u['discord_id'], u['riot_id'], start)
+
+        async def report_all(period_days):
+            start = today - timedelta(days=period_days)
+            for u in server_users:
+                await db.get_rank_history(BENCH_SERVER_ID, u['discord_id'], u['riot_id'], start, today)
+
+        async def server_history(period_days):
+            # What the graph and report paths do now: one query per server into column arrays
+            rows = await db.get_server_rank_history(BENCH_SERVER_ID, today - timedelta(days=period_days))
+            rank_history.group_rows(rows)
+
+        return {
+            'users': users,
+            'days': days,
+            'get_users_by_server': await measure_async(db.get_users_by_server, BENCH_SERVER_ID, repeat=repeat),
+            'history_single_user_180d': await measure_async(
+                db.get_rank_history, BENCH_SERVER_ID, first['discord_id'], first['riot_id'], today - timedelta(days=180), today, repeat=repeat),
+            'graph_all_users_7d': await measure_async(graph_all, 7, repeat=repeat),
+            'graph_all_users_180d': await measure_async(graph_all, 180, repeat=repeat),
+            'report_all_users_7d': await measure_async(report_all, 7, repeat=repeat),
+            'report_all_users_30d': await measure_async(report_all, 30, repeat=repeat),
+            'server_history_30d': await measure_async(server_history, 30, repeat=repeat),
+            'server_history_180d': await measure_async(server_history, 180, repeat=repeat),
+        }
+    finally:
+        await cleanup(db)
+        await db.close()
+
+
+if __name__ == '__main__':
+    url = sys.argv[1]
+    n_users = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    n_days = int(sys.argv[3]) if len(sys.argv) > 3 else 180
+    print(json.dumps(asyncio.run(run(url, n_users, n_days)), indent=2))
@@ -0,0 +1,73 @@
+"""
+Benchmark OP.GG response decoding: what aiohttp's `response.json()` does
+(bytes -> str -> stdlib json.loads) against the bytes-in decoders OPGGClient
+can be configured with, over the fixture payloads. The tier-history fixture is
+also replicated to approximate long account histories.
+
+Usage: python benchmarks/bench_json_decode.py [iterations]
+"""
+import glob
+import json
+import os
+import sys
+import time
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'opgg')
+
+
+def load_bodies() -> dict:
+    bodies = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, '*.json'))):
+        with open(path, 'rb') as f:
+            raw = f.read()
+        # Re-serialise compactly, as the API sends it
+        bodies[os.path.basename(path)] = json.dumps(json.loads(raw), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    history = json.loads(bodies['tier_history.json'])
+    for factor in (10, 50):
+        scaled = {"data": history["data"] * factor, "meta": {"total": len(history["data"]) * factor}}
+        bodies[f'tier_history.json x{factor}'] = json.dumps(scaled, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return bodies
+
+
+def aiohttp_style(body: bytes):
+    return json.loads(body.decode('utf-8'))
+
+
+def _decoders() -> dict:
+    decoders = {'stdlib_text': aiohttp_style, 'stdlib_bytes': json.loads}
+    try:
+        import orjson
+        decoders['orjson'] = orjson.loads
+    except ImportError:
+        pass
+    return decoders
+
+
+def _time_per_call(func, body, iterations, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func(body)
+        best = min(best, time.perf_counter() - start)
+    return best / iterations * 1e6
+
+
+def run(iterations: int = 2000) -> dict:
+    results = {}
+    decoders = _decoders()
+    for name, body in load_bodies().items():
+        # Large bodies get fewer iterations so the run stays short
+        n = max(20, iterations * 4096 // max(len(body), 4096))
+        results[name] = {'bytes': len(body)}
+        for decoder_name, decoder in decoders.items():
+            results[name][f'{decoder_name}_us'] = _time_per_call(decoder, body, n)
+    return results
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    for name, r in run(n).items():
+        timings = "  ".join(f"{k[:-3]} {v:.1f}us" for k, v in r.items() if k.endswith('_us'))
+        print(f"{name:28s} {r['bytes']:>8d}B  {timings}")
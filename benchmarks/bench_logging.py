@@ -0,0 +1,138 @@
+"""
+Per-user logging overhead of OPGGClient.get_rank_info, before and after the
+switch to level-gated lazy logging behind a QueueHandler.
+
+"before" replays the original call pattern: ~12 INFO f-strings per user
+(URL, status, payload keys, summoner sub-keys, per-stat keys and tier_info)
+written synchronously to a RotatingFileHandler. "after" replays the current
+pattern: the same dumps at DEBUG (skipped at INFO) plus one INFO result line,
+handed to a QueueListener thread.
+
+Usage: python benchmarks/bench_logging.py [users]
+"""
+import logging
+import os
+import queue
+import sys
+import tempfile
+import time
+from logging.handlers import QueueListener, RotatingFileHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.utils.log_queue import DeferredQueueHandler
+
+PAYLOAD = {
+    "summoner": {
+        "id": 123456, "summoner_id": "abcDEF123", "game_name": "テスト", "tagline": "JP1",
+        "level": 512, "profile_image_url": "https://opgg-static.akamaized.net/images/profile_icons/profileIcon1.jpg",
+        "updated_at": "2026-10-18T23:55:00+09:00",
+    },
+    "league_stats": [
+        {
+            "queue_info": {"id": 420, "queue_translate": "Ranked Solo/Duo", "game_type": "SOLORANKED"},
+            "tier_info": {"tier": "DIAMOND", "division": 2, "lp": 21, "level": None,
+                          "tier_image_url": "https://opgg-static.akamaized.net/images/medals/diamond_2.png"},
+            "win": 120, "lose": 98, "is_hot_streak": False, "is_fresh_blood": False, "is_veteran": False,
+        },
+        {
+            "queue_info": {"id": 440, "queue_translate": "Ranked Flex", "game_type": "FLEXRANKED"},
+            "tier_info": {"tier": "PLATINUM", "division": 1, "lp": 75, "level": None,
+                          "tier_image_url": "https://opgg-static.akamaized.net/images/medals/platinum_1.png"},
+            "win": 30, "lose": 25, "is_hot_streak": False, "is_fresh_blood": False, "is_veteran": False,
+        },
+    ],
+}
+URL = "https://lol-api-summoner.op.gg/api/jp/summoners/abcDEF123/summary"
+
+
+def before(logger):
+    profile_data = PAYLOAD
+    logger.info(f"Fetching rank info via aiohttp: {URL}")
+    logger.info(f"Rank info response status: {200}")
+    logger.info(f"Profile data keys: {list(profile_data.keys())}")
+    summoner_data = profile_data['summoner']
+    logger.info(f"summoner sub-keys: {list(summoner_data.keys())}")
+    stats = profile_data['league_stats']
+    logger.info(f"Found {len(stats)} league_stats entries")
+    for i, stat in enumerate(stats):
+        logger.info(f"Stat {i} keys: {list(stat.keys())}")
+        game_type = stat['queue_info']['game_type']
+        logger.info(f"Stat {i}: game_type='{game_type}', tier_info={stat.get('tier_info')}")
+        if game_type == 'SOLORANKED':
+            tier_info = stat['tier_info']
+            logger.info(f"tier_info keys: {list(tier_info.keys())}")
+            logger.info(f"Extracted: tier={tier_info['tier']}, division={tier_info['division']}, lp={tier_info['lp']}")
+            break
+    logger.info(f"Fetching rank for テスト#JP1 on 2026-10-18 (Server: 1)")
+    logger.info(f"Rank info for テスト#JP1: DIAMOND II 21LP (W:120 L:98)")
+
+
+def after(logger):
+    profile_data = PAYLOAD
+    debug = logger.isEnabledFor(logging.DEBUG)
+    logger.debug("Fetching rank info: url=%s", URL)
+    logger.debug("Rank info response: summoner_id=%s status=%s", "abcDEF123", 200)
+    if debug:
+        logger.debug("Profile data keys: %s", list(profile_data.keys()))
+        logger.debug("summoner sub-keys: %s", list(profile_data['summoner'].keys()))
+    stats = profile_data['league_stats']
+    logger.debug("Found %d league_stats entries", len(stats))
+    for i, stat in enumerate(stats):
+        game_type = stat['queue_info']['game_type']
+        if debug:
+            logger.debug("Stat %d: keys=%s game_type=%r tier_info=%s", i, list(stat.keys()), game_type, stat.get('tier_info'))
+        if game_type == 'SOLORANKED':
+            tier_info = stat['tier_info']
+            logger.debug("Extracted: tier=%s division=%s lp=%s", tier_info['tier'], tier_info['division'], tier_info['lp'])
+            break
+    logger.debug("Fetching rank for %s on %s (server_id=%s)", "テスト#JP1", "2026-10-18", 1)
+    logger.info("Rank info for %s: %s %s %sLP (W:%s L:%s)", "テスト#JP1", "DIAMOND", "II", 21, 120, 98)
+
+
+def _file_handler(log_dir):
+    handler = RotatingFileHandler(os.path.join(log_dir, 'bot.log'), maxBytes=5*1024*1024, backupCount=5, encoding='utf-8')
+    handler.setFormatter(logging.Formatter('[%(asctime)s] [%(levelname)-8s] %(name)s: %(message)s', datefmt='%Y-%m-%d %H:%M:%S'))
+    return handler
+
+
+def measure(pattern, logger, users):
+    start = time.perf_counter()
+    for _ in range(users):
+        pattern(logger)
+    return (time.perf_counter() - start) / users * 1e6
+
+
+def run(users: int = 5000) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as log_dir:
+        logger = logging.getLogger("bench.before")
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        handler = _file_handler(log_dir)
+        logger.addHandler(handler)
+        results['before_us_per_user'] = measure(before, logger, users)
+        logger.removeHandler(handler)
+        handler.close()
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        logger = logging.getLogger("bench.after")
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        handler = _file_handler(log_dir)
+        log_queue = queue.SimpleQueue()
+        listener = QueueListener(log_queue, handler)
+        listener.start()
+        logger.addHandler(DeferredQueueHandler(log_queue))
+        # Only the calling (event-loop) thread's cost is measured; the listener drains in the background
+        results['after_us_per_user'] = measure(after, logger, users)
+        listener.stop()
+        handler.close()
+
+    results['speedup'] = results['before_us_per_user'] / results['after_us_per_user']
+    return results
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    for key, value in run(n).items():
+        print(f"{key}: {value:.2f}")
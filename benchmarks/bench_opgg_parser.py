@@ -0,0 +1,93 @@
+"""
+Benchmark SummaryExtractor against the previous trial-and-error probing in
+OPGGClient.get_rank_info, over the summary payload fixtures.
+
+Usage: python benchmarks/bench_opgg_parser.py [iterations]
+"""
+import glob
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils.opgg_parser import SummaryExtractor, division_to_roman
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'opgg')
+
+
+def load_summary_fixtures():
+    fixtures = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, 'summary_*.json'))):
+        with open(path, encoding='utf-8') as f:
+            fixtures[os.path.basename(path)] = json.load(f)['data']
+    return fixtures
+
+
+def legacy_extract(profile_data):
+    """The probing logic get_rank_info used before SummaryExtractor (logging removed)."""
+    stats = profile_data.get('league_stats', [])
+    if not stats and 'summoner' in profile_data:
+        summoner_obj = profile_data.get('summoner', {})
+        stats = summoner_obj.get('league_stats', [])
+        if not stats and 'solo_tier_info' in summoner_obj:
+            tier_info = summoner_obj['solo_tier_info']
+            if tier_info:
+                tier = tier_info.get('tier', 'UNRANKED').upper()
+                division = tier_info.get('division') or tier_info.get('rank') or ""
+                return tier, division_to_roman(division), tier_info.get('lp', 0), 0, 0
+    for stat in stats:
+        queue_info = stat.get('queue_info', {})
+        game_type = queue_info.get('game_type', '').upper()
+        if not game_type:
+            game_type = stat.get('queue_type', '').upper()
+        if not game_type:
+            tier_info = stat.get('tier_info', {})
+            if isinstance(tier_info, dict):
+                game_type = tier_info.get('queue_type', '').upper()
+        if game_type in ['SOLORANKED', 'RANKED_SOLO_5X5', 'SOLO', 'RANKED_SOLO_5X5']:
+            tier_info = stat.get('tier_info') or stat
+            division = tier_info.get('division') or tier_info.get('rank') or ""
+            return (tier_info.get('tier', 'UNRANKED').upper(), division_to_roman(division),
+                    tier_info.get('lp', 0), stat.get('win', 0), stat.get('lose', 0))
+    for stat in stats:
+        tier_info = stat.get('tier_info')
+        if tier_info and isinstance(tier_info, dict):
+            tier = tier_info.get('tier', '').upper()
+            if tier and tier != 'UNRANKED':
+                division = tier_info.get('division') or tier_info.get('rank') or ""
+                return (tier, division_to_roman(division), tier_info.get('lp', 0),
+                        stat.get('win', 0), stat.get('lose', 0))
+    return "UNRANKED", "", 0, 0, 0
+
+
+def _time_per_call(func, payload, iterations, repeat=5):
+    # Best of several runs to keep scheduler noise out of sub-microsecond timings
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func(payload)
+        best = min(best, time.perf_counter() - start)
+    return best / iterations * 1e6
+
+
+def run(iterations: int = 50000) -> dict:
+    results = {}
+    for name, payload in load_summary_fixtures().items():
+        # A fresh extractor per fixture: steady state is one layout for a whole collection run
+        extractor = SummaryExtractor()
+        assert extractor.extract(payload) == legacy_extract(payload), name
+        results[name] = {
+            'legacy_us': _time_per_call(legacy_extract, payload, iterations),
+            'extractor_us': _time_per_call(extractor.extract, payload, iterations),
+            'layout': extractor.layout,
+        }
+    return results
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    for name, r in run(n).items():
+        print(f"{name:32s} legacy {r['legacy_us']:.3f}us  extractor {r['extractor_us']:.3f}us  (layout={r['layout']})")
@@ -0,0 +1,45 @@
+"""
+Benchmark the rank_calculator helpers used for every cell of a report.
+
+Usage: python benchmarks/bench_rank_calculator.py [rows]
+"""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _timing import measure
+from src.utils import rank_calculator
+
+TIERS = list(rank_calculator.TIER_ORDER)
+RANKS = list(rank_calculator.RANK_ORDER)
+NAMES = ["ソロランク練習中", "Faker", "ｻﾓﾅｰ名", "中文名字测试", "abcdefghijklmnop", "Ｆｕｌｌｗｉｄｔｈ"]
+
+
+def _entries(rows: int):
+    return [
+        {'tier': TIERS[i % len(TIERS)], 'rank': RANKS[i % len(RANKS)], 'lp': (i * 37) % 100}
+        for i in range(rows)
+    ]
+
+
+def run(rows: int = 5000, repeat: int = 5) -> dict:
+    entries = _entries(rows)
+    pairs = list(zip(entries, entries[1:]))
+    names = [NAMES[i % len(NAMES)] for i in range(rows)]
+
+    return {
+        'rows': rows,
+        'get_total_lp': measure(lambda: [rank_calculator.get_total_lp(e['tier'], e['rank'], e['lp']) for e in entries], repeat=repeat),
+        'format_rank_display': measure(lambda: [rank_calculator.format_rank_display(e['tier'], e['rank'], e['lp']) for e in entries], repeat=repeat),
+        'calculate_diff_text': measure(lambda: [rank_calculator.calculate_diff_text(a, b, include_prefix=False) for a, b in pairs], repeat=repeat),
+        'get_display_width': measure(lambda: [rank_calculator.get_display_width(n) for n in names], repeat=repeat),
+        'pad_string': measure(lambda: [rank_calculator.pad_string(n, 20) for n in names], repeat=repeat),
+    }
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    print(json.dumps(run(n), indent=2))
@@ -0,0 +1,86 @@
+"""
+Benchmark graph and report-image rendering (matplotlib, Pillow and text tables) at 1, 10 and 50 users,
+plus the cost of loading the bundled Japanese font in each renderer.
+
+Usage: python benchmarks/bench_render.py [days]
+"""
+import json
+import os
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _timing import measure
+from src.utils import graph_generator, rank_calculator, table_renderer
+from src.utils.rank_history import UserHistory
+
+USER_COUNTS = (1, 10, 50)
+TIERS = ["SILVER", "GOLD", "PLATINUM", "EMERALD"]
+RANKS = ["IV", "III", "II", "I"]
+
+
+def synthetic_history(users: int, days: int) -> dict:
+    today = date.today()
+    user_data = {}
+    for u in range(users):
+        riot_id = f"ユーザー{u}#JP1"
+        history = UserHistory(riot_id)
+        total = 1200 + u * 37
+        for d in range(days):
+            total = max(0, total + ((u * 7 + d * 13) % 41) - 20)
+            tier_idx = min(len(TIERS) - 1, max(0, total // 400 - 2))
+            history.append(today - timedelta(days=days - 1 - d), TIERS[tier_idx], RANKS[(total % 400) // 100],
+                           total % 100, 100 + d, 90 + d // 2)
+        user_data[riot_id] = history
+    return user_data
+
+
+def report_table(user_data: dict, shown_days: int = 5):
+    shown = next(iter(user_data.values())).dates()[-shown_days:]
+    headers = ["RIOT ID"] + [d.strftime("%m/%d") for d in shown] + ["前日比", "7日比", "戦績"]
+    data = []
+    for riot_id, history in user_data.items():
+        row = [riot_id.split('#')[0]]
+        row += [rank_calculator.format_rank_display(p.tier, p.rank, p.lp) for p in map(history.at, shown)]
+        row.append(rank_calculator.calculate_diff_text(history.point(-2), history.point(-1), include_prefix=False))
+        row.append(rank_calculator.calculate_diff_text(history.point(0), history.point(-1), include_prefix=False))
+        row.append("10戦6勝(60%)")
+        data.append(row)
+    col_widths = [0.15] + [0.08] * len(shown) + [0.25, 0.25, 0.1]
+    total = sum(col_widths)
+    return headers, data, [w / total for w in col_widths]
+
+
+def load_fonts():
+    """What a fresh process pays for the font: a FreeType face per renderer, measured with a short string."""
+    from matplotlib import ft2font
+    from PIL import ImageFont
+    for size in (table_renderer.FONT_SIZE, table_renderer.TITLE_SIZE):
+        ImageFont.truetype(table_renderer.FONT_PATH, size).getlength("日付ランクABC")
+    ft2font.FT2Font(table_renderer.FONT_PATH).set_text("日付ランクABC")
+
+
+def run(days: int = 30, repeat: int = 3) -> dict:
+    results = {'days': days}
+    results['font_load'] = measure(load_fonts, repeat=repeat)
+    for users in USER_COUNTS:
+        user_data = synthetic_history(users, days)
+        headers, data, col_widths = report_table(user_data)
+        results[f'graph_{users}u'] = measure(graph_generator.generate_rank_graph, user_data, 'daily', repeat=repeat)
+        # Long history: should cost about the same as a short one once downsampled
+        results[f'graph_monthly_{users}u'] = measure(
+            graph_generator.generate_rank_graph, synthetic_history(users, 180), 'monthly', repeat=repeat)
+        results[f'report_{users}u'] = measure(
+            graph_generator.generate_report_image, headers, data, "Rank Report", col_widths=col_widths, repeat=repeat)
+        results[f'report_pillow_{users}u'] = measure(
+            table_renderer.generate_report_image, headers, data, "Rank Report", col_widths=col_widths, repeat=repeat)
+        results[f'report_text_{users}u'] = measure(
+            lambda: rank_calculator.split_code_blocks(rank_calculator.format_text_table(headers, data)), repeat=repeat)
+    return results
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    print(json.dumps(run(n), indent=2))
@@ -0,0 +1,270 @@
+"""
+Local OP.GG stand-in for load testing the collector.
+
+Serves the four routes OPGGClient uses (search, summary, renewal, tier-history)
+under one host, so pointing the client at it is just `OPGG_BASE_URL` /
+`OPGGClient(base_url=...)`. Responses come from one of three sources:
+
+- synthetic (default): deterministic per-summoner data derived from the Riot ID
+- replay: recorded responses from a fixture directory (synthetic when missing,
+  or 404 with --strict)
+- record: proxy to the real OP.GG hosts and save every response as a fixture
+
+Latency, 5xx error rate, random 429s and a requests-per-second budget (429 with
+Retry-After once exceeded) are configurable. GET /_stats returns request counts.
+
+Usage:
+    python benchmarks/fake_opgg.py --port 8089 --latency-ms 80 --error-rate 0.01 --rps 50
+    python benchmarks/fake_opgg.py --record benchmarks/fixtures/recorded
+    python benchmarks/fake_opgg.py --replay benchmarks/fixtures/recorded --strict
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import aiohttp
+from aiohttp import web
+
+UPSTREAM = {
+    'search': 'https://lol-api-summoner.op.gg',
+    'summary': 'https://lol-api-summoner.op.gg',
+    'tier_history': 'https://lol-api-summoner.op.gg',
+    'renewal': 'https://lol-web-api.op.gg',
+}
+
+TIERS = ["IRON", "BRONZE", "SILVER", "GOLD", "PLATINUM", "EMERALD", "DIAMOND"]
+JST = timezone(timedelta(hours=9))
+
+
+@dataclass
+class FakeConfig:
+    latency_ms: float = 0.0
+    latency_jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    rps: float = 0.0
+    retry_after: float = 1.0
+    history_length: int = 60
+    seed: int = 0
+    record_dir: Optional[str] = None
+    replay_dir: Optional[str] = None
+    strict: bool = False
+
+
+def summoner_id_for(riot_id: str) -> str:
+    return hashlib.sha1(riot_id.encode('utf-8')).hexdigest()[:32]
+
+
+def _fixture_path(base_dir: str, route: str, key: str) -> str:
+    return os.path.join(base_dir, route, hashlib.sha1(key.encode('utf-8')).hexdigest()[:20] + '.json')
+
+
+class FakeOPGG:
+    def __init__(self, config: FakeConfig = None):
+        self.config = config or FakeConfig()
+        self.stats = Counter()
+        self._rng = random.Random(self.config.seed)
+        self._bucket_tokens = self.config.rps
+        self._bucket_updated = time.monotonic()
+        self._upstream: Optional[aiohttp.ClientSession] = None
+
+    # --- app wiring ---
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/api/v3/{region}/summoners', self._route('search', self._search))
+        app.router.add_get('/api/{region}/summoners/{summoner_id}/summary', self._route('summary', self._summary))
+        app.router.add_get('/api/{region}/summoners/{summoner_id}/tier-history', self._route('tier_history', self._tier_history))
+        app.router.add_post('/api/v1.0/internal/bypass/summoners/{region}/{summoner_id}/renewal', self._route('renewal', self._renewal))
+        app.router.add_get('/_stats', self._stats)
+        app.on_cleanup.append(self._close_upstream)
+        return app
+
+    async def _close_upstream(self, app):
+        if self._upstream:
+            await self._upstream.close()
+
+    def _take_token(self) -> bool:
+        if self.config.rps <= 0:
+            return True
+        now = time.monotonic()
+        self._bucket_tokens = min(self.config.rps, self._bucket_tokens + (now - self._bucket_updated) * self.config.rps)
+        self._bucket_updated = now
+        if self._bucket_tokens >= 1:
+            self._bucket_tokens -= 1
+            return True
+        return False
+
+    def _route(self, name, handler):
+        async def wrapped(request):
+            cfg = self.config
+            if cfg.latency_ms or cfg.latency_jitter_ms:
+                delay = cfg.latency_ms + self._rng.uniform(-cfg.latency_jitter_ms, cfg.latency_jitter_ms)
+                await asyncio.sleep(max(0.0, delay) / 1000)
+
+            if not self._take_token() or self._rng.random() < cfg.rate_limit_rate:
+                response = web.json_response({"error": "Too Many Requests"}, status=429,
+                                             headers={"Retry-After": f"{cfg.retry_after:g}"})
+            elif self._rng.random() < cfg.error_rate:
+                response = web.json_response({"error": "Internal Server Error"}, status=self._rng.choice([500, 502, 503]))
+            elif cfg.record_dir:
+                response = await self._proxy_and_record(name, request)
+            else:
+                key = self._key(name, request)
+                response = self._replay(name, key) if cfg.replay_dir else None
+                if response is None:
+                    if cfg.replay_dir and cfg.strict:
+                        response = web.json_response({"error": "not recorded"}, status=404)
+                    else:
+                        response = await handler(request)
+            self.stats[f"{name} {response.status}"] += 1
+            return response
+        return wrapped
+
+    @staticmethod
+    def _key(name: str, request) -> str:
+        if name == 'search':
+            return request.query.get('riot_id', '')
+        return request.match_info['summoner_id']
+
+    async def _stats(self, request):
+        return web.json_response(dict(self.stats))
+
+    # --- record / replay ---
+
+    def _replay(self, name: str, key: str) -> Optional[web.Response]:
+        path = _fixture_path(self.config.replay_dir, name, key)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            saved = json.load(f)
+        return web.json_response(saved['body'], status=saved['status'])
+
+    async def _proxy_and_record(self, name: str, request) -> web.Response:
+        if self._upstream is None:
+            self._upstream = aiohttp.ClientSession()
+        url = UPSTREAM[name] + request.rel_url.path_qs
+        headers = {k: v for k, v in request.headers.items() if k.lower() in ('user-agent', 'accept', 'accept-language')}
+        async with self._upstream.request(request.method, url, headers=headers) as upstream:
+            status = upstream.status
+            try:
+                body = await upstream.json(content_type=None)
+            except Exception:
+                body = {"raw": await upstream.text()}
+        path = _fixture_path(self.config.record_dir, name, self._key(name, request))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"key": self._key(name, request), "status": status, "body": body}, f, ensure_ascii=False)
+        return web.json_response(body, status=status)
+
+    # --- synthetic responses ---
+
+    @staticmethod
+    def _profile(summoner_id: str):
+        seed = int(summoner_id[:8], 16)
+        tier = TIERS[seed % len(TIERS)]
+        return seed, tier, seed % 4 + 1, seed % 100
+
+    async def _search(self, request):
+        riot_id = request.query.get('riot_id', '')
+        if '#' not in riot_id:
+            return web.json_response({"data": []})
+        name, tag = riot_id.split('#', 1)
+        summoner_id = summoner_id_for(riot_id)
+        return web.json_response({"data": [{
+            "id": int(summoner_id[:7], 16),
+            "summoner_id": summoner_id,
+            "acct_id": summoner_id[:12],
+            "puuid": summoner_id * 2,
+            "game_name": name,
+            "tagline": tag,
+            "name": name,
+            "internal_name": name.lower(),
+            "profile_image_url": "https://opgg-static.akamaized.net/meta/images/profile_icons/profileIcon1.jpg",
+            "level": 100 + int(summoner_id[:3], 16) % 400,
+            "updated_at": datetime.now(JST).isoformat(),
+        }]})
+
+    async def _summary(self, request):
+        summoner_id = request.match_info['summoner_id']
+        seed, tier, division, lp = self._profile(summoner_id)
+        wins = 50 + seed % 150
+        return web.json_response({"data": {
+            "summoner": {"summoner_id": summoner_id, "level": 100 + seed % 400},
+            "league_stats": [
+                {"queue_info": {"id": 440, "game_type": "FLEXRANKED"},
+                 "tier_info": {"tier": TIERS[(seed >> 3) % len(TIERS)], "division": 2, "lp": 10},
+                 "win": 10, "lose": 12},
+                {"queue_info": {"id": 420, "game_type": "SOLORANKED"},
+                 "tier_info": {"tier": tier, "division": division, "lp": lp},
+                 "win": wins, "lose": wins - 5 + seed % 10},
+            ],
+        }})
+
+    async def _renewal(self, request):
+        return web.json_response({"data": {"message": "Renewal request accepted", "renewable_at": None}})
+
+    async def _tier_history(self, request):
+        summoner_id = request.match_info['summoner_id']
+        seed, tier, division, lp = self._profile(summoner_id)
+        rng = random.Random(seed)
+        start = datetime.now(JST) - timedelta(hours=12 * self.config.history_length)
+        entries = []
+        for i in range(self.config.history_length):
+            lp = max(0, min(99, lp + rng.randint(-20, 20)))
+            entries.append({
+                "tier_info": {"tier": tier, "division": division, "lp": lp},
+                "created_at": (start + timedelta(hours=12 * i)).isoformat(),
+            })
+        return web.json_response({"data": entries})
+
+
+async def start_fake_opgg(config: FakeConfig = None, host: str = '127.0.0.1', port: int = 0):
+    """Start the stand-in in the running loop. Returns (runner, fake, base_url)."""
+    fake = FakeOPGG(config)
+    runner = web.AppRunner(fake.make_app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, fake, f"http://{host}:{bound_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--latency-jitter-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with 5xx')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='fraction of requests answered with 429')
+    parser.add_argument('--rps', type=float, default=0.0, help='request budget per second; excess gets 429')
+    parser.add_argument('--retry-after', type=float, default=1.0)
+    parser.add_argument('--history-length', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=0)
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--record', metavar='DIR', help='proxy to OP.GG and save responses to DIR')
+    group.add_argument('--replay', metavar='DIR', help='serve responses recorded in DIR')
+    parser.add_argument('--strict', action='store_true', help='in replay mode, 404 for unrecorded requests')
+    args = parser.parse_args()
+
+    config = FakeConfig(
+        latency_ms=args.latency_ms, latency_jitter_ms=args.latency_jitter_ms,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, rps=args.rps,
+        retry_after=args.retry_after, history_length=args.history_length, seed=args.seed,
+        record_dir=args.record, replay_dir=args.replay, strict=args.strict,
+    )
+    print(f"Fake OP.GG on http://{args.host}:{args.port} (set OPGG_BASE_URL to this)")
+    web.run_app(FakeOPGG(config).make_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Load-test `Scheduler.fetch_all_users_rank` against the local OP.GG stand-in.
+
+Seeds N synthetic users under a reserved server_id in a local Postgres, starts
+benchmarks/fake_opgg.py in-process, points OPGGClient at it and runs the
+collection for that server with the per-user pacing sleeps disabled. The
+synthetic users (and their rank_history rows, via ON DELETE CASCADE) are
+removed afterwards.
+
+Usage:
+    python benchmarks/load_collector.py --database-url postgresql://localhost/lolanalyzer_load \\
+        --users 10000 --latency-ms 50 --error-rate 0.01 --rps 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_opgg import FakeConfig, start_fake_opgg
+
+LOAD_SERVER_ID = -4242
+
+
+async def run(args) -> dict:
+    runner, fake, base_url = await start_fake_opgg(FakeConfig(
+        latency_ms=args.latency_ms, latency_jitter_ms=args.latency_ms / 2,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, rps=args.rps,
+    ))
+    # Must be set before src modules create the global OPGGClient / connect the pool
+    os.environ['OPGG_BASE_URL'] = base_url
+    os.environ['DATABASE_URL'] = args.database_url
+
+    from src.database import db
+    from src.cogs import scheduler as scheduler_module
+
+    scheduler_module.FETCH_INTERVAL_SECONDS = 0
+    scheduler_module.RENEWAL_WAIT_SECONDS = 0
+
+    await db.connect()
+    try:
+        async with db.pool.acquire() as conn:
+            await conn.execute("DELETE FROM users WHERE server_id = $1", LOAD_SERVER_ID)
+            await conn.executemany(
+                "INSERT INTO users (server_id, discord_id, riot_id, puuid) VALUES ($1, $2, $3, $4)",
+                [(LOAD_SERVER_ID, i, f"loaduser{i}#LOAD", f"OPGG:load{i}") for i in range(args.users)]
+            )
+
+        cog = scheduler_module.Scheduler(bot=None)
+        cog.fetch_queue.start()
+        started = time.perf_counter()
+        results = await cog.fetch_all_users_rank(server_id=LOAD_SERVER_ID)
+        elapsed = time.perf_counter() - started
+        await cog.fetch_queue.stop()
+        cog.scheduler.shutdown(wait=False)
+
+        return {
+            'users': args.users,
+            'elapsed_s': round(elapsed, 2),
+            'users_per_s': round(args.users / elapsed, 1) if elapsed else None,
+            'results': results,
+            'upstream_requests': dict(fake.stats),
+        }
+    finally:
+        async with db.pool.acquire() as conn:
+            await conn.execute("DELETE FROM users WHERE server_id = $1", LOAD_SERVER_ID)
+            await conn.execute("DELETE FROM collection_runs WHERE server_id = $1", LOAD_SERVER_ID)
+            await conn.execute("DELETE FROM fetch_jobs WHERE riot_id LIKE 'loaduser%#LOAD'")
+        await db.close()
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', required=True, help='local Postgres used for the run')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--latency-ms', type=float, default=50.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--rps', type=float, default=0.0)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""
+Run the benchmark suite and write the results to JSON.
+
+Nothing here talks to Discord or OP.GG. The `db` and `collection` benchmarks
+need a local Postgres (--database-url or BENCH_DATABASE_URL) and are skipped
+without one; benchmarks whose dependencies are not installed are recorded as
+skipped rather than failing the run.
+
+Usage:
+    python benchmarks/run.py                               # all, -> benchmarks/results/<commit>.json
+    python benchmarks/run.py --only render rank_calculator --quick
+    python benchmarks/run.py --database-url postgresql://localhost/lolanalyzer_bench
+    python benchmarks/run.py --compare benchmarks/results/abc1234.json benchmarks/results/def5678.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import traceback
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+
+def _suite(args):
+    """name -> (needs_database, zero-arg callable)."""
+    quick = args.quick
+    url = args.database_url
+
+    def rank_calculator():
+        import bench_rank_calculator
+        return bench_rank_calculator.run(rows=500 if quick else 5000)
+
+    def render():
+        import bench_render
+        return bench_render.run(days=14 if quick else 30, repeat=1 if quick else 3)
+
+    def opgg_parser():
+        import bench_opgg_parser
+        return bench_opgg_parser.run(5000 if quick else 50000)
+
+    def json_decode():
+        import bench_json_decode
+        return bench_json_decode.run(200 if quick else 2000)
+
+    def logging_overhead():
+        import bench_logging
+        return bench_logging.run(500 if quick else 5000)
+
+    def database():
+        import bench_db
+        return asyncio.run(bench_db.run(url, users=10 if quick else 50, days=30 if quick else 180))
+
+    def collection():
+        import bench_collection
+        return asyncio.run(bench_collection.run(url, users=20 if quick else 200))
+
+    return {
+        'rank_calculator': (False, rank_calculator),
+        'render': (False, render),
+        'opgg_parser': (False, opgg_parser),
+        'json_decode': (False, json_decode),
+        'logging': (False, logging_overhead),
+        'db': (True, database),
+        'collection': (True, collection),
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except Exception:
+        return 'unknown'
+
+
+def run_suite(args) -> dict:
+    suite = _suite(args)
+    selected = args.only or list(suite)
+    report = {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'quick': args.quick,
+        },
+        'results': {},
+    }
+    for name in selected:
+        needs_db, bench = suite[name]
+        if needs_db and not args.database_url:
+            report['results'][name] = {'skipped': 'no --database-url / BENCH_DATABASE_URL'}
+            continue
+        print(f"running {name}...", file=sys.stderr)
+        try:
+            report['results'][name] = bench()
+        except ImportError as e:
+            report['results'][name] = {'skipped': f'missing dependency: {e}'}
+        except Exception as e:
+            traceback.print_exc()
+            report['results'][name] = {'error': repr(e)}
+    return report
+
+
+def _flatten(prefix, value, out):
+    if isinstance(value, dict):
+        for k, v in value.items():
+            _flatten(f"{prefix}.{k}" if prefix else k, v, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool) and ('_ms' in prefix or '_us' in prefix):
+        out[prefix] = value
+    return out
+
+
+def compare(old_path: str, new_path: str):
+    with open(old_path, encoding='utf-8') as f:
+        old = _flatten('', json.load(f)['results'], {})
+    with open(new_path, encoding='utf-8') as f:
+        new = _flatten('', json.load(f)['results'], {})
+    for key in sorted(old.keys() & new.keys()):
+        if old[key] == 0:
+            continue
+        ratio = new[key] / old[key]
+        flag = '  REGRESSION' if ratio > 1.10 else ('  improved' if ratio < 0.90 else '')
+        print(f"{key:70s} {old[key]:>12.3f} -> {new[key]:>12.3f}  x{ratio:.2f}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default=os.getenv('BENCH_DATABASE_URL'))
+    parser.add_argument('--only', nargs='+', choices=['rank_calculator', 'render', 'opgg_parser', 'json_decode', 'logging', 'db', 'collection'])
+    parser.add_argument('--quick', action='store_true', help='smaller inputs for a fast smoke run')
+    parser.add_argument('--output', help='result file (default: benchmarks/results/<commit>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two result files instead of running')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = run_suite(args)
+    output = args.output or os.path.join(BENCH_DIR, 'results', f"{report['meta']['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False, default=str)
+    print(f"wrote {output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -33,7 +33,96 @@ CREATE TABLE IF NOT EXISTS schedules (
     period_days INTEGER DEFAULT 7,
     status VARCHAR(50) DEFAULT 'ENABLED',
     output_type VARCHAR(50) DEFAULT 'table',
+    renderer VARCHAR(50) DEFAULT 'matplotlib',
     created_by BIGINT,
     reg_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     update_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
+
+-- Outside the migration block in src/database.py, which stops at its first failing step on migrated databases
+ALTER TABLE schedules ADD COLUMN IF NOT EXISTS renderer VARCHAR(50) DEFAULT 'matplotlib';
+
+CREATE TABLE IF NOT EXISTS collection_runs (
+    id SERIAL PRIMARY KEY,
+    server_id BIGINT,
+    fetch_date DATE NOT NULL,
+    backfill BOOLEAN DEFAULT FALSE,
+    status VARCHAR(50) DEFAULT 'RUNNING',
+    total INTEGER DEFAULT 0,
+    success INTEGER DEFAULT 0,
+    failed INTEGER DEFAULT 0,
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS collection_run_users (
+    run_id INTEGER REFERENCES collection_runs(id) ON DELETE CASCADE,
+    server_id BIGINT,
+    discord_id BIGINT,
+    riot_id VARCHAR(255),
+    status VARCHAR(50) DEFAULT 'PENDING',
+    attempts INTEGER DEFAULT 0,
+    update_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (run_id, server_id, discord_id, riot_id)
+);
+
+CREATE TABLE IF NOT EXISTS fetch_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    riot_id VARCHAR(255) NOT NULL,
+    fetch_date DATE NOT NULL,
+    backfill BOOLEAN DEFAULT FALSE,
+    -- A backfill was requested while the job was already running; it runs again as one when it finishes
+    rerun_backfill BOOLEAN DEFAULT FALSE,
+    priority INTEGER DEFAULT 50,
+    status VARCHAR(50) DEFAULT 'QUEUED',
+    attempts INTEGER DEFAULT 0,
+    available_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    locked_by VARCHAR(255),
+    locked_at TIMESTAMP,
+    error TEXT,
+    reg_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    update_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+ALTER TABLE fetch_jobs ADD COLUMN IF NOT EXISTS rerun_backfill BOOLEAN DEFAULT FALSE;
+
+CREATE UNIQUE INDEX IF NOT EXISTS fetch_jobs_active_summoner
+    ON fetch_jobs (riot_id, fetch_date) WHERE status IN ('QUEUED', 'RUNNING');
+CREATE INDEX IF NOT EXISTS fetch_jobs_claim
+    ON fetch_jobs (priority, id) WHERE status IN ('QUEUED', 'RUNNING');
+
+CREATE TABLE IF NOT EXISTS job_runs (
+    job_id VARCHAR(255) PRIMARY KEY,
+    last_run_at TIMESTAMPTZ NOT NULL,
+    update_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Bumped by every write to a server's users or rank_history (see BUMP_DATA_VERSION in src/database.py)
+CREATE TABLE IF NOT EXISTS server_data_versions (
+    server_id BIGINT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 1,
+    update_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Scheduled reports pre-rendered after the nightly collection, one row per render key.
+-- Valid only while data_version matches the server's current version.
+CREATE TABLE IF NOT EXISTS report_cache (
+    server_id BIGINT,
+    period_days INTEGER,
+    output_type VARCHAR(50),
+    renderer VARCHAR(50),
+    report_date DATE NOT NULL,
+    data_version BIGINT NOT NULL,
+    contents TEXT[] NOT NULL,
+    images BYTEA[] NOT NULL,
+    filenames TEXT[] NOT NULL,
+    update_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (server_id, period_days, output_type, renderer)
+);
+
+-- Small key/value state shared by all processes (e.g. the last synced command tree hash)
+CREATE TABLE IF NOT EXISTS bot_state (
+    key VARCHAR(255) PRIMARY KEY,
+    value TEXT,
+    update_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -2,44 +2,232 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.events import EVENT_JOB_SUBMITTED
+from apscheduler.triggers.cron import CronTrigger
 from src.database import db
 from src.utils import rank_calculator
 from src.utils.opgg_client import opgg_client
+from src.utils.opgg_resilience import OPGGUnavailable
+from src.utils.sharding import LeaderElection, shard_config
+from src.utils.fetch_queue import (
+    FetchQueue, PRIORITY_INTERACTIVE, PRIORITY_REPORT, PRIORITY_COLLECTION, PRIORITY_BACKFILL,
+)
 from src.utils.opgg_compat import Region, OPGG, IS_V2
-from src.utils.graph_generator import generate_rank_graph, generate_report_image
-from datetime import datetime, date, timedelta
+from src.utils.graph_generator import generate_rank_graph, get_report_renderer, REPORT_RENDERERS, DEFAULT_REPORT_RENDERER
+from src.utils import tracing, metrics, tier_history, image_encoding, rank_history
+from src.utils.backfill import BackfillRun, group_by_summoner
+from src.utils.report_fanout import ReportFanout, ReportMessage
+from datetime import datetime, date, timedelta, timezone
 import asyncio
 import io
+import os
+import time
 import logging
-from tabulate import tabulate
 
 logger = logging.getLogger(__name__)
 
+# Pacing between per-user OP.GG calls (seconds). Load tests against a local stand-in set these to 0.
+FETCH_INTERVAL_SECONDS = float(os.getenv('FETCH_INTERVAL_SECONDS', '1'))
+RENEWAL_WAIT_SECONDS = float(os.getenv('RENEWAL_WAIT_SECONDS', '2'))
+# Fetch-queue workers in this process; actual in-flight OP.GG requests are bounded by the client's adaptive limiter
+COLLECTION_CONCURRENCY = int(os.getenv('COLLECTION_CONCURRENCY', os.getenv('OPGG_MAX_CONCURRENCY', '4')))
+# Attempts per summoner, both per fetch job and per user within one checkpointed run
+COLLECTION_MAX_ATTEMPTS = 3
+# How long an interactive /fetch or a scheduled report waits for its queued fetches
+INTERACTIVE_FETCH_TIMEOUT = 120
+REPORT_FETCH_TIMEOUT = 900
+# Date columns in a `text` report; a code block wider than this wraps in most clients
+TEXT_REPORT_DATES = 1
+# Rows per INSERT when streaming a tier history into rank_history
+BACKFILL_BATCH_SIZE = int(os.getenv('BACKFILL_BATCH_SIZE', '500'))
+# /admin backfill: default parallel summoners and how often its progress message is edited
+BACKFILL_CONCURRENCY = min(max(int(os.getenv('BACKFILL_CONCURRENCY', '4')), 1), 16)
+BACKFILL_PROGRESS_INTERVAL = 5
+# Render every enabled schedule's report right after the nightly collection, so the job only uploads.
+# Pre-rendered reports show data up to that collection; any later write for the server falls back to refresh + render.
+REPORT_PRERENDER = os.getenv('REPORT_PRERENDER', '1') != '0'
+# Pause between pre-rendered reports, so they stay in the event loop's idle time
+PRERENDER_INTERVAL_SECONDS = float(os.getenv('PRERENDER_INTERVAL_SECONDS', '5'))
+# Stable scheduler job ids; job_runs rows are keyed by these
+COLLECTION_JOB_ID = "daily_rank_fetch"
+# How late a job may still start, both for a busy loop (APScheduler misfire grace)
+# and for catching up a run missed while the bot was down
+REPORT_MISFIRE_GRACE_SECONDS = int(os.getenv('REPORT_MISFIRE_GRACE_SECONDS', '3600'))
+COLLECTION_MISFIRE_GRACE_SECONDS = int(os.getenv('COLLECTION_MISFIRE_GRACE_SECONDS', str(6 * 3600)))
+# Unfinished runs older than this (by fetch_date) are abandoned instead of resumed at startup
+COLLECTION_RESUME_MAX_DAYS = int(os.getenv('COLLECTION_RESUME_MAX_DAYS', '1'))
+
+
+def report_job_id(schedule_id: int) -> str:
+    return f"report:{schedule_id}"
+
+
 class Scheduler(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.scheduler = AsyncIOScheduler()
+        self.scheduler.add_listener(self._on_job_submitted, EVENT_JOB_SUBMITTED)
         self.scheduler.start()
+        self.fetch_queue = FetchQueue(self.process_fetch_job, workers=COLLECTION_CONCURRENCY,
+                                      max_attempts=COLLECTION_MAX_ATTEMPTS)
+        # Global jobs run in one process only; see src/utils/sharding.py
+        self.leader = LeaderElection(on_elected=self.on_leader_elected)
+        # Startup and a leadership takeover can both recover at once; each kind runs one at a time
+        self._resume_lock = asyncio.Lock()
+        self._catch_up_lock = asyncio.Lock()
+        # Running /admin backfill tasks by scope (server_id, or None for global)
+        self._backfills = {}
+        # Scheduled reports due together share a render per (server, period, output type, renderer)
+        self.report_fanout = ReportFanout(self.render_scheduled_report, self.deliver_report)
+
+    def _on_job_submitted(self, event):
+        job = self.scheduler.get_job(event.job_id)
+        metrics.record_job_lag(job.name if job else event.job_id, event.scheduled_run_times)
 
     async def cog_load(self):
+        # Runs as a startup stage, so the gateway connects while the database comes up
+        self.bot.startup.stage('scheduler', self.initialize())
+
+    async def initialize(self):
+        await self.bot.startup.wait('database')
+        await self.leader.elect()
         await self.reload_schedules()
+        self.fetch_queue.start()
+        self._resume_task = asyncio.create_task(self.resume_collection_runs())
+        self._catch_up_task = asyncio.create_task(self.catch_up_missed_jobs())
+        # Started last, so a takeover (on_leader_elected) finds the jobs loaded
+        self.leader.start()
+
+    async def on_leader_elected(self):
+        """This process took over leadership after startup: finish the global work the previous leader left."""
+        logger.info("Took over as leader; resuming global collection runs and catching up the collection job")
+        await self.resume_collection_runs(global_only=True)
+        await self.catch_up_missed_jobs(job_ids={COLLECTION_JOB_ID})
+
+    async def cog_unload(self):
+        for task in self._backfills.values():
+            task.cancel()
+        await self.fetch_queue.stop()
+        await self.leader.stop()
+
+    async def run_global_collection(self, fetch_date: date = None):
+        """Nightly job entry point: every process schedules it, only the leader runs it."""
+        if not self.leader.is_leader:
+            logger.info("Skipping daily rank collection: another process holds the leader lock")
+            return
+        await db.record_job_run(COLLECTION_JOB_ID, datetime.now(timezone.utc))
+        fetch_date = fetch_date or date.today()
+        await self.fetch_all_users_rank(fetch_date=fetch_date)
+        # The reports cached here serve every process, so the leader renders all shards' schedules
+        self._prerender_task = asyncio.create_task(self.prerender_reports(fetch_date + timedelta(days=1)))
+
+    async def catch_up_missed_jobs(self, job_ids=None):
+        """Run, once, each job (of `job_ids`, or all) whose last fire time passed while the bot was down.
+
+        A job counts as missed when its trigger fired after the run recorded in
+        job_runs and the latest such fire time is still within the job's misfire
+        grace. Several missed fires coalesce into one run for that latest fire
+        time. Jobs never run before only get a baseline row.
+        """
+        async with self._catch_up_lock:
+            await self._catch_up_missed_jobs(job_ids)
+
+    async def _catch_up_missed_jobs(self, job_ids):
+        try:
+            last_runs = await db.get_job_runs()
+            now = datetime.now(timezone.utc)
+            for job in self.scheduler.get_jobs():
+                if job_ids is not None and job.id not in job_ids:
+                    continue
+                last_run = last_runs.get(job.id)
+                if last_run is None:
+                    await db.record_job_run(job.id, now)
+                    continue
+                missed = self._last_fire_time(job.trigger, last_run, now)
+                if missed is None:
+                    continue
+                if job.misfire_grace_time is not None and (now - missed).total_seconds() > job.misfire_grace_time:
+                    logger.warning(f"Job {job.id} missed its run at {missed} (outside the grace period, skipped)")
+                    await db.record_job_run(job.id, now)
+                    continue
+                logger.info(f"Catching up job {job.id} missed at {missed}")
+                if job.id == COLLECTION_JOB_ID:
+                    # Store it under the day it was meant for
+                    await self.run_global_collection(fetch_date=missed.date())
+                else:
+                    await job.func(*job.args, **job.kwargs)
+        except Exception as e:
+            logger.error(f"Failed to catch up missed jobs: {e}", exc_info=True)
+
+    @staticmethod
+    def _last_fire_time(trigger, last_run: datetime, now: datetime):
+        """The latest fire time of `trigger` after `last_run` and not after `now`, or None."""
+        fire = trigger.get_next_fire_time(None, last_run + timedelta(seconds=1))
+        if fire is None or fire > now:
+            return None
+        while True:
+            following = trigger.get_next_fire_time(fire, fire + timedelta(seconds=1))
+            if following is None or following > now:
+                return fire
+            fire = following
+
+    async def resume_collection_runs(self, global_only: bool = False):
+        """Finish collection runs interrupted by a restart (or a dead leader), for their original fetch_date."""
+        async with self._resume_lock:
+            await self._resume_collection_runs(global_only)
+
+    async def _resume_collection_runs(self, global_only: bool):
+        try:
+            # Read under the lock, so runs a concurrent resume just finished are not resumed again
+            runs = await db.get_unfinished_collection_runs()
+            oldest = date.today() - timedelta(days=COLLECTION_RESUME_MAX_DAYS)
+            for run in runs:
+                # Global runs belong to the leader, per-guild runs to the process owning the guild
+                if run['server_id'] is None and not self.leader.is_leader:
+                    continue
+                if run['server_id'] is not None and (global_only or not shard_config.owns_guild(run['server_id'])):
+                    continue
+                if run['fetch_date'] < oldest:
+                    logger.warning(f"Abandoning collection run {run['id']} for {run['fetch_date']} (too old to resume)")
+                    await db.finish_collection_run(run['id'], 'ABANDONED')
+                    continue
+                logger.info(f"Resuming collection run {run['id']} for {run['fetch_date']} (server_id={run['server_id']})")
+                await self.fetch_all_users_rank(backfill=run['backfill'], server_id=run['server_id'], resume_run=run)
+                report_date = run['fetch_date'] + timedelta(days=1)
+                if run['server_id'] is None and report_date >= date.today():
+                    # What run_global_collection would have done after the interrupted collection
+                    self._prerender_task = asyncio.create_task(self.prerender_reports(report_date))
+        except Exception as e:
+            logger.error(f"Failed to resume collection runs: {e}", exc_info=True)
+
+    def _sync_job(self, job_id: str, func, trigger: CronTrigger, args=(), misfire_grace_time: int = None, name: str = None) -> bool:
+        """Add or replace a job only if it is new or its trigger/args changed."""
+        job = self.scheduler.get_job(job_id)
+        if job and job.args == tuple(args) and str(job.trigger) == str(trigger):
+            return False
+        self.scheduler.add_job(
+            func, trigger, args=list(args), id=job_id, name=name or job_id,
+            replace_existing=True, coalesce=True, misfire_grace_time=misfire_grace_time
+        )
+        return True
 
     async def reload_schedules(self):
-        self.scheduler.remove_all_jobs()
-        
+        """Bring the scheduler in line with the schedules table, touching only jobs that changed."""
+        wanted = set()
+
         # 1. System-wide Rank Collection Job (Daily 23:55)
         # Records data for the current day
-        self.scheduler.add_job(
-            self.fetch_all_users_rank,
-            'cron',
-            hour=23,
-            minute=55,
-            second=0,
-            name="daily_rank_fetch"
+        wanted.add(COLLECTION_JOB_ID)
+        self._sync_job(
+            COLLECTION_JOB_ID,
+            self.run_global_collection,
+            CronTrigger(hour=23, minute=55, second=0),
+            misfire_grace_time=COLLECTION_MISFIRE_GRACE_SECONDS
         )
 
         # 2. User-defined Reporting Jobs
         schedules = await db.get_all_schedules()
+        changed = 0
         for s in schedules:
             sched_time = s['schedule_time']
             channel_id = s['channel_id']
@@ -48,16 +236,28 @@ class Scheduler(commands.Cog):
             
             if s['status'] != 'ENABLED':
                 continue
+            if not shard_config.owns_guild(server_id):
+                # Another process runs this guild's shard (and can see its channels)
+                continue
 
-            self.scheduler.add_job(
+            job_id = report_job_id(s['id'])
+            wanted.add(job_id)
+            changed += self._sync_job(
+                job_id,
                 self.run_daily_report,
-                'cron',
-                hour=sched_time.hour,
-                minute=sched_time.minute,
-                second=sched_time.second,
-                args=[server_id, channel_id, period_days, s['output_type']]
+                CronTrigger(hour=sched_time.hour, minute=sched_time.minute, second=sched_time.second),
+                args=[server_id, channel_id, period_days, s['output_type'], s['id'], s.get('renderer') or DEFAULT_REPORT_RENDERER],
+                misfire_grace_time=REPORT_MISFIRE_GRACE_SECONDS
             )
-        print(f"Loaded {len(schedules)} reporting schedules and set Fetch Job at 01:00.")
+
+        removed = 0
+        for job in self.scheduler.get_jobs():
+            if job.id not in wanted:
+                job.remove()
+                removed += 1
+        # Other processes own the remaining schedules, so only drop rows of deleted ones
+        await db.delete_job_runs([COLLECTION_JOB_ID] + [report_job_id(s['id']) for s in schedules])
+        logger.info(f"Schedules synced: {len(wanted) - 1} report jobs ({changed} added/updated, {removed} removed)")
 
     @app_commands.command(name="graph", description="指定したユーザーのランク推移をグラフで表示します")
     @app_commands.describe(
@@ -66,88 +266,84 @@ class Scheduler(commands.Cog):
         force_fetch="最新の履歴をOPGGから取得して更新するか (default: False)"
     )
     async def graph(self, interaction: discord.Interaction, riot_id: str, period: str = "daily", force_fetch: bool = False):
-        await interaction.response.defer()
+        with tracing.trace("/graph", guild=interaction.guild.id, riot_id=riot_id, period=period):
+            with tracing.span("discord.defer"):
+                await interaction.response.defer()
         
-        # Validate period
-        # Calculate start date
-        today_date = date.today()
-        if period == "daily":
-            start_date = today_date - timedelta(days=7)
-        elif period == "weekly":
-            start_date = today_date - timedelta(days=60)
-        else: # monthly
-            start_date = today_date - timedelta(days=180)
-
-        # "all" support
-        if riot_id.lower() == "all":
-            users = await db.get_users_by_server(interaction.guild.id)
-            if not users:
-                await interaction.followup.send("このサーバーに登録されているユーザーがいません。")
-                return
+            # Validate period
+            # Calculate start date
+            today_date = date.today()
+            if period == "daily":
+                start_date = today_date - timedelta(days=7)
+            elif period == "weekly":
+                start_date = today_date - timedelta(days=60)
+            else: # monthly
+                start_date = today_date - timedelta(days=180)
+
+            # "all" support
+            if riot_id.lower() == "all":
+                users = await db.get_users_by_server(interaction.guild.id)
+                if not users:
+                    await interaction.followup.send("このサーバーに登録されているユーザーがいません。")
+                    return
             
-            user_data = {}
-            for u in users:
-                rows = await db.get_rank_history_for_graph(interaction.guild.id, u['discord_id'], u['riot_id'], start_date)
-                if rows:
-                    user_data[u['riot_id']] = [dict(r) for r in rows]
+                histories = await self.load_server_history(interaction.guild.id, users, start_date)
+                user_data = {rid: h for rid, h in histories.items() if h}
             
-            if not user_data:
-                await interaction.followup.send("表示するデータがありません。")
-                return
+                if not user_data:
+                    await interaction.followup.send("表示するデータがありません。")
+                    return
                 
-            buf = generate_rank_graph(user_data, period, " (全員)")
-            if not buf:
-                await interaction.followup.send("グラフの生成に失敗しました。")
-                return
+                with tracing.span("render.graph"):
+                    buf = generate_rank_graph(user_data, period, " (全員)")
+                if not buf:
+                    await interaction.followup.send("グラフの生成に失敗しました。")
+                    return
             
-            file = discord.File(fp=buf, filename="all_rank_graph.png")
-            await interaction.followup.send(f"**全員** のランク推移 ({period})", file=file)
-            return
+                file = discord.File(fp=buf, filename=image_encoding.filename("all_rank_graph"))
+                with tracing.span("upload"):
+                    await interaction.followup.send(f"**全員** のランク推移 ({period})", file=file)
+                return
 
-        # Single user logic
-        # Find user in DB
-        user = await db.get_user_by_riot_id(interaction.guild.id, riot_id)
-        if not user:
-            await interaction.followup.send(f"ユーザー {riot_id} はこのサーバーに登録されていません。", ephemeral=True)
-            return
+            # Single user logic
+            # Find user in DB
+            user = await db.get_user_by_riot_id(interaction.guild.id, riot_id)
+            if not user:
+                await interaction.followup.send(f"ユーザー {riot_id} はこのサーバーに登録されていません。", ephemeral=True)
+                return
 
-        discord_id = user['discord_id']
+            discord_id = user['discord_id']
         
-        # Force fetch if requested
-        if force_fetch:
-            try:
-                # Need summoner object to get internal ID
-                name, tag = riot_id.split('#')
-                summoner = await opgg_client.get_summoner(name, tag, Region.JP)
-                if summoner:
-                    history = await opgg_client.get_tier_history(summoner.summoner_id, Region.JP)
-                    for entry in history:
-                        # Map OPGG history to rank_history
-                        h_date = entry['updated_at'].date()
-                        await db.add_rank_history(
-                            interaction.guild.id, discord_id, riot_id, 
-                            entry['tier'], entry['rank'], entry['lp'],
-                            0, 0, h_date
-                        )
-            except Exception as e:
-                print(f"Error during force fetch: {e}")
+            # Force fetch if requested
+            if force_fetch:
+                try:
+                    # Need summoner object to get internal ID
+                    name, tag = riot_id.split('#')
+                    summoner = await opgg_client.get_summoner(name, tag, Region.JP)
+                    if summoner:
+                        # A forced fetch re-reads OP.GG, so it also corrects days already stored
+                        await self.backfill_history([user], summoner.summoner_id, refresh=True)
+                except Exception as e:
+                    logger.warning(f"Force fetch for {riot_id} failed: {e}")
 
-        # Fetch data from DB
-        rows = await db.get_rank_history_for_graph(interaction.guild.id, discord_id, riot_id, start_date)
+            # Fetch data from DB
+            rows = await db.get_rank_history_for_graph(interaction.guild.id, discord_id, riot_id, start_date)
         
-        if not rows:
-            await interaction.followup.send("表示するデータがありません。(`/test fetch` でデータを取得してください)")
-            return
+            if not rows:
+                await interaction.followup.send("表示するデータがありません。(`/test fetch` でデータを取得してください)")
+                return
 
-        # Generate Graph
-        row_dicts = [dict(r) for r in rows]
-        buf = generate_rank_graph({riot_id: row_dicts}, period, f": {riot_id.split('#')[0]}")
-        if not buf:
-            await interaction.followup.send("グラフの生成に失敗しました。")
-            return
+            # Generate Graph
+            history = rank_history.UserHistory.from_rows(riot_id, rows)
+            with tracing.span("render.graph"):
+                buf = generate_rank_graph({riot_id: history}, period, f": {riot_id.split('#')[0]}")
+            if not buf:
+                await interaction.followup.send("グラフの生成に失敗しました。")
+                return
 
-        file = discord.File(fp=buf, filename="rank_graph.png")
-        await interaction.followup.send(f"**{riot_id}** のランク推移 ({period})", file=file)
+            file = discord.File(fp=buf, filename=image_encoding.filename("rank_graph"))
+            with tracing.span("upload"):
+                await interaction.followup.send(f"**{riot_id}** のランク推移 ({period})", file=file)
 
     # Schedule Command Group
     schedule_group = app_commands.Group(name="schedule", description="定期実行スケジュールを管理します")
@@ -165,13 +361,13 @@ class Scheduler(commands.Cog):
             t = s['schedule_time']
             t_str = t.strftime("%H:%M") if hasattr(t, 'strftime') else str(t)
             status_emoji = "✅" if s['status'] == 'ENABLED' else "❌"
-            msg += f"{status_emoji} ID: {s['id']} | 時間: {t_str} | Ch: <#{s['channel_id']}> | 期間: {s['period_days']}日 | 形式: {s['output_type']}\n"
+            msg += f"{status_emoji} ID: {s['id']} | 時間: {t_str} | Ch: <#{s['channel_id']}> | 期間: {s['period_days']}日 | 形式: {s['output_type']} ({s.get('renderer') or DEFAULT_REPORT_RENDERER})\n"
         
         await interaction.response.send_message(msg)
 
     @schedule_group.command(name="add", description="スケジュールを登録します")
     async def schedule_add(self, interaction: discord.Interaction):
-        await interaction.response.send_message("登録するスケジュールを入力してください。\n形式: `時間(HH:MM) チャンネル(ID/here) 期間(日) 出力形式(table/graph)`\n例: `21:00 here 7 graph`")
+        await interaction.response.send_message("登録するスケジュールを入力してください。\n形式: `時間(HH:MM) チャンネル(ID/here) 期間(日) 出力形式(table/graph/text) [描画方式(matplotlib/pillow)]`\n例: `21:00 here 7 graph`")
 
         def check(m):
             return m.author.id == interaction.user.id and m.channel.id == interaction.channel.id
@@ -182,13 +378,14 @@ class Scheduler(commands.Cog):
             await interaction.followup.send("タイムアウトしました。")
             return
 
-        time_str, channel_id, period_days, output_type, error = self.parse_schedule_input(msg.content, interaction.channel.id)
+        time_str, channel_id, period_days, output_type, renderer, error = self.parse_schedule_input(msg.content, interaction.channel.id)
         if error:
             await interaction.followup.send(error)
             return
 
         try:
-            await db.register_schedule(interaction.guild.id, time_str, channel_id, interaction.user.id, period_days, output_type)
+            await db.register_schedule(interaction.guild.id, time_str, channel_id, interaction.user.id, period_days, output_type,
+                                       renderer or DEFAULT_REPORT_RENDERER)
             await self.reload_schedules()
             await interaction.followup.send(f"スケジュール登録完了: {time_str} にチャンネル {channel_id} へ通知 ({period_days}日分, 形式: {output_type}) (サーバー: {interaction.guild.name})")
         except Exception as e:
@@ -236,7 +433,7 @@ class Scheduler(commands.Cog):
             return
 
         current_time = s['schedule_time'].strftime("%H:%M") if hasattr(s['schedule_time'], 'strftime') else str(s['schedule_time'])
-        await interaction.response.send_message(f"変更内容を入力してください (ID: {schedule_id})\n現在の設定: `{current_time}` <#{s['channel_id']}> `{s['period_days']} {s['output_type']}`\n形式: `時間 チャンネル 期間 形式` (例: `22:00 here 7 graph`)")
+        await interaction.response.send_message(f"変更内容を入力してください (ID: {schedule_id})\n現在の設定: `{current_time}` <#{s['channel_id']}> `{s['period_days']} {s['output_type']} {s.get('renderer') or DEFAULT_REPORT_RENDERER}`\n形式: `時間 チャンネル 期間 形式 [描画方式]` (例: `22:00 here 7 graph`)")
 
         def check(m):
             return m.author.id == interaction.user.id and m.channel.id == interaction.channel.id
@@ -247,13 +444,13 @@ class Scheduler(commands.Cog):
             await interaction.followup.send("タイムアウトしました。")
             return
 
-        time_str, channel_id, period_days, output_type, error = self.parse_schedule_input(msg.content, interaction.channel.id)
+        time_str, channel_id, period_days, output_type, renderer, error = self.parse_schedule_input(msg.content, interaction.channel.id)
         if error:
             await interaction.followup.send(error)
             return
 
         try:
-            await db.update_schedule(schedule_id, time_str, channel_id, period_days, output_type)
+            await db.update_schedule(schedule_id, time_str, channel_id, period_days, output_type, renderer or s.get('renderer') or DEFAULT_REPORT_RENDERER)
             await self.reload_schedules()
             await interaction.followup.send(f"スケジュールID {schedule_id} を更新しました。")
         except Exception as e:
@@ -264,7 +461,7 @@ class Scheduler(commands.Cog):
         msg = """
 **schedule コマンドの使い方**
 `/schedule show` : 現在登録されているスケジュールの一覧を表示します。
-`/schedule add` : 新しいスケジュールを登録します。対話形式で `時間 チャンネル 期間 形式` を入力します。
+`/schedule add` : 新しいスケジュールを登録します。対話形式で `時間 チャンネル 期間 形式 [描画方式]` を入力します。
 `/schedule edit schedule_id` : 指定したIDのスケジュールを変更します。
 `/schedule enable schedule_id` : スケジュールを有効化します。
 `/schedule disable schedule_id` : スケジュールを無効化します。
@@ -273,9 +470,15 @@ class Scheduler(commands.Cog):
 **形式について**
 `table`: 見やすい表形式で出力
 `graph`: 登録ユーザー全員の推移を1つのグラフで出力
+`text`: 画像を使わずテキストの表で出力（人数が多い場合は複数メッセージに分割）
+
+**描画方式について（省略可、`table` のみ）**
+`matplotlib`: 従来の描画（既定）
+`pillow`: 高速な描画。登録ユーザーが多いサーバー向け
 
 **入力形式の例**
 `21:00 here 7 table` : 毎日21時に、このチャンネルに、過去7日間のレポートを表で表示
+`21:00 here 7 table pillow` : 同上（高速な描画方式を使用）
 `09:30 1234567890 3 graph` : 毎日9:30に、チャンネルID 1234567890 に、過去3日間のレポートをグラフで表示
 """
         await interaction.response.send_message(msg)
@@ -283,36 +486,118 @@ class Scheduler(commands.Cog):
     @app_commands.command(name="fetch", description="指定したユーザーの現在のランク情報を取得してDBに登録します")
     @app_commands.describe(riot_id="対象ユーザーのRiot ID (例: Name#Tag) または 'all' で全ユーザー")
     async def fetch(self, interaction: discord.Interaction, riot_id: str):
-        await interaction.response.defer()
-        try:
-            if riot_id.lower() == "all":
-                results = await self.fetch_all_users_rank(server_id=interaction.guild.id)
-                await interaction.followup.send(f"✅ このサーバーの全ユーザーのランク情報を取得しました: 成功 {results['success']}, 失敗 {results['failed']} (合計 {results['total']})")
-                return
+        with tracing.trace("/fetch", guild=interaction.guild.id, riot_id=riot_id):
+            with tracing.span("discord.defer"):
+                await interaction.response.defer()
+            try:
+                if riot_id.lower() == "all":
+                    results = await self.fetch_all_users_rank(server_id=interaction.guild.id, priority=PRIORITY_REPORT)
+                    await interaction.followup.send(f"✅ このサーバーの全ユーザーのランク情報を取得しました: 成功 {results['success']}, 失敗 {results['failed']} (合計 {results['total']})")
+                    return
 
-            # Find user in DB
-            user = await db.get_user_by_riot_id(interaction.guild.id, riot_id)
-            if not user:
-                await interaction.followup.send(f"ユーザー `{riot_id}` はこのサーバーに登録されていません。`/user add` で登録してください。")
-                return
+                # Find user in DB
+                user = await db.get_user_by_riot_id(interaction.guild.id, riot_id)
+                if not user:
+                    await interaction.followup.send(f"ユーザー `{riot_id}` はこのサーバーに登録されていません。`/user add` で登録してください。")
+                    return
             
-            # Fetch and save current rank
-            success = await self.fetch_and_save_rank(user)
-            if success:
-                # Get the latest rank from DB to display
-                today = date.today()
-                history = await db.get_rank_history(user['server_id'], user['discord_id'], riot_id, today, today)
-                if history:
-                    h = history[0]
-                    rank_display = rank_calculator.format_rank_display(h['tier'], h['rank'], h['lp'])
-                    await interaction.followup.send(f"✅ `{riot_id}` のランク情報を取得しました: **{rank_display}**")
+                # Fetch and save current rank (ahead of any bulk work in the queue)
+                jobs = await self.fetch_queue.enqueue([riot_id], date.today(), PRIORITY_INTERACTIVE)
+                statuses = await self.fetch_queue.wait(jobs.values(), timeout=INTERACTIVE_FETCH_TIMEOUT)
+                success = all(st == 'DONE' for st in statuses.values())
+                if success:
+                    # Get the latest rank from DB to display
+                    today = date.today()
+                    history = await db.get_rank_history(user['server_id'], user['discord_id'], riot_id, today, today)
+                    if history:
+                        h = history[0]
+                        rank_display = rank_calculator.format_rank_display(h['tier'], h['rank'], h['lp'])
+                        await interaction.followup.send(f"✅ `{riot_id}` のランク情報を取得しました: **{rank_display}**")
+                    else:
+                        await interaction.followup.send(f"✅ `{riot_id}` のランク情報を取得しましたが、履歴の確認に失敗しました。")
+                elif 'PENDING' in statuses.values():
+                    # Still queued (e.g. OP.GG is throttling or down); the worker will store it when it gets through
+                    await interaction.followup.send(f"⏳ `{riot_id}` の取得は順番待ちです。OPGGの応答が遅れているため、しばらくしてから再度ご確認ください。")
                 else:
-                    await interaction.followup.send(f"✅ `{riot_id}` のランク情報を取得しましたが、履歴の確認に失敗しました。")
-            else:
-                await interaction.followup.send(f"❌ `{riot_id}` のランク情報取得に失敗しました。OPGGで見つからないか、エラーが発生しました。")
+                    await interaction.followup.send(f"❌ `{riot_id}` のランク情報取得に失敗しました。OPGGで見つからないか、エラーが発生しました。")
+            except Exception as e:
+                logger.error(f"Error in fetch command (Server: {interaction.guild.name}): {e}", exc_info=True)
+                await interaction.followup.send(f"実行中にエラーが発生しました: {e}")
+
+    # Admin Command Group
+    admin_group = app_commands.Group(
+        name="admin", description="管理者向けのコマンド",
+        default_permissions=discord.Permissions(administrator=True), guild_only=True
+    )
+
+    @admin_group.command(name="backfill", description="登録ユーザーのランク履歴をOPGGから過去分までまとめて取り込みます")
+    @app_commands.describe(
+        scope="対象範囲 (server: このサーバー, global: 全サーバー ※Botオーナーのみ)",
+        concurrency="同時に処理するサマナー数 (default: 4)",
+        dry_run="実行せず、対象人数とOPGGへのリクエスト数の見込みだけを表示する"
+    )
+    @app_commands.choices(scope=[
+        app_commands.Choice(name="server", value="server"),
+        app_commands.Choice(name="global", value="global"),
+    ])
+    async def admin_backfill(self, interaction: discord.Interaction, scope: str = "server",
+                             concurrency: app_commands.Range[int, 1, 16] = BACKFILL_CONCURRENCY, dry_run: bool = False):
+        with tracing.trace("/admin backfill", guild=interaction.guild.id, scope=scope, dry_run=dry_run):
+            if not interaction.user.guild_permissions.administrator:
+                await interaction.response.send_message("このコマンドは管理者専用です。", ephemeral=True)
+                return
+            if scope == "global" and not await self.bot.is_owner(interaction.user):
+                await interaction.response.send_message("全サーバーを対象にできるのはBotのオーナーのみです。", ephemeral=True)
+                return
+
+            server_id = None if scope == "global" else interaction.guild.id
+            running = self._backfills.get(server_id)
+            if running and not running.done():
+                await interaction.response.send_message("この範囲の取り込みは既に実行中です。", ephemeral=True)
+                return
+
+            users = await db.get_all_users() if server_id is None else await db.get_users_by_server(server_id)
+            # Days up to yesterday; today's row belongs to the regular collection
+            run = BackfillRun(server_id, group_by_summoner(users), concurrency, date.today(),
+                              max_attempts=COLLECTION_MAX_ATTEMPTS)
+            if dry_run or not run.total:
+                prefix = "🔍 **ドライラン**（取り込みは行いません）" if run.total else "対象のユーザーがいません。"
+                await interaction.response.send_message(f"{prefix}\n{run.estimate_text()}")
+                return
+
+            await interaction.response.send_message(f"📥 ランク履歴の取り込みを開始します。\n{run.estimate_text()}")
+            # A channel message, not the interaction followup: the interaction token expires after 15 minutes
+            progress = await interaction.channel.send(run.progress_text())
+            self._backfills[server_id] = asyncio.create_task(self._run_backfill(run, progress))
+
+    async def _run_backfill(self, run: BackfillRun, progress: discord.Message):
+        """Background body of /admin backfill: run it and keep its progress message current."""
+        async def update_progress():
+            while True:
+                await asyncio.sleep(BACKFILL_PROGRESS_INTERVAL)
+                try:
+                    await progress.edit(content=run.progress_text())
+                except discord.HTTPException as e:
+                    logger.warning(f"Failed to update backfill progress: {e}")
+
+        updater = asyncio.create_task(update_progress())
+        try:
+            with tracing.trace("job.admin_backfill", server_id=run.server_id, summoners=run.total):
+                await run.run(self.backfill_history)
+            text = run.progress_text()
+        except asyncio.CancelledError:
+            text = f"⚠️ 取り込みを中断しました。\n{run.progress_text()}"
+            raise
         except Exception as e:
-            logger.error(f"Error in fetch command (Server: {interaction.guild.name}): {e}", exc_info=True)
-            await interaction.followup.send(f"実行中にエラーが発生しました: {e}")
+            logger.error(f"Backfill failed: {e}", exc_info=True)
+            text = f"❌ 取り込み中にエラーが発生しました: {e}\n{run.progress_text()}"
+        finally:
+            updater.cancel()
+            try:
+                await progress.edit(content=text)
+            except Exception as e:
+                logger.warning(f"Failed to post backfill summary: {e}")
+            self._backfills.pop(run.server_id, None)
 
     @app_commands.command(name="report", description="指定した日数の集計結果を表示します")
     @app_commands.describe(
@@ -320,54 +605,60 @@ class Scheduler(commands.Cog):
         riot_id="特定のユーザーのみを表示する場合に指定 (例: Name#Tag)"
     )
     async def report(self, interaction: discord.Interaction, days: int = 7, riot_id: str = None):
-        await interaction.response.defer()
-        try:
-            if riot_id:
-                # Individual report (Image)
-                user = await db.get_user_by_riot_id(interaction.guild.id, riot_id)
-                if not user:
-                    await interaction.followup.send(f"ユーザー `{riot_id}` はこのサーバーに登録されていません。")
-                    return
+        with tracing.trace("/report", guild=interaction.guild.id, days=days):
+            with tracing.span("discord.defer"):
+                await interaction.response.defer()
+            try:
+                if riot_id:
+                    # Individual report (Image)
+                    user = await db.get_user_by_riot_id(interaction.guild.id, riot_id)
+                    if not user:
+                        await interaction.followup.send(f"ユーザー `{riot_id}` はこのサーバーに登録されていません。")
+                        return
                 
-                today = date.today()
-                buf = await self.generate_single_user_report(user, today, days)
-                if buf:
-                    file = discord.File(buf, filename=f"report_{riot_id.replace('#', '_')}.png")
-                    await interaction.followup.send(file=file)
+                    today = date.today()
+                    buf = await self.generate_single_user_report(user, today, days)
+                    if buf:
+                        file = discord.File(buf, filename=image_encoding.filename(f"report_{riot_id.replace('#', '_')}"))
+                        with tracing.span("upload"):
+                            await interaction.followup.send(file=file)
+                    else:
+                        await interaction.followup.send(f"`{riot_id}` の過去 {days} 日間のデータが見つかりませんでした。")
                 else:
-                    await interaction.followup.send(f"`{riot_id}` の過去 {days} 日間のデータが見つかりませんでした。")
-            else:
-                # All users report (Image)
-                users = await db.get_users_by_server(interaction.guild.id)
-                if not users:
-                    await interaction.followup.send("このサーバーに登録されているユーザーがいません。")
-                    return
+                    # All users report (Image)
+                    users = await db.get_users_by_server(interaction.guild.id)
+                    if not users:
+                        await interaction.followup.send("このサーバーに登録されているユーザーがいません。")
+                        return
 
-                today = date.today()
-                buf = await self.generate_report_image_payload(users, today, days)
+                    today = date.today()
+                    buf = await self.generate_report_image_payload(users, today, days)
                 
-                if buf:
-                    file = discord.File(fp=buf, filename="report.png")
-                    await interaction.followup.send(f"**過去 {days} 日間の集計結果**", file=file)
-                else:
-                    await interaction.followup.send("レポートの生成に失敗しました。")
-        except Exception as e:
-            logger.error(f"Error in report command (Server: {interaction.guild.name}): {e}", exc_info=True)
-            await interaction.followup.send(f"集計出力中にエラーが発生しました: {e}")
+                    if buf:
+                        file = discord.File(fp=buf, filename=image_encoding.filename("report"))
+                        with tracing.span("upload"):
+                            await interaction.followup.send(f"**過去 {days} 日間の集計結果**", file=file)
+                    else:
+                        await interaction.followup.send("レポートの生成に失敗しました。")
+            except Exception as e:
+                logger.error(f"Error in report command (Server: {interaction.guild.name}): {e}", exc_info=True)
+                await interaction.followup.send(f"集計出力中にエラーが発生しました: {e}")
 
     def parse_schedule_input(self, text: str, current_channel_id: int):
         parts = text.strip().split()
         if len(parts) < 4:
-            return None, None, None, None, "入力形式が正しくありません。`時間 チャンネル 期間 形式` の順で入力してください。(例: 21:00 here 7 graph)"
+            return None, None, None, None, None, "入力形式が正しくありません。`時間 チャンネル 期間 形式 [描画方式]` の順で入力してください。(例: 21:00 here 7 graph)"
         
         t_str = parts[0]
         c_str = parts[1]
         p_str = parts[2]
         o_str = parts[3].lower()
+        # Optional 5th token: table renderer; None keeps the current one on edit
+        r_str = parts[4].lower() if len(parts) > 4 else None
 
         # Validate Time
         if ':' not in t_str:
-             return None, None, None, None, "時間の形式が正しくありません (例: 21:00)"
+             return None, None, None, None, None, "時間の形式が正しくありません (例: 21:00)"
         
         # Validate Channel
         channel_id = None
@@ -381,130 +672,269 @@ class Scheduler(commands.Cog):
             if cid_str.isdigit():
                 channel_id = int(cid_str)
             else:
-                 return None, None, None, None, "チャンネルメンションの形式が正しくありません"
+                 return None, None, None, None, None, "チャンネルメンションの形式が正しくありません"
         else:
-             return None, None, None, None, "チャンネル指定が正しくありません ('here'、ID、またはチャンネル指定)"
+             return None, None, None, None, None, "チャンネル指定が正しくありません ('here'、ID、またはチャンネル指定)"
 
         # Validate Period
         if not p_str.isdigit():
-             return None, None, None, None, "期間（日数）は数値で入力してください"
+             return None, None, None, None, None, "期間（日数）は数値で入力してください"
         period_days = int(p_str)
 
         # Validate Output Type
-        if o_str not in ['table', 'graph']:
-            return None, None, None, None, "出力形式は `table` または `graph` を指定してください"
+        if o_str not in ['table', 'graph', 'text']:
+            return None, None, None, None, None, "出力形式は `table`、`graph` または `text` を指定してください"
+
+        # Validate Renderer
+        if r_str is not None and r_str not in REPORT_RENDERERS:
+            return None, None, None, None, None, "描画方式は `matplotlib` または `pillow` を指定してください"
+
+        return t_str, channel_id, period_days, o_str, r_str, None
+
+    async def fetch_all_users_rank(self, backfill: bool = False, server_id: int = None, resume_run=None, priority: int = None, fetch_date: date = None):
+        """Fetch current rank and optionally backfill history.
+
+        Each run is checkpointed in collection_runs / collection_run_users, so a run
+        cut short by a restart can be resumed (`resume_run`) without refetching the
+        users it already finished. The fetches themselves go through the fetch queue.
+        """
+        with tracing.trace("job.fetch_all_users_rank", backfill=backfill, server_id=server_id):
+            started = time.perf_counter()
+            if resume_run:
+                run_id = resume_run['id']
+                today = resume_run['fetch_date']
+            else:
+                today = fetch_date or date.today()
+                run_id = await db.create_collection_run(server_id, today, backfill)
+            logger.info(f"Starting rank collection run {run_id} for {today} (backfill={backfill}, server_id={server_id})...")
+
+            users = await db.get_pending_run_users(run_id, COLLECTION_MAX_ATTEMPTS)
+            priority = priority if priority is not None else (PRIORITY_BACKFILL if backfill else PRIORITY_COLLECTION)
+            jobs = await self.fetch_queue.enqueue((u['riot_id'] for u in users), today, priority, backfill)
+            # Progress rows are updated by the workers as each summoner's job finishes
+            statuses = await self.fetch_queue.wait(jobs.values())
+            if server_id is None:
+                await db.purge_fetch_jobs()
+            run = await db.finish_collection_run(run_id)
+
+            done = sum(1 for st in statuses.values() if st == 'DONE')
+            metrics.collection_run_seconds.labels('server' if server_id else 'global').observe(time.perf_counter() - started)
+            metrics.collection_users.labels('success').inc(done)
+            metrics.collection_users.labels('failed').inc(len(statuses) - done)
+            logger.info(f"Rank collection run {run_id} completed: {run['success']}/{run['total']} succeeded ({len(jobs)} summoners queued)")
+            # Report the whole run, including users finished before a restart
+            return {'total': run['total'], 'success': run['success'], 'failed': run['failed']}
+
+    async def process_fetch_job(self, job) -> bool:
+        """Fetch-queue handler: one OP.GG lookup per summoner, stored for every registration of it.
+
+        OPGGUnavailable propagates so the queue can requeue the job instead of failing it.
+        """
+        users = await db.get_users_by_riot_id(job['riot_id'])
+        if not users:
+            return False
+        today = job['fetch_date']
+        success = await self.fetch_and_save_rank(users[0], today, users=users)
+
+        # Backfill if requested
+        rid = job['riot_id']
+        if job['backfill'] and '#' in rid:
+            name, tag = rid.split('#')
+            summoner = await opgg_client.get_summoner(name, tag, Region.JP)
+            if summoner:
+                # Avoid overwriting today's report
+                await self.backfill_history(users, summoner.summoner_id, before=today)
 
-        return t_str, channel_id, period_days, o_str, None
+        with tracing.span("wait"):
+            await asyncio.sleep(FETCH_INTERVAL_SECONDS) # Base rate limiting
+        return success
 
-    async def fetch_all_users_rank(self, backfill: bool = False, server_id: int = None):
-        """Fetch current rank and optionally backfill history."""
-        logger.info(f"Starting rank collection (backfill={backfill}, server_id={server_id})...")
+    async def backfill_history(self, users, summoner_id: str, before: date = None, refresh: bool = False,
+                               on_flush=None) -> tuple:
+        """Stream a summoner's OP.GG tier history into rank_history for every registration in `users`.
+
+        Entries are parsed as the response arrives, collapsed to one point per day
+        (the last of that day), restricted to days before `before`, and written in
+        batches of BACKFILL_BATCH_SIZE rows, so memory stays flat however long
+        the history is. Existing rows are kept, or with `refresh` get the history's
+        tier/rank/LP (see add_rank_history_batch). `on_flush(rows, inserted)` is called
+        after each batch is written, so callers see rows that land before a failure.
+        Returns (inserted, skipped) rows.
+        """
+        inserted = skipped = 0
+        batch = []
+
+        async def flush():
+            nonlocal inserted, skipped
+            count = await db.add_rank_history_batch(batch, refresh=refresh)
+            inserted += count
+            skipped += len(batch) - count
+            if on_flush:
+                on_flush(len(batch), count)
+            batch.clear()
+
+        points = tier_history.daily_points(opgg_client.iter_tier_history(summoner_id, Region.JP))
+        with tracing.span("backfill"):
+            async for point in points:
+                h_date = point['updated_at'].date()
+                if before is not None and h_date >= before:
+                    continue
+                for u in users:
+                    batch.append((u['server_id'], u['discord_id'], u['riot_id'],
+                                  point['tier'], point['rank'], point['lp'], 0, 0, h_date))
+                if len(batch) >= BACKFILL_BATCH_SIZE:
+                    await flush()
+            await flush()
+        logger.info("Backfilled %s: %d rows inserted, %d already present", users[0]['riot_id'], inserted, skipped)
+        return inserted, skipped
+
+    async def run_daily_report(self, server_id: int, channel_id: int, period_days: int, output_type: str = 'table', schedule_id: int = None,
+                               renderer: str = DEFAULT_REPORT_RENDERER):
+        """Scheduled report job. Jobs due together for the same report share one render (see report_fanout)."""
+        with tracing.trace("job.run_daily_report", server_id=server_id, channel_id=channel_id, output_type=output_type):
+            if schedule_id is not None:
+                await db.record_job_run(report_job_id(schedule_id), datetime.now(timezone.utc))
+            if not self.bot.get_channel(channel_id):
+                logger.warning(f"Channel {channel_id} not found.")
+                return
+            await self.report_fanout.submit((server_id, period_days, output_type, renderer), channel_id)
+
+    async def render_scheduled_report(self, key) -> list:
+        """Messages of one scheduled report, or None when there is nothing to post.
+
+        Uses the payload pre-rendered after the nightly collection while the server's
+        data is unchanged; otherwise refreshes the users, queries and renders.
+        """
+        server_id, period_days, output_type, renderer = key
         today = date.today()
-        
-        if server_id:
-            users = await db.get_users_by_server(server_id)
-        else:
-            users = await db.get_all_users()
-        
-        results = {'total': len(users), 'success': 0, 'failed': 0}
-        
-        for user in users:
-            uid = user['discord_id']
-            rid = user['riot_id']
-            try:
-                # 1. Fetch Current
-                success = await self.fetch_and_save_rank(user, today)
-                if success:
-                    results['success'] += 1
-                else:
-                    results['failed'] += 1
-                
-                # 2. Backfill if requested
-                if backfill and '#' in rid:
-                    name, tag = rid.split('#')
-                    summoner = await opgg_client.get_summoner(name, tag, Region.JP)
-                    if summoner:
-                        history = await opgg_client.get_tier_history(summoner.summoner_id, Region.JP)
-                        for entry in history:
-                            h_date = entry['updated_at'].date()
-                            # Avoid overwriting today's report
-                            if h_date < today:
-                                await db.add_rank_history(
-                                    user['server_id'], uid, rid, 
-                                    entry['tier'], entry['rank'], entry['lp'],
-                                    0, 0, h_date
-                                )
-                
-                await asyncio.sleep(1) # Base rate limiting
-            except Exception as e:
-                logger.error(f"Failed to fetch rank for user {rid}: {e}")
-                results['failed'] += 1
-                
-        logger.info(f"Global rank collection completed: {results}")
-        return results
+        if REPORT_PRERENDER:
+            cached = await db.get_report_cache(server_id, period_days, output_type, renderer, today)
+            if cached:
+                logger.info(f"Using pre-rendered report for server {server_id} (type: {output_type}, {period_days} days)")
+                return [ReportMessage(c, i, f) for c, i, f in zip(cached['contents'], cached['images'], cached['filenames'])]
 
-    async def run_daily_report(self, server_id: int, channel_id: int, period_days: int, output_type: str = 'table'):
         guild = self.bot.get_guild(server_id)
         guild_name = guild.name if guild else "Unknown"
-        logger.info(f"Running report for server '{guild_name}' (ID: {server_id}), channel {channel_id} (type: {output_type})")
-        channel = self.bot.get_channel(channel_id)
-        if not channel:
-            logger.warning(f"Channel {channel_id} not found.")
-            return
+        logger.info(f"Running report for server '{guild_name}' (ID: {server_id}) (type: {output_type}, {period_days} days)")
 
         users = await db.get_users_by_server(server_id)
         if not users:
             logger.info(f"No users in server {server_id} for report.")
-            return
+            return None
 
         # 1. Fetch latest data for all users before generating report
-        for user in users:
-            try:
-                await self.fetch_and_save_rank(user)
-                await asyncio.sleep(1) # Basic rate limiting
-            except Exception as e:
-                logger.error(f"Failed to refresh user {user['riot_id']} in daily report: {e}")
+        try:
+            jobs = await self.fetch_queue.enqueue((u['riot_id'] for u in users), today, PRIORITY_REPORT)
+            statuses = await self.fetch_queue.wait(jobs.values(), timeout=REPORT_FETCH_TIMEOUT)
+            not_done = [st for st in statuses.values() if st != 'DONE']
+            if not_done:
+                logger.warning(f"{len(not_done)}/{len(statuses)} users not refreshed for report in server {server_id}")
+        except Exception as e:
+            logger.error(f"Failed to refresh users for daily report in server {server_id}: {e}")
 
-        today = date.today()
-        
         try:
-            if output_type == 'graph':
-                # Generate multi-user graph
-                start_date = today - timedelta(days=period_days)
-                user_data = {}
-                for u in users:
-                    rows = await db.get_rank_history_for_graph(u['server_id'], u['discord_id'], u['riot_id'], start_date)
-                    if rows:
-                        user_data[u['riot_id']] = [dict(r) for r in rows]
-                
-                if not user_data:
-                    await channel.send(f"過去 {period_days} 日間のグラフデータがありません。")
-                    return
+            return await self.build_report_messages(users, key, today)
+        except Exception as e:
+            logger.error(f"Error in scheduled report: {e}", exc_info=True)
+            return [ReportMessage(f"レポート生成中にエラーが発生しました: {e}")]
+
+    async def build_report_messages(self, users, key, today: date) -> list:
+        """Query and render the messages of a scheduled report from the stored history."""
+        server_id, period_days, output_type, renderer = key
+        title = f"**定期レポート (過去{period_days}日間)**"
+
+        if output_type == 'graph':
+            # Generate multi-user graph
+            start_date = today - timedelta(days=period_days)
+            histories = await self.load_server_history(server_id, users, start_date)
+            user_data = {rid: h for rid, h in histories.items() if h}
+
+            if not user_data:
+                return [ReportMessage(f"過去 {period_days} 日間のグラフデータがありません。")]
 
+            with tracing.span("render.graph"):
                 buf = generate_rank_graph(user_data, "daily" if period_days <= 14 else "weekly", " (全員・定期)")
-                if buf:
-                    file = discord.File(fp=buf, filename="scheduled_graph.png")
-                    await channel.send(content=f"**定期レポート (過去{period_days}日間)**", file=file)
-                else:
-                    await channel.send("グラフの生成に失敗しました。")
-            else:
-                # Image-based Table output (Migrated from text table)
-                buf = await self.generate_report_image_payload(users, today, period_days)
-                if buf:
-                    file = discord.File(fp=buf, filename="scheduled_report.png")
-                    await channel.send(content=f"**定期レポート (過去{period_days}日間)**", file=file)
-                else:
-                    await channel.send("レポートの生成に失敗しました。")
+            if buf:
+                return [ReportMessage(title, buf.getvalue(), image_encoding.filename("scheduled_graph"))]
+            return [ReportMessage("グラフの生成に失敗しました。")]
+        elif output_type == 'text':
+            # Code-block table: no rendering or upload, split to fit Discord's message limit
+            messages = await self.generate_report_text_payload(users, today, period_days, title)
+            if messages:
+                return [ReportMessage(content) for content in messages]
+            return [ReportMessage("レポートの生成に失敗しました。")]
+        else:
+            # Image-based Table output (Migrated from text table)
+            buf = await self.generate_report_image_payload(users, today, period_days, renderer)
+            if buf:
+                return [ReportMessage(title, buf.getvalue(), image_encoding.filename("scheduled_report"))]
+            return [ReportMessage("レポートの生成に失敗しました。")]
+
+    async def prerender_reports(self, report_date: date):
+        """Post-collection stage: render every enabled schedule's report for `report_date` ahead of time.
 
+        Render keys go in the order their schedules fire, one at a time, with
+        PRERENDER_INTERVAL_SECONDS between them and never while a scheduled report
+        is rendering, so the work stays in the loop's idle time.
+        """
+        if not REPORT_PRERENDER:
+            return
+        try:
+            await db.purge_report_cache(report_date)
+            schedules = [s for s in await db.get_all_schedules() if s['status'] == 'ENABLED']
+            keys = dict.fromkeys(
+                (s['server_id'] or 0, s['period_days'], s['output_type'], s.get('renderer') or DEFAULT_REPORT_RENDERER)
+                for s in sorted(schedules, key=lambda s: s['schedule_time'])
+            )
+            started = time.perf_counter()
+            rendered = 0
+            for key in keys:
+                await asyncio.sleep(PRERENDER_INTERVAL_SECONDS)
+                while self.report_fanout.busy:
+                    await asyncio.sleep(PRERENDER_INTERVAL_SECONDS)
+                rendered += await self.prerender_report(key, report_date)
+            logger.info(f"Pre-rendered {rendered}/{len(keys)} scheduled reports for {report_date} "
+                        f"in {time.perf_counter() - started:.0f}s")
         except Exception as e:
-            await channel.send(f"レポート生成中にエラーが発生しました: {e}")
-            logger.error(f"Error in scheduled report: {e}", exc_info=True)
+            logger.error(f"Failed to pre-render scheduled reports: {e}", exc_info=True)
+
+    async def prerender_report(self, key, report_date: date) -> bool:
+        """Render one report key from the stored history and cache it. Returns whether it was stored."""
+        server_id, period_days, output_type, renderer = key
+        with tracing.trace("job.prerender_report", server_id=server_id, output_type=output_type):
+            try:
+                # Read before the history: a write during the render leaves the entry already stale
+                version = await db.get_data_version(server_id)
+                users = await db.get_users_by_server(server_id)
+                if not users:
+                    return False
+                messages = await self.build_report_messages(users, key, report_date)
+                await db.save_report_cache(server_id, period_days, output_type, renderer, report_date, version,
+                                           [m.content for m in messages], [m.data for m in messages],
+                                           [m.filename for m in messages])
+                return True
+            except Exception as e:
+                logger.error(f"Failed to pre-render report {key}: {e}", exc_info=True)
+                return False
+
+    async def deliver_report(self, channel_id: int, messages: list):
+        """Post a rendered scheduled report to one channel. Each send gets its own File over the shared bytes."""
+        channel = self.bot.get_channel(channel_id)
+        if not channel:
+            logger.warning(f"Channel {channel_id} not found.")
+            return
+        with tracing.span("upload", channel_id=channel_id):
+            for m in messages:
+                if m.data is None:
+                    await channel.send(m.content)
+                else:
+                    await channel.send(content=m.content, file=discord.File(fp=io.BytesIO(m.data), filename=m.filename))
 
-    async def fetch_and_save_rank(self, user, target_date=None):
+    async def fetch_and_save_rank(self, user, target_date=None, users=None):
+        """Fetch `user`'s current rank once and store it for each row in `users` (default: just `user`)."""
         if target_date is None:
             target_date = date.today()
 
-        discord_id = user['discord_id']
         riot_id = user['riot_id'] # Expected "Name#Tag"
         if '#' not in riot_id:
             return False
@@ -513,7 +943,7 @@ class Scheduler(commands.Cog):
         
         # Get Summoner
         try:
-            logger.info(f"Fetching rank for {riot_id} on {target_date} (Server: {user.get('server_id', 'Unknown')})")
+            logger.debug("Fetching rank for %s on %s (server_id=%s)", riot_id, target_date, user.get('server_id', 'Unknown'))
             summoner = await opgg_client.get_summoner(name, tag, Region.JP)
             if not summoner:
                 logger.warning(f"User not found on OPGG: {riot_id}")
@@ -522,13 +952,22 @@ class Scheduler(commands.Cog):
             # Trigger renewal to ensure data is fresh
             await opgg_client.renew_summoner(summoner)
             # Short sleep to give OP.GG a moment to start/process the update from Riot
-            await asyncio.sleep(2)
+            with tracing.span("wait"):
+                await asyncio.sleep(RENEWAL_WAIT_SECONDS)
 
             # Get Rank
-            tier, rank, lp, wins, losses = await opgg_client.get_rank_info(summoner)
-            logger.info(f"Rank info for {riot_id}: {tier} {rank} {lp}LP (W:{wins} L:{losses})")
-            await db.add_rank_history(user['server_id'], discord_id, riot_id, tier, rank, lp, wins, losses, target_date)
+            rank_info = await opgg_client.get_rank_info(summoner)
+            if rank_info is None:
+                # Never store a failed lookup as UNRANKED
+                logger.warning(f"No rank data from OPGG for {riot_id}, not saving")
+                return False
+            tier, rank, lp, wins, losses = rank_info
+            logger.info("Rank info for %s: %s %s %sLP (W:%s L:%s)", riot_id, tier, rank, lp, wins, losses)
+            for u in users or [user]:
+                await db.add_rank_history(u['server_id'], u['discord_id'], riot_id, tier, rank, lp, wins, losses, target_date)
             return True
+        except OPGGUnavailable:
+            raise
         except Exception as e:
             logger.error(f"Error in fetch_and_save_rank for {riot_id}: {e}", exc_info=True)
             return False
@@ -540,26 +979,26 @@ class Scheduler(commands.Cog):
         uid = user['discord_id']
         rid = user['riot_id']
         sid = user['server_id']
-        history = await db.get_rank_history(sid, uid, rid, start_date, today)
+        history = rank_history.UserHistory.from_rows(rid, await db.get_rank_history(sid, uid, rid, start_date, today))
         
         if not history:
             return None
 
-        # Prepare rows
+        # Prepare rows, newest first
         header = ["日付", "ランク", "前日比", "戦績"]
         table_rows = []
-        history.sort(key=lambda x: x['fetch_date'], reverse=True)
+        points = history.points()[::-1]
         
-        for i, h in enumerate(history):
-            d_str = h['fetch_date'].strftime("%m/%d")
-            r_str = rank_calculator.format_rank_display(h['tier'], h['rank'], h['lp'])
+        for i, h in enumerate(points):
+            d_str = h.fetch_date.strftime("%m/%d")
+            r_str = rank_calculator.format_rank_display(h.tier, h.rank, h.lp)
             diff_str = "-"
             record_str = "-"
-            if i + 1 < len(history):
-                prev_h = history[i+1]
+            if i + 1 < len(points):
+                prev_h = points[i+1]
                 diff_str = rank_calculator.calculate_diff_text(prev_h, h, include_prefix=False)
-                w = h['wins'] - prev_h['wins']
-                l = h['losses'] - prev_h['losses']
+                w = h.wins - prev_h.wins
+                l = h.losses - prev_h.losses
                 g = w + l
                 if g > 0:
                     rate = int((w / g) * 100)
@@ -569,28 +1008,50 @@ class Scheduler(commands.Cog):
         import src.utils.graph_generator as graph_generator
         # Custom col_widths for individual report (vertical)
         col_widths = [0.12, 0.20, 0.40, 0.28]
-        return graph_generator.generate_report_image(header, table_rows, f"{rid} Report (Last {period_days} Days)", col_widths=col_widths)
+        with tracing.span("render.table"):
+            return graph_generator.generate_report_image(header, table_rows, f"{rid} Report (Last {period_days} Days)", col_widths=col_widths)
 
-    async def generate_report_image_payload(self, users, today: date, period_days: int) -> io.BytesIO:
+    async def generate_report_image_payload(self, users, today: date, period_days: int, renderer: str = DEFAULT_REPORT_RENDERER) -> io.BytesIO:
         """Generate table image for all users."""
+        table = await self.build_report_table(users, today, period_days)
+        if not table:
+            return None
+        headers, table_data, col_widths = table
+        generate_report_image = get_report_renderer(renderer)
+        with tracing.span("render.table", renderer=renderer):
+            return generate_report_image(headers, table_data, f"Rank Report (Last {period_days} Days)", col_widths=col_widths)
+
+    async def generate_report_text_payload(self, users, today: date, period_days: int, title: str = ""):
+        """Report table as monospace code-block messages, each within Discord's length limit."""
+        table = await self.build_report_table(users, today, period_days, max_dates=TEXT_REPORT_DATES)
+        if not table:
+            return None
+        headers, table_data, _ = table
+        with tracing.span("render.text"):
+            lines = rank_calculator.format_text_table(headers, table_data)
+            return rank_calculator.split_code_blocks(lines, title)
+
+    async def load_server_history(self, server_id: int, users, start_date: date, end_date: date = None) -> dict:
+        """{riot_id: UserHistory} for each of `users`, in their order, from a single query (empty if no history)."""
+        by_user = rank_history.group_rows(await db.get_server_rank_history(server_id, start_date, end_date))
+        return {u['riot_id']: by_user.get((u['discord_id'], u['riot_id'])) or rank_history.UserHistory(u['riot_id'])
+                for u in users}
+
+    async def build_report_table(self, users, today: date, period_days: int, max_dates: int = 5):
+        """(headers, rows, col_widths) of the all-users report, or None if there is no data."""
         start_date = today - timedelta(days=period_days)
-        data_map = {}
-        all_dates = set()
-        
-        for user in users:
-            history = await db.get_rank_history(user['server_id'], user['discord_id'], user['riot_id'], start_date, today)
-            user_history = {h['fetch_date']: h for h in history}
-            data_map[user['riot_id']] = user_history
-            all_dates.update(user_history.keys())
-            
-        sorted_dates = sorted(list(all_dates))
+        histories = await self.load_server_history(users[0]['server_id'], users, start_date, today)
+        all_ordinals = set()
+        for h in histories.values():
+            all_ordinals.update(h.ordinals)
+
+        sorted_dates = [date.fromordinal(o) for o in sorted(all_ordinals)]
         if not sorted_dates:
             return None
 
         # Headers: Riot ID, Recent Dates, Daily Diff, Period Diff, Total Record
-        # Limit dates shown in image to avoid too wide image if period is long
-        MAX_DATES_IN_IMAGE = 5
-        shown_dates = sorted_dates[-MAX_DATES_IN_IMAGE:]
+        # Limit dates shown to avoid too wide a table if period is long
+        shown_dates = sorted_dates[-max_dates:]
         
         headers = ["RIOT ID"] + [d.strftime("%m/%d") for d in shown_dates] + ["前日比", f"{period_days}日比", "戦績"]
         
@@ -603,28 +1064,28 @@ class Scheduler(commands.Cog):
         total_relative = sum(col_widths)
         col_widths = [w / total_relative for w in col_widths]
 
+        anchor_date = sorted_dates[-1]
         table_data = []
-        for rid, h_map in data_map.items():
+        for rid, history in histories.items():
             row = [rid.split('#')[0]] # Show only name to save space
             
             # Rank for each date
             for d in shown_dates:
-                entry = h_map.get(d)
-                row.append(rank_calculator.format_rank_display(entry['tier'], entry['rank'], entry['lp']) if entry else "-")
+                entry = history.at(d)
+                row.append(rank_calculator.format_rank_display(entry.tier, entry.rank, entry.lp) if entry else "-")
             
             # Diff logic
-            anchor_date = sorted_dates[-1]
-            anchor_entry = h_map.get(anchor_date)
+            anchor_entry = history.at(anchor_date)
             
             # Daily Diff
-            prev_entry = h_map.get(anchor_date - timedelta(days=1))
+            prev_entry = history.at(anchor_date - timedelta(days=1))
             daily_diff = "-"
             if prev_entry and anchor_entry:
                 daily_diff = rank_calculator.calculate_diff_text(prev_entry, anchor_entry, include_prefix=False)
             row.append(daily_diff)
             
             # Period Diff
-            start_entry = h_map.get(sorted_dates[0])
+            start_entry = history.at(sorted_dates[0])
             period_diff = "-"
             if start_entry and anchor_entry:
                 period_diff = rank_calculator.calculate_diff_text(start_entry, anchor_entry, include_prefix=False)
@@ -633,8 +1094,8 @@ class Scheduler(commands.Cog):
             # Record (Total for period)
             record = "-"
             if start_entry and anchor_entry:
-                w = anchor_entry['wins'] - start_entry['wins']
-                l = anchor_entry['losses'] - start_entry['losses']
+                w = anchor_entry.wins - start_entry.wins
+                l = anchor_entry.losses - start_entry.losses
                 g = w + l
                 if g > 0:
                     rate = int((w / g) * 100)
@@ -643,8 +1104,7 @@ class Scheduler(commands.Cog):
             
             table_data.append(row)
 
-        from src.utils.graph_generator import generate_report_image
-        return generate_report_image(headers, table_data, f"Rank Report (Last {period_days} Days)", col_widths=col_widths)
+        return headers, table_data, col_widths
 
 async def setup(bot):
     await bot.add_cog(Scheduler(bot))
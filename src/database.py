@@ -2,9 +2,18 @@ import logging
 import os
 import asyncpg
 from datetime import datetime, date, time
+from src.utils.tracing import traced
 
 logger = logging.getLogger(__name__)
 
+# Follows a data-modifying CTE `saved` that returns server_id: bumps those servers' data version,
+# which invalidates their pre-rendered reports (report_cache)
+BUMP_DATA_VERSION = """
+INSERT INTO server_data_versions (server_id, version)
+SELECT DISTINCT server_id, 1 FROM saved WHERE server_id IS NOT NULL
+ON CONFLICT (server_id) DO UPDATE SET version = server_data_versions.version + 1, update_date = CURRENT_TIMESTAMP
+"""
+
 class Database:
     def __init__(self):
         self.pool = None
@@ -112,28 +121,35 @@ class Database:
         if self.pool:
             await self.pool.close()
 
+    @traced('db')
     async def register_user(self, server_id: int, discord_id: int, riot_id: str, puuid: str):
         query = """
-        INSERT INTO users (server_id, discord_id, riot_id, puuid, update_date)
-        VALUES ($1, $2, $3, $4, CURRENT_TIMESTAMP)
-        ON CONFLICT (server_id, discord_id, riot_id) 
-        DO UPDATE SET puuid = $4, update_date = CURRENT_TIMESTAMP
-        """
+        WITH saved AS (
+            INSERT INTO users (server_id, discord_id, riot_id, puuid, update_date)
+            VALUES ($1, $2, $3, $4, CURRENT_TIMESTAMP)
+            ON CONFLICT (server_id, discord_id, riot_id) 
+            DO UPDATE SET puuid = $4, update_date = CURRENT_TIMESTAMP
+            RETURNING server_id
+        )
+        """ + BUMP_DATA_VERSION
         async with self.pool.acquire() as conn:
             await conn.execute(query, server_id, discord_id, riot_id, puuid)
 
+    @traced('db')
     async def get_user_by_discord_id(self, server_id: int, discord_id: int):
         query = "SELECT * FROM users WHERE server_id = $1 AND discord_id = $2"
         async with self.pool.acquire() as conn:
             return await conn.fetch(query, server_id, discord_id)
 
+    @traced('db')
     async def get_user_by_riot_id(self, server_id: int, riot_id: str):
         """Fetch a user by their Riot ID within a specific server."""
         query = "SELECT * FROM users WHERE server_id = $1 AND riot_id = $2"
         async with self.pool.acquire() as conn:
             return await conn.fetchrow(query, server_id, riot_id)
 
-    async def register_schedule(self, server_id: int, schedule_time, channel_id: int, created_by: int, period_days: int, output_type: str = 'table'):
+    @traced('db')
+    async def register_schedule(self, server_id: int, schedule_time, channel_id: int, created_by: int, period_days: int, output_type: str = 'table', renderer: str = 'matplotlib'):
         if isinstance(schedule_time, str):
             try:
                 if len(schedule_time.split(':')) == 2:
@@ -145,35 +161,82 @@ class Database:
                 raise ValueError(f"Invalid time format: {schedule_time}") from e
 
         query = """
-        INSERT INTO schedules (server_id, schedule_time, channel_id, created_by, period_days, output_type, status, update_date)
-        VALUES ($1, $2, $3, $4, $5, $6, 'ENABLED', CURRENT_TIMESTAMP)
+        INSERT INTO schedules (server_id, schedule_time, channel_id, created_by, period_days, output_type, renderer, status, update_date)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, 'ENABLED', CURRENT_TIMESTAMP)
         RETURNING id
         """
         async with self.pool.acquire() as conn:
-            return await conn.fetchval(query, server_id, schedule_time, channel_id, created_by, period_days, output_type)
+            return await conn.fetchval(query, server_id, schedule_time, channel_id, created_by, period_days, output_type, renderer)
 
+    @traced('db')
     async def get_all_schedules(self):
         query = "SELECT * FROM schedules"
         async with self.pool.acquire() as conn:
             return await conn.fetch(query)
 
+    @traced('db')
     async def get_schedules_by_server(self, server_id: int):
         query = "SELECT * FROM schedules WHERE server_id = $1"
         async with self.pool.acquire() as conn:
             return await conn.fetch(query, server_id)
 
+    @traced('db')
     async def add_rank_history(self, server_id: int, discord_id: int, riot_id: str, tier: str, rank: str, lp: int, wins: int, losses: int, fetch_date: date):
         games = wins + losses
         query = """
-        INSERT INTO rank_history (server_id, discord_id, riot_id, tier, rank, lp, wins, losses, games, fetch_date)
-        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
-        ON CONFLICT (server_id, discord_id, riot_id, fetch_date)
-        DO UPDATE SET 
-            tier = $4, rank = $5, lp = $6, wins = $7, losses = $8, games = $9
-        """
+        WITH saved AS (
+            INSERT INTO rank_history (server_id, discord_id, riot_id, tier, rank, lp, wins, losses, games, fetch_date)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
+            ON CONFLICT (server_id, discord_id, riot_id, fetch_date)
+            DO UPDATE SET 
+                tier = $4, rank = $5, lp = $6, wins = $7, losses = $8, games = $9
+            RETURNING server_id
+        )
+        """ + BUMP_DATA_VERSION
         async with self.pool.acquire() as conn:
             await conn.execute(query, server_id, discord_id, riot_id, tier, rank, lp, wins, losses, games, fetch_date)
 
+    @traced('db')
+    async def add_rank_history_batch(self, rows, refresh: bool = False) -> int:
+        """Insert many (server_id, discord_id, riot_id, tier, rank, lp, wins, losses, fetch_date) rows in one statement.
+
+        Days that already have a row are left alone (a backfilled point carries no
+        wins/losses and must not replace a collected one), unless `refresh` is set:
+        then their tier, rank and LP are updated and their wins/losses kept.
+        Returns the number of rows newly inserted.
+        """
+        if not rows:
+            return 0
+        # One row per key: DO UPDATE can't touch a row twice in one statement. Same outcome as
+        # the rows arriving one by one: the first wins without refresh, the last with it.
+        unique = {}
+        for row in rows:
+            key = (row[0], row[1], row[2], row[8])
+            if refresh or key not in unique:
+                unique[key] = row
+        columns = list(zip(*unique.values()))
+        games = [w + l for w, l in zip(columns[6], columns[7])]
+        if refresh:
+            conflict = """DO UPDATE SET tier = EXCLUDED.tier, rank = EXCLUDED.rank, lp = EXCLUDED.lp
+            WHERE (rank_history.tier, rank_history.rank, rank_history.lp)
+                IS DISTINCT FROM (EXCLUDED.tier, EXCLUDED.rank, EXCLUDED.lp)"""
+        else:
+            conflict = "DO NOTHING"
+        # xmax is 0 only on rows this statement inserted (not on ones it updated)
+        query = f"""
+        WITH saved AS (
+            INSERT INTO rank_history (server_id, discord_id, riot_id, tier, rank, lp, wins, losses, games, fetch_date)
+            SELECT * FROM unnest($1::bigint[], $2::bigint[], $3::varchar[], $4::varchar[], $5::varchar[],
+                                 $6::int[], $7::int[], $8::int[], $9::int[], $10::date[])
+            ON CONFLICT (server_id, discord_id, riot_id, fetch_date) {conflict}
+            RETURNING server_id, xmax = 0 AS inserted
+        ), bumped AS ({BUMP_DATA_VERSION})
+        SELECT count(*) FILTER (WHERE inserted) FROM saved
+        """
+        async with self.pool.acquire() as conn:
+            return await conn.fetchval(query, *columns[:8], games, columns[8])
+
+    @traced('db')
     async def get_rank_history(self, server_id: int, discord_id: int, riot_id: str, start_date: date, end_date: date):
         query = """
         SELECT * FROM rank_history
@@ -183,6 +246,7 @@ class Database:
         async with self.pool.acquire() as conn:
             return await conn.fetch(query, server_id, discord_id, riot_id, start_date, end_date)
 
+    @traced('db')
     async def get_rank_history_for_graph(self, server_id: int, discord_id: int, riot_id: str, start_date: date):
         query = """
         SELECT fetch_date, tier, rank, lp, wins, losses, games
@@ -193,22 +257,38 @@ class Database:
         async with self.pool.acquire() as conn:
             return await conn.fetch(query, server_id, discord_id, riot_id, start_date)
 
+    @traced('db')
+    async def get_server_rank_history(self, server_id: int, start_date: date, end_date: date = None):
+        """Every user's history in a server in one query, ordered for rank_history.group_rows."""
+        query = """
+        SELECT discord_id, riot_id, fetch_date, tier, rank, lp, wins, losses
+        FROM rank_history
+        WHERE server_id = $1 AND fetch_date >= $2 AND ($3::date IS NULL OR fetch_date <= $3)
+        ORDER BY discord_id, riot_id, fetch_date ASC
+        """
+        async with self.pool.acquire() as conn:
+            return await conn.fetch(query, server_id, start_date, end_date)
+
+    @traced('db')
     async def get_all_users(self):
         query = "SELECT * FROM users"
         async with self.pool.acquire() as conn:
             return await conn.fetch(query)
 
+    @traced('db')
     async def get_users_by_server(self, server_id: int):
         query = "SELECT * FROM users WHERE server_id = $1"
         async with self.pool.acquire() as conn:
             return await conn.fetch(query, server_id)
 
+    @traced('db')
     async def delete_schedule(self, schedule_id: int):
         query = "DELETE FROM schedules WHERE id = $1"
         async with self.pool.acquire() as conn:
             await conn.execute(query, schedule_id)
 
-    async def update_schedule(self, schedule_id: int, schedule_time, channel_id: int, period_days: int, output_type: str = 'table'):
+    @traced('db')
+    async def update_schedule(self, schedule_id: int, schedule_time, channel_id: int, period_days: int, output_type: str = 'table', renderer: str = 'matplotlib'):
         if isinstance(schedule_time, str):
             try:
                 if len(schedule_time.split(':')) == 2:
@@ -221,12 +301,13 @@ class Database:
 
         query = """
         UPDATE schedules 
-        SET schedule_time = $2, channel_id = $3, period_days = $4, output_type = $5, update_date = CURRENT_TIMESTAMP
+        SET schedule_time = $2, channel_id = $3, period_days = $4, output_type = $5, renderer = $6, update_date = CURRENT_TIMESTAMP
         WHERE id = $1
         """
         async with self.pool.acquire() as conn:
-            await conn.execute(query, schedule_id, schedule_time, channel_id, period_days, output_type)
+            await conn.execute(query, schedule_id, schedule_time, channel_id, period_days, output_type, renderer)
 
+    @traced('db')
     async def set_schedule_status(self, schedule_id: int, status: str):
         query = """
         UPDATE schedules 
@@ -236,14 +317,275 @@ class Database:
         async with self.pool.acquire() as conn:
             await conn.execute(query, schedule_id, status)
 
+    @traced('db')
     async def get_schedule_by_id(self, schedule_id: int):
         query = "SELECT * FROM schedules WHERE id = $1"
         async with self.pool.acquire() as conn:
             return await conn.fetchrow(query, schedule_id)
 
+    @traced('db')
     async def delete_user_by_riot_id(self, server_id: int, riot_id: str):
-        query = "DELETE FROM users WHERE server_id = $1 AND riot_id = $2"
+        query = """
+        WITH saved AS (
+            DELETE FROM users WHERE server_id = $1 AND riot_id = $2
+            RETURNING server_id
+        )
+        """ + BUMP_DATA_VERSION
         async with self.pool.acquire() as conn:
             await conn.execute(query, server_id, riot_id)
 
+    @traced('db')
+    async def create_collection_run(self, server_id, fetch_date: date, backfill: bool = False) -> int:
+        """Start a checkpointed collection run and snapshot its users as PENDING."""
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                run_id = await conn.fetchval("""
+                    INSERT INTO collection_runs (server_id, fetch_date, backfill)
+                    VALUES ($1, $2, $3)
+                    RETURNING id
+                """, server_id, fetch_date, backfill)
+                total = await conn.execute("""
+                    INSERT INTO collection_run_users (run_id, server_id, discord_id, riot_id)
+                    SELECT $1, server_id, discord_id, riot_id FROM users
+                    WHERE $2::BIGINT IS NULL OR server_id = $2
+                """, run_id, server_id)
+                await conn.execute("UPDATE collection_runs SET total = $2 WHERE id = $1", run_id, int(total.split()[-1]))
+                return run_id
+
+    @traced('db')
+    async def get_unfinished_collection_runs(self):
+        query = "SELECT * FROM collection_runs WHERE status = 'RUNNING' ORDER BY id"
+        async with self.pool.acquire() as conn:
+            return await conn.fetch(query)
+
+    @traced('db')
+    async def get_pending_run_users(self, run_id: int, max_attempts: int):
+        """Users of a run that are not DONE yet and have attempts left (users deleted since are dropped)."""
+        query = """
+        SELECT u.* FROM collection_run_users p
+        JOIN users u ON u.server_id = p.server_id AND u.discord_id = p.discord_id AND u.riot_id = p.riot_id
+        WHERE p.run_id = $1 AND p.status <> 'DONE' AND p.attempts < $2
+        """
+        async with self.pool.acquire() as conn:
+            return await conn.fetch(query, run_id, max_attempts)
+
+    @traced('db')
+    async def finish_collection_run(self, run_id: int, status: str = 'COMPLETED'):
+        """Close a run; success/failed are counted from its progress rows."""
+        query = """
+        UPDATE collection_runs SET
+            status = $2,
+            success = (SELECT COUNT(*) FROM collection_run_users WHERE run_id = $1 AND status = 'DONE'),
+            failed = (SELECT COUNT(*) FROM collection_run_users WHERE run_id = $1 AND status <> 'DONE'),
+            finished_at = CURRENT_TIMESTAMP
+        WHERE id = $1
+        RETURNING *
+        """
+        async with self.pool.acquire() as conn:
+            return await conn.fetchrow(query, run_id, status)
+
+    @traced('db')
+    async def get_users_by_riot_id(self, riot_id: str):
+        """Every registration of a Riot ID, across all servers."""
+        query = "SELECT * FROM users WHERE riot_id = $1"
+        async with self.pool.acquire() as conn:
+            return await conn.fetch(query, riot_id)
+
+    @traced('db')
+    async def enqueue_fetch_jobs(self, riot_ids, fetch_date: date, priority: int, backfill: bool = False):
+        """Queue one fetch per Riot ID, merging into a job already queued/running for the same day.
+
+        A merged job keeps the more urgent priority. A queued job is upgraded to a
+        backfill if either request asked for one; a running job has already read its
+        row, so it is marked to run again as a backfill once it finishes instead.
+        Returns {riot_id: job_id}.
+        """
+        query = """
+        INSERT INTO fetch_jobs (riot_id, fetch_date, priority, backfill)
+        SELECT DISTINCT r, $2::DATE, $3::INTEGER, $4::BOOLEAN FROM unnest($1::VARCHAR[]) AS r
+        ON CONFLICT (riot_id, fetch_date) WHERE status IN ('QUEUED', 'RUNNING')
+        DO UPDATE SET
+            priority = LEAST(fetch_jobs.priority, EXCLUDED.priority),
+            backfill = fetch_jobs.backfill OR (fetch_jobs.status = 'QUEUED' AND EXCLUDED.backfill),
+            rerun_backfill = fetch_jobs.rerun_backfill
+                OR (fetch_jobs.status = 'RUNNING' AND EXCLUDED.backfill AND NOT fetch_jobs.backfill),
+            update_date = CURRENT_TIMESTAMP
+        RETURNING id, riot_id
+        """
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(query, list(riot_ids), fetch_date, priority, backfill)
+            return {r['riot_id']: r['id'] for r in rows}
+
+    @traced('db')
+    async def claim_fetch_job(self, worker_id: str, lease_seconds: float):
+        """Take the most urgent runnable job (or one whose worker's lease expired)."""
+        query = """
+        UPDATE fetch_jobs SET
+            status = 'RUNNING', locked_by = $1, locked_at = CURRENT_TIMESTAMP,
+            attempts = attempts + 1, update_date = CURRENT_TIMESTAMP
+        WHERE id = (
+            SELECT id FROM fetch_jobs
+            WHERE (status = 'QUEUED' AND available_at <= CURRENT_TIMESTAMP)
+               OR (status = 'RUNNING' AND locked_at < CURRENT_TIMESTAMP - make_interval(secs => $2))
+            ORDER BY priority, id
+            FOR UPDATE SKIP LOCKED
+            LIMIT 1
+        )
+        RETURNING *
+        """
+        async with self.pool.acquire() as conn:
+            return await conn.fetchrow(query, worker_id, float(lease_seconds))
+
+    @traced('db')
+    async def renew_fetch_job_lease(self, job_id: int, worker_id: str) -> bool:
+        """Extend a running job's lease. False if the job is no longer ours."""
+        query = """
+        UPDATE fetch_jobs SET locked_at = CURRENT_TIMESTAMP
+        WHERE id = $1 AND locked_by = $2 AND status = 'RUNNING'
+        """
+        async with self.pool.acquire() as conn:
+            return await conn.execute(query, job_id, worker_id) != "UPDATE 0"
+
+    @traced('db')
+    async def complete_fetch_job(self, job_id: int, worker_id: str, status: str, error: str = None):
+        """Finish a job and record the outcome on every running collection run that includes its summoner.
+
+        A job marked rerun_backfill goes back to the queue as a fresh backfill instead of finishing.
+        """
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                job = await conn.fetchrow("""
+                    UPDATE fetch_jobs SET
+                        status = CASE WHEN rerun_backfill THEN 'QUEUED' ELSE $3 END,
+                        backfill = backfill OR rerun_backfill,
+                        attempts = CASE WHEN rerun_backfill THEN 0 ELSE attempts END,
+                        available_at = CASE WHEN rerun_backfill THEN CURRENT_TIMESTAMP ELSE available_at END,
+                        rerun_backfill = FALSE,
+                        error = $4, locked_by = NULL, update_date = CURRENT_TIMESTAMP
+                    WHERE id = $1 AND locked_by = $2
+                    RETURNING riot_id, fetch_date
+                """, job_id, worker_id, status, error)
+                if job is None:
+                    # Lease expired and another worker took the job over
+                    return False
+                await conn.execute("""
+                    UPDATE collection_run_users p
+                    SET status = $3, attempts = p.attempts + 1, update_date = CURRENT_TIMESTAMP
+                    FROM collection_runs r
+                    WHERE p.run_id = r.id AND r.status = 'RUNNING' AND r.fetch_date = $2
+                      AND p.riot_id = $1 AND p.status <> 'DONE'
+                """, job['riot_id'], job['fetch_date'], status)
+                return True
+
+    @traced('db')
+    async def release_fetch_job(self, job_id: int, worker_id: str, delay_seconds: float, count_attempt: bool = True):
+        """Put a claimed job back in the queue, runnable again after `delay_seconds`."""
+        query = """
+        UPDATE fetch_jobs SET
+            status = 'QUEUED', locked_by = NULL,
+            backfill = backfill OR rerun_backfill, rerun_backfill = FALSE,
+            attempts = attempts - CASE WHEN $4 THEN 0 ELSE 1 END,
+            available_at = CURRENT_TIMESTAMP + make_interval(secs => $3),
+            update_date = CURRENT_TIMESTAMP
+        WHERE id = $1 AND locked_by = $2
+        """
+        async with self.pool.acquire() as conn:
+            await conn.execute(query, job_id, worker_id, float(delay_seconds), count_attempt)
+
+    @traced('db')
+    async def get_fetch_job_statuses(self, job_ids):
+        query = "SELECT id, status FROM fetch_jobs WHERE id = ANY($1::BIGINT[])"
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(query, list(job_ids))
+            return {r['id']: r['status'] for r in rows}
+
+    @traced('db')
+    async def purge_fetch_jobs(self, keep_days: int = 7):
+        query = """
+        DELETE FROM fetch_jobs
+        WHERE status IN ('DONE', 'FAILED') AND update_date < CURRENT_TIMESTAMP - make_interval(days => $1)
+        """
+        async with self.pool.acquire() as conn:
+            await conn.execute(query, keep_days)
+
+    @traced('db')
+    async def record_job_run(self, job_id: str, run_at: datetime):
+        query = """
+        INSERT INTO job_runs (job_id, last_run_at) VALUES ($1, $2)
+        ON CONFLICT (job_id) DO UPDATE SET
+            last_run_at = GREATEST(job_runs.last_run_at, EXCLUDED.last_run_at), update_date = CURRENT_TIMESTAMP
+        """
+        async with self.pool.acquire() as conn:
+            await conn.execute(query, job_id, run_at)
+
+    @traced('db')
+    async def get_job_runs(self):
+        """{job_id: last_run_at} for every recorded scheduler job."""
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch("SELECT job_id, last_run_at FROM job_runs")
+            return {r['job_id']: r['last_run_at'] for r in rows}
+
+    @traced('db')
+    async def delete_job_runs(self, keep_job_ids):
+        """Forget run history of jobs that no longer exist."""
+        query = "DELETE FROM job_runs WHERE NOT (job_id = ANY($1::VARCHAR[]))"
+        async with self.pool.acquire() as conn:
+            await conn.execute(query, list(keep_job_ids))
+
+    @traced('db')
+    async def get_data_version(self, server_id: int) -> int:
+        """Current data version of a server (0 before its first write); see BUMP_DATA_VERSION."""
+        query = "SELECT version FROM server_data_versions WHERE server_id = $1"
+        async with self.pool.acquire() as conn:
+            return await conn.fetchval(query, server_id) or 0
+
+    @traced('db')
+    async def save_report_cache(self, server_id: int, period_days: int, output_type: str, renderer: str,
+                                report_date: date, data_version: int, contents, images, filenames):
+        """Store a pre-rendered scheduled report (one entry per message) for `report_date`."""
+        query = """
+        INSERT INTO report_cache (server_id, period_days, output_type, renderer, report_date, data_version,
+                                  contents, images, filenames)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+        ON CONFLICT (server_id, period_days, output_type, renderer) DO UPDATE SET
+            report_date = $5, data_version = $6, contents = $7, images = $8, filenames = $9,
+            update_date = CURRENT_TIMESTAMP
+        """
+        async with self.pool.acquire() as conn:
+            await conn.execute(query, server_id, period_days, output_type, renderer, report_date, data_version,
+                               list(contents), list(images), list(filenames))
+
+    @traced('db')
+    async def get_report_cache(self, server_id: int, period_days: int, output_type: str, renderer: str, report_date: date):
+        """The pre-rendered report for `report_date`, or None if there is none or the server's data changed since."""
+        query = """
+        SELECT c.contents, c.images, c.filenames
+        FROM report_cache c
+        LEFT JOIN server_data_versions v ON v.server_id = c.server_id
+        WHERE c.server_id = $1 AND c.period_days = $2 AND c.output_type = $3 AND c.renderer = $4
+          AND c.report_date = $5 AND c.data_version = COALESCE(v.version, 0)
+        """
+        async with self.pool.acquire() as conn:
+            return await conn.fetchrow(query, server_id, period_days, output_type, renderer, report_date)
+
+    @traced('db')
+    async def purge_report_cache(self, before: date):
+        """Drop pre-rendered reports meant for days before `before`."""
+        async with self.pool.acquire() as conn:
+            await conn.execute("DELETE FROM report_cache WHERE report_date < $1", before)
+
+    @traced('db')
+    async def get_bot_state(self, key: str):
+        async with self.pool.acquire() as conn:
+            return await conn.fetchval("SELECT value FROM bot_state WHERE key = $1", key)
+
+    @traced('db')
+    async def set_bot_state(self, key: str, value: str):
+        query = """
+        INSERT INTO bot_state (key, value) VALUES ($1, $2)
+        ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value, update_date = CURRENT_TIMESTAMP
+        """
+        async with self.pool.acquire() as conn:
+            await conn.execute(query, key, value)
+
 db = Database()
@@ -8,56 +8,128 @@ root_path = Path(__file__).resolve().parent.parent
 if str(root_path) not in sys.path:
     sys.path.append(str(root_path))
 
+import asyncio
 import discord
+from discord import app_commands
 from discord.ext import commands
 from src.database import db
+from src.utils.sharding import shard_config
+from src.utils.command_sync import sync_if_changed
+from src.utils.startup import Startup
 
-from logging.handlers import RotatingFileHandler
+import queue
+import atexit
+from logging.handlers import RotatingFileHandler, QueueListener
+from src.utils.log_queue import DeferredQueueHandler
 
 # Configure logging
 log_dir = os.path.join(root_path, 'logs')
 os.makedirs(log_dir, exist_ok=True)
 
+# Formatting and file I/O (including rotation) run on the QueueListener thread;
+# logging from the event loop costs the `msg % args` merge and an enqueue (see src/utils/log_queue.py).
+log_formatter = logging.Formatter(
+    '[%(asctime)s] [%(levelname)-8s] %(name)s: %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+log_handlers = [
+    logging.StreamHandler(sys.stdout),
+    RotatingFileHandler(
+        os.path.join(log_dir, 'bot.log'),
+        maxBytes=5*1024*1024,
+        backupCount=5,
+        encoding='utf-8'
+    )
+]
+for handler in log_handlers:
+    handler.setFormatter(log_formatter)
+
+log_queue = queue.SimpleQueue()
+log_listener = QueueListener(log_queue, *log_handlers, respect_handler_level=True)
+log_listener.start()
+atexit.register(log_listener.stop)
+
 logging.basicConfig(
-    level=logging.INFO,
-    format='[%(asctime)s] [%(levelname)-8s] %(name)s: %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        RotatingFileHandler(
-            os.path.join(log_dir, 'bot.log'),
-            maxBytes=5*1024*1024,
-            backupCount=5,
-            encoding='utf-8'
-        )
-    ]
+    level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+    handlers=[DeferredQueueHandler(log_queue)]
 )
 logger = logging.getLogger(__name__)
 
-class LOLBot(commands.Bot):
+class GatedCommandTree(app_commands.CommandTree):
+    """Turns interactions away until every startup stage has finished (see src/utils/startup.py)."""
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if self.client.startup.ready.is_set():
+            return True
+        # Autocomplete interactions can't be answered with a message
+        if interaction.type is discord.InteractionType.application_command:
+            await interaction.response.send_message("Botを起動中です。数秒後にもう一度お試しください。", ephemeral=True)
+        return False
+
+class LOLBot(commands.AutoShardedBot):
     def __init__(self):
         intents = discord.Intents.default()
         intents.message_content = True
         intents.members = True
+        # SHARD_COUNT / SHARD_IDS split the guilds across processes; unset, discord.py picks the shard count
         super().__init__(
             command_prefix='!',
             intents=intents,
-            help_command=None
+            help_command=None,
+            shard_count=shard_config.shard_count,
+            shard_ids=shard_config.shard_ids,
+            tree_cls=GatedCommandTree
         )
+        self.metrics_server = None
+        self.loop_watchdog = None
+        self.startup = Startup()
+        self._startup_task = None
             
     async def setup_hook(self):
-        # Connect to Database
-        await db.connect()
-        logger.info("Connected to Database")
+        # discord.py opens the gateway only once this returns, so database work runs in
+        # startup stages alongside it; cogs add their own stages from cog_load
+        self.startup.mark('login')
+        # Event-loop lag monitor / blocking-call detector
+        if os.getenv('LOOP_WATCHDOG', '1') != '0':
+            from src.utils.loop_watchdog import LoopWatchdog
+            self.loop_watchdog = LoopWatchdog(
+                threshold=float(os.getenv('LOOP_LAG_THRESHOLD', '0.5')),
+                debug=os.getenv('LOOP_DEBUG') == '1'
+            )
+            self.loop_watchdog.start()
+
+        # Connect to Database (pool and migrations)
+        self.startup.stage('database', self.connect_database())
+
+        # Optional Prometheus metrics endpoint
+        metrics_port = os.getenv('METRICS_PORT')
+        if metrics_port:
+            from src.utils.metrics import MetricsServer
+            self.metrics_server = MetricsServer(os.getenv('METRICS_HOST', '0.0.0.0'), int(metrics_port))
+            await self.metrics_server.start()
         
         # Load extensions
         await self.load_extension('src.cogs.register')
         await self.load_extension('src.cogs.scheduler')
         await self.load_extension('src.cogs.utils')
         
-        # Sync slash commands
-        await self.tree.sync()
-        logger.info("Global slash commands synced")
+        self.startup.stage('command_sync', self.sync_commands())
+        self._startup_task = asyncio.create_task(self.finish_startup())
+
+    async def connect_database(self):
+        await db.connect()
+        logger.info("Connected to Database")
+
+    async def sync_commands(self):
+        await self.startup.wait('database')
+        # Sync slash commands, only when the tree changed since the last sync
+        await sync_if_changed(self.tree, self.application_id)
+
+    async def finish_startup(self):
+        if not await self.startup.finish():
+            # Same outcome as a failing setup_hook before: stop and let the supervisor restart us
+            logger.error(f"Startup failed ({', '.join(self.startup.failed)}), shutting down")
+            await self.close()
 
     async def on_message(self, message):
         if message.author.bot:
@@ -70,11 +142,19 @@ class LOLBot(commands.Bot):
         await self.process_commands(message)
 
     async def close(self):
-        await db.close()
-        await super().close()
+        if self.loop_watchdog:
+            self.loop_watchdog.stop()
+        if self.metrics_server:
+            await self.metrics_server.stop()
+        try:
+            # Unloads the cogs first: the scheduler's fetch queue and leader lock still hold pooled connections
+            await super().close()
+        finally:
+            await db.close()
 
     async def on_ready(self):
-        logger.info(f'Logged in as {self.user} (ID: {self.user.id})')
+        self.startup.mark('gateway_ready')
+        logger.info(f'Logged in as {self.user} (ID: {self.user.id}, shards: {sorted(self.shards)} of {self.shard_count})')
 
 def main():
     # Attempt to get token from environment variables
@@ -96,7 +176,8 @@ def main():
         token = 'M' + token
 
     bot = LOLBot()
-    bot.run(token)
+    # Logging is already configured above; keep discord.py from adding its own root handler
+    bot.run(token, log_handler=None)
 
 if __name__ == '__main__':
     main()
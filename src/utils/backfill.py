@@ -0,0 +1,139 @@
+"""
+Admin-triggered historical backfill (`/admin backfill`).
+
+A backfill streams every registered summoner's OP.GG tier history into
+rank_history (see Scheduler.backfill_history). It runs outside the fetch queue
+so it can report how many rows it inserted and how many days were already
+present, with its own worker pool sized by the admin; the OP.GG client's
+adaptive limiter still bounds the requests actually in flight.
+"""
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import date
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from src.utils.opgg_client import opgg_client
+from src.utils.opgg_compat import Region
+from src.utils.opgg_resilience import CircuitOpenError, OPGGUnavailable
+
+logger = logging.getLogger(__name__)
+
+# Summoner search + tier history
+REQUESTS_PER_SUMMONER = 2
+
+
+def group_by_summoner(users) -> Dict[str, List]:
+    """Registrations keyed by Riot ID, so each summoner is fetched once however many servers registered it."""
+    groups = defaultdict(list)
+    for u in users:
+        if u['riot_id'] and '#' in u['riot_id']:
+            groups[u['riot_id']].append(u)
+    return dict(groups)
+
+
+class BackfillRun:
+    """One backfill: its work list, live counters and the text of its progress message."""
+
+    def __init__(self, server_id: Optional[int], groups: Dict[str, List], concurrency: int, before: date,
+                 max_attempts: int = 3):
+        self.server_id = server_id
+        self.groups = groups
+        self.concurrency = concurrency
+        self.before = before
+        self.max_attempts = max_attempts
+        self.done = 0
+        self.failed = 0
+        self.inserted = 0
+        self.skipped = 0
+        self.started = time.monotonic()
+        self.finished_at = None
+
+    @property
+    def scope(self) -> str:
+        return "全サーバー" if self.server_id is None else "このサーバー"
+
+    @property
+    def total(self) -> int:
+        return len(self.groups)
+
+    @property
+    def registrations(self) -> int:
+        return sum(len(users) for users in self.groups.values())
+
+    @property
+    def estimated_requests(self) -> int:
+        return self.total * REQUESTS_PER_SUMMONER
+
+    def estimate_text(self) -> str:
+        return (f"対象: {self.scope} / サマナー {self.total} 人（登録 {self.registrations} 件）\n"
+                f"OPGGリクエスト数の見込み: 約 {self.estimated_requests} 件"
+                f"（リトライ込みで最大 {self.estimated_requests * self.max_attempts} 件）、並列数 {self.concurrency}")
+
+    def progress_text(self) -> str:
+        elapsed = (self.finished_at or time.monotonic()) - self.started
+        processed = self.done + self.failed
+        if self.finished_at:
+            head = f"✅ 履歴の取り込みが完了しました（{self.scope}、{elapsed:.0f}秒）"
+        else:
+            head = f"⏳ 履歴を取り込み中…（{self.scope}、{elapsed:.0f}秒経過）"
+        return (f"{head}\n"
+                f"サマナー: {processed}/{self.total}（成功 {self.done}、失敗 {self.failed}）\n"
+                f"追加した行: {self.inserted} / 既存のためスキップ: {self.skipped}")
+
+    async def run(self, backfill_history: Callable[..., Awaitable[tuple]]):
+        """Backfill every summoner with `concurrency` workers (see Scheduler.backfill_history)."""
+        queue = asyncio.Queue()
+        for riot_id, users in self.groups.items():
+            queue.put_nowait((riot_id, users))
+
+        async def worker():
+            while True:
+                try:
+                    riot_id, users = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                if await self._backfill_one(riot_id, users, backfill_history):
+                    self.done += 1
+                else:
+                    self.failed += 1
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(min(self.concurrency, self.total) or 1)))
+        finally:
+            self.finished_at = time.monotonic()
+        logger.info(f"Backfill ({self.scope}) finished: {self.done}/{self.total} summoners, "
+                    f"{self.inserted} rows inserted, {self.skipped} already present")
+
+    async def _backfill_one(self, riot_id: str, users, backfill_history) -> bool:
+        name, tag = riot_id.split('#', 1)
+        # Rows of this summoner's history already in the counters. A retry streams the
+        # history again from the start, and the rows an interrupted attempt flushed are
+        # now present; they were counted as inserted then and must not count as skipped.
+        counted = 0
+        for attempt in range(self.max_attempts):
+            position = 0
+
+            def on_flush(rows: int, inserted: int):
+                nonlocal position, counted
+                new = rows - min(max(counted - position, 0), rows)
+                self.inserted += inserted
+                self.skipped += max(new - inserted, 0)
+                position += rows
+                counted = max(counted, position)
+
+            try:
+                summoner = await opgg_client.get_summoner(name, tag, Region.JP)
+                if not summoner:
+                    logger.warning(f"Backfill: user not found on OPGG: {riot_id}")
+                    return False
+                await backfill_history(users, summoner.summoner_id, before=self.before, on_flush=on_flush)
+                return True
+            except (CircuitOpenError, OPGGUnavailable) as e:
+                logger.warning(f"Backfill of {riot_id} interrupted ({e}), attempt {attempt + 1}/{self.max_attempts}")
+                await opgg_client.breaker.wait_until_ready()
+            except Exception as e:
+                logger.error(f"Backfill of {riot_id} failed: {e}", exc_info=True)
+                return False
+        return False
@@ -0,0 +1,53 @@
+"""
+Global slash-command sync, only when the command tree changed.
+
+`tree.sync()` is a slow, rate-limited Discord API call, and used to run on
+every start of every process. The tree is now hashed from the same payload
+sync would upload (names, descriptions, options, permissions) and the hash is
+kept in `bot_state`, per application. Startup syncs only when the hash differs,
+so an ordinary restart (or a crash loop) skips it. FORCE_COMMAND_SYNC=1 syncs
+anyway; `!sync` / `!unsync` remain the manual per-guild overrides.
+"""
+import hashlib
+import json
+import logging
+import os
+
+from src.database import db
+
+logger = logging.getLogger(__name__)
+
+FORCE_COMMAND_SYNC = os.getenv('FORCE_COMMAND_SYNC') == '1'
+
+
+def _payload(command, tree) -> dict:
+    try:
+        return command.to_dict(tree)
+    except TypeError:
+        # discord.py < 2.4 takes no tree argument
+        return command.to_dict()
+
+
+def tree_hash(tree) -> str:
+    """SHA-256 of the global command payloads, independent of registration order."""
+    payloads = sorted((_payload(c, tree) for c in tree.get_commands()),
+                      key=lambda p: (p.get('type', 1), p['name']))
+    encoded = json.dumps(payloads, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def state_key(application_id: int) -> str:
+    return f"command_tree_hash:{application_id}"
+
+
+async def sync_if_changed(tree, application_id: int) -> bool:
+    """Sync global commands unless the stored hash matches the current tree. Returns whether it synced."""
+    current = tree_hash(tree)
+    key = state_key(application_id)
+    if not FORCE_COMMAND_SYNC and await db.get_bot_state(key) == current:
+        logger.info(f"Global slash commands unchanged ({current[:12]}), skipping sync")
+        return False
+    synced = await tree.sync()
+    await db.set_bot_state(key, current)
+    logger.info(f"Global slash commands synced ({len(synced)} commands, {current[:12]})")
+    return True
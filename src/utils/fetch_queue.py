@@ -0,0 +1,163 @@
+"""
+Postgres-backed work queue for OP.GG rank fetches.
+
+Every fetch (interactive /fetch, /fetch all, scheduled-report refreshes and the
+nightly collection) is a row in `fetch_jobs`, keyed by (riot_id, fetch_date).
+Enqueueing a summoner that already has a queued or running job for that day
+merges into it, so overlapping callers never fetch the same summoner twice.
+Workers claim jobs in priority order with `FOR UPDATE SKIP LOCKED`, which lets
+any number of workers, in any number of processes, drain the queue safely.
+A worker renews its lease while the handler runs, so a long backfill keeps its
+job; a worker that dies holding a job loses it once the lease expires.
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+from datetime import date
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+from src.database import db
+from src.utils import tracing
+from src.utils.opgg_client import opgg_client
+from src.utils.opgg_resilience import CircuitOpenError, OPGGUnavailable
+
+logger = logging.getLogger(__name__)
+
+# Lower runs first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_REPORT = 10
+PRIORITY_COLLECTION = 50
+PRIORITY_BACKFILL = 100
+
+FINISHED = ('DONE', 'FAILED')
+
+# Trace attribute naming where a job came from, by its priority
+ORIGINS = {
+    PRIORITY_INTERACTIVE: 'interactive',
+    PRIORITY_REPORT: 'report',
+    PRIORITY_COLLECTION: 'collection',
+    PRIORITY_BACKFILL: 'backfill',
+}
+
+
+class FetchQueue:
+    def __init__(self, handler: Callable[[dict], Awaitable[bool]], workers: int = 4, poll_interval: float = 2.0,
+                 lease_seconds: float = 300.0, max_attempts: int = 3):
+        """`handler(job)` performs one fetch and returns whether it succeeded."""
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks = []
+        self._wake: Optional[asyncio.Event] = None
+
+    def start(self):
+        if self._tasks:
+            return
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(n)) for n in range(self.workers)]
+        logger.info(f"Fetch queue started with {self.workers} workers ({self.worker_id})")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def enqueue(self, riot_ids: Iterable[str], fetch_date: date, priority: int, backfill: bool = False) -> Dict[str, int]:
+        """Queue fetches for these Riot IDs. Returns {riot_id: job_id}."""
+        riot_ids = [r for r in dict.fromkeys(riot_ids) if r]
+        if not riot_ids:
+            return {}
+        jobs = await db.enqueue_fetch_jobs(riot_ids, fetch_date, priority, backfill)
+        if self._wake:
+            self._wake.set()
+        return jobs
+
+    async def wait(self, job_ids: Iterable[int], timeout: float = None) -> Dict[int, str]:
+        """Poll until every job is DONE or FAILED (or `timeout` passes). Returns {job_id: status}."""
+        pending = set(job_ids)
+        statuses = {}
+        deadline = time.monotonic() + timeout if timeout else None
+        delay = 0.25
+        while pending:
+            current = await db.get_fetch_job_statuses(pending)
+            for job_id, status in current.items():
+                if status in FINISHED:
+                    statuses[job_id] = status
+                    pending.discard(job_id)
+            # Purged jobs are long finished; don't wait on them
+            pending &= current.keys()
+            if not pending or (deadline and time.monotonic() >= deadline):
+                break
+            await asyncio.sleep(delay)
+            delay = min(self.poll_interval, delay * 2)
+        for job_id in pending:
+            statuses[job_id] = 'PENDING'
+        return statuses
+
+    async def _worker(self, n: int):
+        while True:
+            try:
+                # Nothing can succeed while the breaker is open; leave the jobs queued
+                await opgg_client.breaker.wait_until_ready()
+                # Cleared before claiming so an enqueue racing with an empty claim still wakes us
+                self._wake.clear()
+                job = await db.claim_fetch_job(self.worker_id, self.lease_seconds)
+                if job is None:
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Fetch queue worker {n} error: {e}", exc_info=True)
+                await asyncio.sleep(self.poll_interval)
+
+    async def _run(self, job):
+        if job['attempts'] > self.max_attempts:
+            await db.complete_fetch_job(job['id'], self.worker_id, 'FAILED', 'too many attempts')
+            return
+        heartbeat = asyncio.create_task(self._renew_lease(job))
+        try:
+            # Workers run outside the enqueuer's trace, so each job gets its own OP.GG/DB breakdown
+            with tracing.trace("job.fetch", job_id=job['id'], riot_id=job['riot_id'],
+                               kind='backfill' if job['backfill'] else 'fetch',
+                               origin=ORIGINS.get(job['priority'], str(job['priority'])),
+                               attempt=job['attempts']):
+                ok = await self.handler(job)
+        except CircuitOpenError as e:
+            # Not the job's fault: requeue for when the breaker lets requests through
+            await db.release_fetch_job(job['id'], self.worker_id, e.retry_in, count_attempt=False)
+            return
+        except OPGGUnavailable as e:
+            if job['attempts'] < self.max_attempts:
+                await db.release_fetch_job(job['id'], self.worker_id, opgg_client.breaker.retry_in or 30)
+            else:
+                await db.complete_fetch_job(job['id'], self.worker_id, 'FAILED', str(e))
+            return
+        except Exception as e:
+            logger.error(f"Fetch job {job['id']} ({job['riot_id']}) failed: {e}", exc_info=True)
+            ok = False
+        finally:
+            heartbeat.cancel()
+        await db.complete_fetch_job(job['id'], self.worker_id, 'DONE' if ok else 'FAILED')
+
+    async def _renew_lease(self, job):
+        """Keep the job's lease alive while its handler runs."""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                if not await db.renew_fetch_job_lease(job['id'], self.worker_id):
+                    logger.warning(f"Fetch job {job['id']} ({job['riot_id']}) lease lost to another worker")
+                    return
+            except Exception as e:
+                # Try again next beat; the lease still has two thirds of its time left
+                logger.warning(f"Failed to renew lease of fetch job {job['id']}: {e}")
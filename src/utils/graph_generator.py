@@ -5,6 +5,8 @@ import matplotlib
 from datetime import datetime, date, timedelta
 import io
 import os
+from src.utils import image_encoding
+from src.utils.rank_history import UserHistory
 
 # Set Japanese font for Windows and Linux (Railway)
 # Use local font file for better portability
@@ -66,10 +68,76 @@ def numeric_to_rank(val: int) -> str:
     
     return f"{tier} {div}"
 
-def generate_rank_graph(user_data: Dict[str, List[Dict[str, Any]]], period_type: str, title_suffix: str = "") -> io.BytesIO:
+# Downsampling before plotting: monthly graphs use one point per week, and no
+# series draws more than MAX_POINTS_PER_SERIES points, so render time stays flat
+# however much history there is. Single-user graphs label at most
+# MAX_ANNOTATIONS points, and multi-user graphs label each user's last point only
+# up to MAX_ANNOTATIONS users.
+MAX_POINTS_PER_SERIES = 60
+MAX_ANNOTATIONS = 12
+MAX_X_TICKS = 16
+
+def last_per_week(history: UserHistory) -> UserHistory:
+    """Keep the last entry of each ISO (Monday-based) week."""
+    keep = []
+    prev_week = None
+    for i, o in enumerate(history.ordinals):
+        # Ordinal 1 (0001-01-01) is a Monday, so this numbers ISO weeks
+        week = (o - 1) // 7
+        if keep and week == prev_week:
+            keep[-1] = i
+        else:
+            keep.append(i)
+        prev_week = week
+    return history.take(keep)
+
+def lttb_indices(xs: List[float], ys: List[float], threshold: int) -> List[int]:
+    """Largest-Triangle-Three-Buckets: indices of `threshold` points that keep the series' shape."""
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+    indices = [0]
+    bucket = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * bucket) + 1
+        end = int((i + 1) * bucket) + 1
+        # Average of the next bucket is the third triangle vertex
+        next_end = min(int((i + 2) * bucket) + 1, n)
+        if end < next_end:
+            avg_x = sum(xs[end:next_end]) / (next_end - end)
+            avg_y = sum(ys[end:next_end]) / (next_end - end)
+        else:
+            avg_x, avg_y = xs[-1], ys[-1]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((xs[a] - avg_x) * (ys[j] - ys[a]) - (xs[a] - xs[j]) * (avg_y - ys[a]))
+            if area > best_area:
+                best, best_area = j, area
+        indices.append(best)
+        a = best
+    indices.append(n - 1)
+    return indices
+
+def downsample(history: UserHistory, period_type: str, max_points: int = MAX_POINTS_PER_SERIES) -> UserHistory:
+    """Entries to plot for one series: weekly last values for monthly graphs, then LTTB down to `max_points`."""
+    if period_type == 'monthly':
+        history = last_per_week(history)
+    if len(history) > max_points:
+        history = history.take(lttb_indices(history.ordinals, history.values, max_points))
+    return history
+
+def annotation_indices(count: int, limit: int = MAX_ANNOTATIONS) -> List[int]:
+    """At most `limit` evenly spaced indices out of `count`, always including the last one."""
+    if count <= limit:
+        return list(range(count))
+    step = (count - 1) / (limit - 1)
+    return sorted({round(i * step) for i in range(limit)})
+
+def generate_rank_graph(user_data: Dict[str, UserHistory], period_type: str, title_suffix: str = "") -> io.BytesIO:
     """
     Generate a rank history graph for one or more users.
-    user_data: Dict mapping riot_id -> List of historical entries {'fetch_date', 'tier', 'rank', 'lp'}
+    user_data: Dict mapping riot_id -> UserHistory (see src/utils/rank_history.py)
     period_type: 'daily', 'weekly', 'monthly'
     title_suffix: Optional suffix for the title
     """
@@ -87,20 +155,20 @@ def generate_rank_graph(user_data: Dict[str, List[Dict[str, Any]]], period_type:
     all_dates = []
     all_values = []
     
-    for i, (riot_id, rows) in enumerate(user_data.items()):
-        if not rows:
+    for i, (riot_id, history) in enumerate(user_data.items()):
+        if not history:
             continue
             
         # Filter by year logic (consistent with previous requirement)
-        latest_date = max(r['fetch_date'] for r in rows)
-        earliest_date = min(r['fetch_date'] for r in rows)
-        if earliest_date.year < latest_date.year:
-            start_filter = date(latest_date.year, 1, 1)
-            rows = [r for r in rows if r['fetch_date'] >= start_filter]
-            if not rows: continue
-
-        dates = [r['fetch_date'] for r in rows]
-        values = [rank_to_numeric(r['tier'], r['rank'], r['lp']) for r in rows]
+        latest_date = history.date(-1)
+        if history.date(0).year < latest_date.year:
+            history = history.since(date(latest_date.year, 1, 1))
+            if not history: continue
+
+        history = downsample(history, period_type)
+        dates = history.dates()
+        values = history.values.tolist()
+        lps = history.lps
         
         all_dates.extend(dates)
         all_values.extend(values)
@@ -108,19 +176,21 @@ def generate_rank_graph(user_data: Dict[str, List[Dict[str, Any]]], period_type:
         color = colors[i % len(colors)]
         name = riot_id.split('#')[0]
         
+        # Past the annotation cap, each user's latest LP goes in the legend instead of on the plot
+        label = name if len(user_data) <= MAX_ANNOTATIONS else f"{name}: {lps[-1]}LP"
+
         # Plot line
-        plt.plot(dates, values, marker='o', linestyle='-', color=color, linewidth=2, markersize=5, label=name)
+        plt.plot(dates, values, marker='o', linestyle='-', color=color, linewidth=2, markersize=5, label=label)
         
-        # Add LP annotations only for the latest point if multiple users, or all points if single user
+        # Add LP annotations only for the latest point if multiple users, or up to MAX_ANNOTATIONS points if single user
         if len(user_data) == 1:
-            for j, r in enumerate(rows):
-                ax.annotate(f"{r['lp']}LP", (dates[j], values[j]), 
+            for j in annotation_indices(len(history)):
+                ax.annotate(f"{lps[j]}LP", (dates[j], values[j]), 
                             textcoords="offset points", xytext=(0, 10), ha='center', 
                             fontsize=9, color='white', alpha=0.8)
-        else:
+        elif len(user_data) <= MAX_ANNOTATIONS:
             # Annotate only the last point for clarity in multi-user graphs
-            last_r = rows[-1]
-            ax.annotate(f"{name}: {last_r['lp']}LP", (dates[-1], values[-1]), 
+            ax.annotate(f"{name}: {lps[-1]}LP", (dates[-1], values[-1]), 
                         textcoords="offset points", xytext=(0, 10), ha='center', 
                         fontsize=9, color=color, weight='bold')
 
@@ -136,15 +206,17 @@ def generate_rank_graph(user_data: Dict[str, List[Dict[str, Any]]], period_type:
         spine.set_color('#7f8c8d')
 
     # Date Formatting
+    # Tick labels are a large part of the render cost, so their number is capped too
+    span_days = (max(all_dates) - min(all_dates)).days + 1 if all_dates else 1
     if period_type == 'daily':
         ax.xaxis.set_major_formatter(mdates.DateFormatter('%m/%d'))
-        ax.xaxis.set_major_locator(mdates.DayLocator())
+        ax.xaxis.set_major_locator(mdates.DayLocator(interval=max(1, -(-span_days // MAX_X_TICKS))))
     elif period_type == 'weekly':
         ax.xaxis.set_major_formatter(mdates.DateFormatter('%m/%d'))
-        ax.xaxis.set_major_locator(mdates.WeekdayLocator(byweekday=mdates.MO))
+        ax.xaxis.set_major_locator(mdates.WeekdayLocator(byweekday=mdates.MO, interval=max(1, -(-span_days // (7 * MAX_X_TICKS)))))
     else: # monthly
         ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y/%m'))
-        ax.xaxis.set_major_locator(mdates.MonthLocator())
+        ax.xaxis.set_major_locator(mdates.MonthLocator(interval=max(1, -(-span_days // (31 * MAX_X_TICKS)))))
 
     plt.xticks(rotation=45)
 
@@ -171,9 +243,7 @@ def generate_rank_graph(user_data: Dict[str, List[Dict[str, Any]]], period_type:
 
     plt.grid(True, linestyle='--', alpha=0.1, color='#95a5a6')
 
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png', bbox_inches='tight', transparent=False, dpi=110)
-    buf.seek(0)
+    buf = image_encoding.encode_figure(plt.gcf(), 110, "rank_graph", bbox_inches='tight', transparent=False)
     plt.close()
     return buf
 
@@ -234,8 +304,19 @@ def generate_report_image(headers: List[str], data: List[List[Any]], title: str,
 
     plt.title(title, fontsize=18, color=text_color, pad=30, weight='bold')
 
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png', bbox_inches='tight', transparent=False, dpi=120, facecolor='#34495e')
-    buf.seek(0)
+    buf = image_encoding.encode_figure(fig, 120, "report_table", bbox_inches='tight', transparent=False, facecolor='#34495e')
     plt.close()
     return buf
+
+
+# Table renderers selectable per schedule (schedules.renderer)
+REPORT_RENDERERS = ('matplotlib', 'pillow')
+DEFAULT_REPORT_RENDERER = 'matplotlib'
+
+
+def get_report_renderer(name: str = None):
+    """generate_report_image implementation for a renderer name ('matplotlib' or 'pillow')."""
+    if name == 'pillow':
+        from src.utils.table_renderer import generate_report_image as render
+        return render
+    return generate_report_image
@@ -0,0 +1,97 @@
+"""
+Output encoding for rendered graphs and report tables.
+
+Renderers hand over a matplotlib figure or a Pillow image and get back a
+BytesIO in the configured format:
+
+- `png`:  full-colour PNG (the default, and the previous output)
+- `png8`: PNG quantised to an adaptive palette, opt-in. Much smaller, but a
+          visible change: without dithering, gradients and anti-aliased edges
+          (graph lines, text) can band or step where 256 colours run out.
+- `webp`: lossless (or, with IMAGE_WEBP_QUALITY < 100, lossy) WebP
+
+Size and encode time are logged per image, and the time is recorded as a
+`render.encode` span. Callers name the upload with `filename()` so the
+extension matches the format.
+"""
+import io
+import logging
+import os
+import time
+
+from PIL import Image
+
+from src.utils import tracing
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {'png': 'png', 'png8': 'png', 'webp': 'webp'}
+
+IMAGE_FORMAT = os.getenv('IMAGE_FORMAT', 'png').lower()
+if IMAGE_FORMAT not in FORMATS:
+    logger.warning(f"Unknown IMAGE_FORMAT {IMAGE_FORMAT!r}, using png")
+    IMAGE_FORMAT = 'png'
+# zlib level for PNG output (0-9)
+IMAGE_COMPRESS_LEVEL = int(os.getenv('IMAGE_COMPRESS_LEVEL', '6'))
+# Palette size for png8
+IMAGE_COLORS = int(os.getenv('IMAGE_COLORS', '256'))
+# 100 means lossless
+IMAGE_WEBP_QUALITY = int(os.getenv('IMAGE_WEBP_QUALITY', '100'))
+# Overrides the per-chart dpi of matplotlib output (graphs 110, tables 120) when set
+IMAGE_DPI = int(os.getenv('IMAGE_DPI')) if os.getenv('IMAGE_DPI') else None
+
+
+def filename(stem: str) -> str:
+    """Upload name for an image produced by this module, e.g. 'rank_graph.webp'."""
+    return f"{stem}.{FORMATS[IMAGE_FORMAT]}"
+
+
+def encode_image(image: Image.Image, label: str = "image") -> io.BytesIO:
+    """Encode a Pillow image in the configured format."""
+    started = time.perf_counter()
+    buf = io.BytesIO()
+    with tracing.span("render.encode", format=IMAGE_FORMAT) as s:
+        if IMAGE_FORMAT == 'png8':
+            rgb = image.convert('RGB') if image.mode != 'RGB' else image
+            # No dithering: it adds noise to flat fills and makes the file bigger
+            rgb.quantize(IMAGE_COLORS, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE).save(
+                buf, format='PNG', compress_level=IMAGE_COMPRESS_LEVEL)
+        elif IMAGE_FORMAT == 'webp':
+            if IMAGE_WEBP_QUALITY >= 100:
+                image.save(buf, format='WEBP', lossless=True)
+            else:
+                image.save(buf, format='WEBP', quality=IMAGE_WEBP_QUALITY)
+        else:
+            image.save(buf, format='PNG', compress_level=IMAGE_COMPRESS_LEVEL)
+        s.attributes['bytes'] = buf.tell()
+    _log(label, image.size, buf.tell(), started)
+    buf.seek(0)
+    return buf
+
+
+def encode_figure(fig, dpi: int, label: str = "figure", **savefig_kwargs) -> io.BytesIO:
+    """Save a matplotlib figure in the configured format. `dpi` is the chart's default, IMAGE_DPI wins if set."""
+    dpi = IMAGE_DPI or dpi
+    if IMAGE_FORMAT == 'png':
+        # Plain PNG straight from matplotlib; no Pillow round trip. The span includes the drawing here.
+        started = time.perf_counter()
+        buf = io.BytesIO()
+        with tracing.span("render.encode", format=IMAGE_FORMAT) as s:
+            fig.savefig(buf, format='png', dpi=dpi, pil_kwargs={'compress_level': IMAGE_COMPRESS_LEVEL}, **savefig_kwargs)
+            s.attributes['bytes'] = buf.tell()
+        _log(label, None, buf.tell(), started)
+        buf.seek(0)
+        return buf
+    # For png8 / webp, an uncompressed PNG is the cheapest lossless hand-off that still honours bbox_inches='tight',
+    # and keeps the logged encode time separate from matplotlib's drawing
+    raw = io.BytesIO()
+    fig.savefig(raw, format='png', dpi=dpi, pil_kwargs={'compress_level': 0}, **savefig_kwargs)
+    raw.seek(0)
+    with Image.open(raw) as image:
+        return encode_image(image, label)
+
+
+def _log(label: str, size, nbytes: int, started: float):
+    dims = f" {size[0]}x{size[1]}" if size else ""
+    logger.info("Encoded %s as %s%s: %.1f KiB in %.1f ms", label, IMAGE_FORMAT, dims, nbytes / 1024,
+                (time.perf_counter() - started) * 1000)
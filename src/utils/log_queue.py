@@ -0,0 +1,21 @@
+"""
+Queue handler that leaves formatting to the QueueListener thread.
+
+The stdlib QueueHandler.prepare() runs the handler's formatter on the calling
+thread (the event loop here) before enqueueing, so only the file I/O moved off
+it. DeferredQueueHandler only resolves `msg % args` there (cheap, and it must
+happen before the arguments can change), and enqueues the record itself; each
+handler behind the listener formats it with its own formatter (timestamp,
+padding, traceback text) on the listener thread.
+"""
+import copy
+import logging
+from logging.handlers import QueueHandler
+
+
+class DeferredQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
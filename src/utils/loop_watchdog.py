@@ -0,0 +1,89 @@
+"""
+Event-loop lag monitor and blocking-call detector.
+
+A heartbeat task measures how late the loop wakes it up (loop lag). A separate
+daemon thread watches that heartbeat; when it stalls for longer than the
+threshold, the loop thread is blocked inside a synchronous call, so the thread
+captures that call's stack and logs it while it is still running.
+
+Optional debug mode turns on asyncio's own debug instrumentation with
+`loop.slow_callback_duration` set to the same threshold, which logs every
+slow callback/task step through the 'asyncio' logger.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from src.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class LoopWatchdog:
+    def __init__(self, interval: float = 0.25, threshold: float = 0.5, debug: bool = False):
+        self.interval = interval
+        self.threshold = threshold
+        self.debug = debug
+        self.max_lag = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def start(self):
+        """Start monitoring the running loop. Must be called from the loop thread."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+
+        if self.debug:
+            self._loop.set_debug(True)
+            self._loop.slow_callback_duration = self.threshold
+            logger.info(f"asyncio debug mode enabled (slow_callback_duration={self.threshold}s)")
+
+        self._task = self._loop.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._monitor, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"Loop watchdog started (interval={self.interval}s, threshold={self.threshold}s)")
+
+    def stop(self):
+        self._stopping.set()
+        if self._task:
+            self._task.cancel()
+
+    async def _heartbeat(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            self._last_beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self._last_beat = time.monotonic()
+            self.max_lag = max(self.max_lag, lag)
+            metrics.event_loop_lag_seconds.observe(lag)
+            metrics.event_loop_lag_current.set(lag)
+            if lag > self.threshold:
+                logger.warning(f"Event loop lag {lag * 1000:.0f}ms (threshold {self.threshold * 1000:.0f}ms)")
+
+    def _monitor(self):
+        reported_beat = None
+        poll = min(self.interval, self.threshold / 2)
+        while not self._stopping.wait(poll):
+            beat = self._last_beat
+            stalled = time.monotonic() - beat
+            # Report each stall once, while the blocking call is still on the stack
+            if stalled > self.interval + self.threshold and beat != reported_beat:
+                reported_beat = beat
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is None:
+                    continue
+                stack = "".join(traceback.format_stack(frame))
+                logger.warning(
+                    f"Event loop blocked for {stalled * 1000:.0f}ms+; loop thread is currently executing:\n{stack}"
+                )
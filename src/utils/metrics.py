@@ -0,0 +1,235 @@
+"""
+Minimal Prometheus-style metrics for the worker.
+
+Counters, gauges and histograms live in a process-wide registry and are
+exported in the Prometheus text format by an optional aiohttp server running
+in the bot's event loop (enabled by setting METRICS_PORT).
+"""
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from aiohttp import web
+
+from src.utils import tracing
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LONG_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: Iterable[Tuple[str, str]] = ()) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs += [f'{n}="{_escape(v)}"' for n, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple, object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(kwargs[n] for n in self.labelnames)
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in list(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, key))
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def render(self, name, labelnames, key):
+        return [f"{name}{_format_labels(labelnames, key)} {self.value}"]
+
+
+class _GaugeChild(_CounterChild):
+    def set(self, value: float):
+        self.value = value
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def render(self, name, labelnames, key):
+        lines = []
+        cumulative = 0
+        for bound, c in zip(self.buckets, self.counts):
+            cumulative += c
+            lines.append(f"{name}_bucket{_format_labels(labelnames, key, [('le', repr(float(bound)))])} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels(labelnames, key, [('le', '+Inf')])} {self.count}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, key)} {self.sum}")
+        lines.append(f"{name}_count{_format_labels(labelnames, key)} {self.count}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+opgg_requests = registry.register(Counter(
+    "lolanalyzer_opgg_requests_total", "OP.GG HTTP requests by endpoint and response status.", ("endpoint", "status")))
+opgg_request_seconds = registry.register(Histogram(
+    "lolanalyzer_opgg_request_duration_seconds", "OP.GG HTTP request latency.", ("endpoint",)))
+collection_run_seconds = registry.register(Histogram(
+    "lolanalyzer_collection_run_duration_seconds", "Duration of rank collection runs.", ("scope",), buckets=LONG_BUCKETS))
+collection_users = registry.register(Counter(
+    "lolanalyzer_collection_users_total", "Users processed by rank collection runs.", ("result",)))
+render_seconds = registry.register(Histogram(
+    "lolanalyzer_render_duration_seconds", "Time spent rendering graphs and report images.", ("kind",)))
+db_query_seconds = registry.register(Histogram(
+    "lolanalyzer_db_query_duration_seconds", "Database call latency.", ("query",)))
+scheduler_job_lag_seconds = registry.register(Histogram(
+    "lolanalyzer_scheduler_job_lag_seconds", "Delay between a job's scheduled and actual start.", ("job",)))
+event_loop_lag_seconds = registry.register(Histogram(
+    "lolanalyzer_event_loop_lag_seconds", "Event-loop scheduling lag sampled by the loop watchdog.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)))
+event_loop_lag_current = registry.register(Gauge(
+    "lolanalyzer_event_loop_lag_current_seconds", "Most recent event-loop lag sample."))
+opgg_retries = registry.register(Counter(
+    "lolanalyzer_opgg_retries_total", "OP.GG request retries by endpoint and reason.", ("endpoint", "reason")))
+opgg_concurrency_limit = registry.register(Gauge(
+    "lolanalyzer_opgg_concurrency_limit", "Current adaptive (AIMD) limit on in-flight OP.GG requests."))
+opgg_circuit_open = registry.register(Gauge(
+    "lolanalyzer_opgg_circuit_open", "1 while the OP.GG circuit breaker is open."))
+leader = registry.register(Gauge(
+    "lolanalyzer_leader", "1 while this process holds the leader lock for global jobs."))
+
+
+def _on_span(s: tracing.Span):
+    # DB and render timings come from the tracing spans so call sites are instrumented once
+    if s.category == "db":
+        db_query_seconds.labels(s.name.split('.', 1)[-1]).observe(s.duration_ms / 1000)
+    elif s.category == "render":
+        render_seconds.labels(s.name.split('.', 1)[-1]).observe(s.duration_ms / 1000)
+
+
+tracing.add_listener(_on_span)
+
+
+def record_opgg_request(endpoint: str, status, started: float):
+    """Record one OP.GG HTTP call. `started` is a time.perf_counter() value."""
+    opgg_requests.labels(endpoint, status).inc()
+    opgg_request_seconds.labels(endpoint).observe(time.perf_counter() - started)
+
+
+def record_job_lag(job_name: str, scheduled_run_times):
+    """APScheduler EVENT_JOB_SUBMITTED hook payload: lag of each scheduled run time."""
+    now = time.time()
+    for run_time in scheduled_run_times or ():
+        scheduler_job_lag_seconds.labels(job_name).observe(max(0.0, now - run_time.timestamp()))
+
+
+class MetricsServer:
+    def __init__(self, host: str = "0.0.0.0", port: int = 9100):
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    async def _handle_metrics(self, request):
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Metrics server listening on http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
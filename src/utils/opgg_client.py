@@ -2,12 +2,33 @@ from src.utils.opgg_compat import Summoner, Region, Utils, IS_V2, OPGG
 import logging
 import asyncio
 import aiohttp
-from datetime import datetime
+import contextlib
+import json
+import os
+import time
+from src.utils import metrics
+from src.utils import tier_history
+from src.utils.opgg_parser import SummaryExtractor, UNRANKED, division_to_roman
+from src.utils.opgg_resilience import (
+    AdaptiveLimiter, Backoff, CircuitBreaker, OPGGUnavailable,
+    RETRYABLE_STATUSES, parse_retry_after,
+)
+from src.utils.tracing import traced
 
 logger = logging.getLogger(__name__)
 
+# orjson decodes straight from bytes and is several times faster than the stdlib on large payloads
+try:
+    import orjson
+    default_json_loads = orjson.loads
+except ImportError:
+    default_json_loads = json.loads
+
 class OPGGClient:
-    def __init__(self):
+    def __init__(self, json_loads=None, base_url: str = None):
+        self._json_loads = json_loads or default_json_loads
+        # Point every endpoint at one host (e.g. benchmarks/fake_opgg.py) instead of OP.GG
+        self.base_url = (base_url or os.getenv('OPGG_BASE_URL') or '').rstrip('/') or None
         # In v3, OPGG() is likely async-friendly. In v2, we avoid it due to asyncio.run()
         if not IS_V2:
             try:
@@ -26,31 +47,123 @@ class OPGGClient:
             self._headers = {
                 "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
             }
-        self._bypass_api_url = "https://lol-api-summoner.op.gg/api"
+        self._summary_extractor = SummaryExtractor()
+        self.backoff = Backoff(max_attempts=int(os.getenv('OPGG_MAX_ATTEMPTS', '4')))
+        self.limiter = AdaptiveLimiter(maximum=int(os.getenv('OPGG_MAX_CONCURRENCY', '4')))
+        self.breaker = CircuitBreaker(
+            failure_threshold=int(os.getenv('OPGG_BREAKER_THRESHOLD', '5')),
+            reset_timeout=float(os.getenv('OPGG_BREAKER_RESET_SECONDS', '30')),
+        )
+        self._timeout = aiohttp.ClientTimeout(total=float(os.getenv('OPGG_TIMEOUT_SECONDS', '15')))
+        self._bypass_api_url = f"{self.base_url or 'https://lol-api-summoner.op.gg'}/api"
+        self._web_api_url = f"{self.base_url or 'https://lol-web-api.op.gg'}/api"
+        if self.base_url:
+            # The library's own URLs (and its search helpers) would bypass the override
+            self.opgg_instance = None
+            self._search_api_url = None
+            self._summary_api_url = None
         if not getattr(self, "_search_api_url", None):
             self._search_api_url = f"{self._bypass_api_url}/v3/{{region}}/summoners?riot_id={{summoner_name}}%23{{tagline}}"
         if not getattr(self, "_summary_api_url", None):
             self._summary_api_url = f"{self._bypass_api_url}/{{region}}/summoners/{{summoner_id}}/summary"
 
+    async def _read_data(self, response, default=None):
+        """Decode a response body and return only its `data` subtree.
+
+        The body is read as bytes and handed to the configured decoder without an
+        intermediate str; the rest of the document is released as soon as this returns.
+        """
+        body = await response.read()
+        doc = self._json_loads(body)
+        if not isinstance(doc, dict):
+            return default
+        data = doc.get('data')
+        return default if data is None else data
+
+    @contextlib.asynccontextmanager
+    async def _open(self, endpoint: str, method: str, url: str, max_attempts: int = None):
+        """Send a request through the breaker, limiter and retry loop and yield the open response.
+
+        429, 5xx, timeouts and connection errors are retried with backoff; once
+        attempts run out OPGGUnavailable is raised, and CircuitOpenError is raised
+        without sending anything while the breaker is open. Any other status
+        (2xx, 404, ...) is yielded to the caller, which may stream the body; the
+        limiter slot is held until the caller is done with it.
+        """
+        attempts = max_attempts or self.backoff.max_attempts
+        for attempt in range(attempts):
+            self.breaker.before_request()
+            retry_after = None
+            yielded = False
+            started_slot = await self.limiter.acquire()
+            started = time.perf_counter()
+            try:
+                async with aiohttp.ClientSession(timeout=self._timeout) as session:
+                    async with session.request(method, url, headers=self._headers) as resp:
+                        status = resp.status
+                        metrics.record_opgg_request(endpoint, status, started)
+                        if status not in RETRYABLE_STATUSES:
+                            self.breaker.record_success()
+                            self.limiter.on_success()
+                            yielded = True
+                            yield resp
+                            return
+                        retry_after = parse_retry_after(resp.headers.get('Retry-After'))
+                reason = str(status)
+                if status == 429:
+                    self.limiter.on_throttle(started_slot)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if yielded:
+                    # Failed while the caller was reading the body; not ours to retry
+                    raise
+                metrics.record_opgg_request(endpoint, type(e).__name__, started)
+                reason = type(e).__name__
+            finally:
+                await self.limiter.release()
+
+            self.breaker.record_failure()
+            if attempt + 1 >= attempts:
+                break
+            delay = self.backoff.delay(attempt, retry_after)
+            metrics.opgg_retries.labels(endpoint, reason).inc()
+            logger.info("OP.GG %s failed (%s), retry %d/%d in %.1fs", endpoint, reason, attempt + 1, attempts - 1, delay)
+            await asyncio.sleep(delay)
+        raise OPGGUnavailable(f"OP.GG {endpoint} failed after {attempts} attempts ({reason})")
+
+    async def _request(self, endpoint: str, method: str, url: str, default=None, max_attempts: int = None):
+        """Like _open, but reads the whole body.
+
+        Returns (status, data) where data is the decoded `data` subtree for 2xx
+        responses and `default` otherwise.
+        """
+        async with self._open(endpoint, method, url, max_attempts) as resp:
+            if 200 <= resp.status < 300:
+                try:
+                    return resp.status, await self._read_data(resp, default)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    raise OPGGUnavailable(f"OP.GG {endpoint} body read failed ({type(e).__name__})") from e
+            return resp.status, default
+
     def _prepare_opgg_params(self, url):
         return {
             "base_api_url": url,
             "headers": self._headers
         }
 
+    @traced('opgg')
     async def get_summoner(self, name: str, tag: str, region: Region = Region.JP):
         """Fetch summoner info by name and tag (Async)."""
         query = f"{name}#{tag}"
-        logger.info(f"Searching for summoner: {query} (Region: {region}, IS_V2: {IS_V2})")
+        logger.debug("Searching for summoner: %s (region=%s, IS_V2=%s)", query, region, IS_V2)
         
         # v3 logic (if instance exists and is not v2)
-        if not IS_V2 and self.opgg_instance:
+        if not IS_V2 and self.opgg_instance and not self.base_url:
             try:
                 # Prefer search_async
                 search_method = self.opgg_instance.search
                 if hasattr(self.opgg_instance, 'search_async'):
                     search_method = self.opgg_instance.search_async
-                    logger.info("Using search_async method")
+                    logger.debug("Using search_async method")
                 
                 # Try Region object
                 res = await search_method(query, region=region)
@@ -62,7 +175,7 @@ class OPGGClient:
                     res = await search_method(query, region=region_str)
                 
                 if res and len(res) > 0:
-                    logger.info(f"v3 search found {len(res)} results for {query}")
+                    logger.debug("v3 search found %d results for %s", len(res), query)
                     # In v3 SearchResult has .summoner
                     return res[0].summoner if hasattr(res[0], 'summoner') else res[0]
                 else:
@@ -82,7 +195,7 @@ class OPGGClient:
         
         try:
             # 1. Try Utils if available
-            if Utils and hasattr(Utils, '_single_region_search'):
+            if Utils and hasattr(Utils, '_single_region_search') and not self.base_url:
                 try:
                     params["base_api_url"] = self._search_api_url
                     results = await Utils._single_region_search(query, region, params)
@@ -95,27 +208,29 @@ class OPGGClient:
 
             # 2. Try raw aiohttp request (Last resort)
             logger.info(f"Trying raw aiohttp search for {query}")
-            async with aiohttp.ClientSession() as session:
-                url = url_template
-                headers = self._headers
-                async with session.get(url, headers=headers) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        results = data.get('data', [])
-                        if results:
-                            logger.info(f"Raw aiohttp search found {len(results)} results")
-                            summoner_data = results[0]
-                            return Summoner(summoner_data)
-                    else:
-                        logger.error(f"Raw aiohttp search failed with status {response.status}")
+            status, results = await self._request('search', 'GET', url_template, [])
+            if results:
+                logger.info(f"Raw aiohttp search found {len(results)} results")
+                summoner_data = results[0]
+                return Summoner(summoner_data)
+            if status != 200:
+                logger.error(f"Raw aiohttp search failed with status {status}")
 
+        except OPGGUnavailable:
+            raise
         except Exception as e:
             logger.error(f"Fallback search error for {query}: {e}")
             
         return None
 
+    @traced('opgg')
     async def get_rank_info(self, summoner: Summoner):
-        """Fetch rank info for a summoner (Async)."""
+        """Fetch rank info for a summoner (Async).
+
+        Returns (tier, rank, lp, wins, losses), UNRANKED for a summoner without a
+        solo-queue entry, None when OP.GG gave no usable answer, and raises
+        OPGGUnavailable when it could not be reached.
+        """
         try:
             region_str = "jp"
             url = self._summary_api_url.format(
@@ -123,190 +238,88 @@ class OPGGClient:
                 summoner_id=summoner.summoner_id
             )
             
-            profile_data = None
-            # Direct aiohttp fetch
-            logger.info(f"Fetching rank info via aiohttp: {url}")
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=self._headers) as resp:
-                    logger.info(f"Rank info response status: {resp.status}")
-                    if resp.status == 200:
-                        data = await resp.json()
-                        profile_data = data.get('data', {})
-                        # Log ALL keys for debugging
-                        logger.info(f"Profile data keys: {list(profile_data.keys()) if isinstance(profile_data, dict) else 'not a dict'}")
-                        
-                        # Log summoner sub-keys if present
-                        if 'summoner' in profile_data:
-                            summoner_data = profile_data['summoner']
-                            logger.info(f"summoner sub-keys: {list(summoner_data.keys()) if isinstance(summoner_data, dict) else summoner_data}")
-                            # Check for league_stats inside summoner
-                            if 'league_stats' in summoner_data:
-                                logger.info(f"Found league_stats inside summoner object!")
+            # Payload dumps are only built when DEBUG is enabled for this logger
+            debug = logger.isEnabledFor(logging.DEBUG)
+            logger.debug("Fetching rank info: url=%s", url)
+            status, profile_data = await self._request('summary', 'GET', url, {})
+            logger.debug("Rank info response: summoner_id=%s status=%s", summoner.summoner_id, status)
+            if status != 200:
+                logger.warning("Rank info request failed: summoner_id=%s status=%s", summoner.summoner_id, status)
+            elif debug:
+                logger.debug("Profile data keys: %s", list(profile_data.keys()) if isinstance(profile_data, dict) else 'not a dict')
+                summoner_data = profile_data.get('summoner') if isinstance(profile_data, dict) else None
+                if summoner_data is not None:
+                    logger.debug("summoner sub-keys: %s", list(summoner_data.keys()) if isinstance(summoner_data, dict) else summoner_data)
 
             if not profile_data:
-                logger.warning(f"No profile_data found for summoner {summoner.summoner_id}")
-                return "UNRANKED", "", 0, 0, 0
-            
-            # Try multiple locations for league_stats
-            stats = profile_data.get('league_stats', [])
-            if not stats and 'summoner' in profile_data:
-                # Try inside summoner object
-                summoner_obj = profile_data.get('summoner', {})
-                stats = summoner_obj.get('league_stats', [])
-                if stats:
-                    logger.info(f"Found league_stats inside summoner: {len(stats)} entries")
-                # Also check for solo_tier_info directly
-                if not stats and 'solo_tier_info' in summoner_obj:
-                    tier_info = summoner_obj['solo_tier_info']
-                    logger.info(f"Found solo_tier_info directly: {tier_info}")
-                    if tier_info:
-                        tier = tier_info.get('tier', 'UNRANKED').upper()
-                        division = tier_info.get('division') or tier_info.get('rank') or ""
-                        lp = tier_info.get('lp', 0)
-                        return tier, self.division_to_roman(division), lp, 0, 0
-            
-            logger.info(f"Found {len(stats)} league_stats entries")
-            
-            for i, stat in enumerate(stats):
-                # Log full stat structure for debugging
-                stat_keys = list(stat.keys()) if isinstance(stat, dict) else str(stat)
-                logger.info(f"Stat {i} keys: {stat_keys}")
-                
-                # Try different ways to identify queue type
-                queue_info = stat.get('queue_info', {})
-                game_type = queue_info.get('game_type', '').upper()
-                
-                # Alternative: check for queue_type key directly
-                if not game_type:
-                    game_type = stat.get('queue_type', '').upper()
-                # Alternative: check for tier_info.queue_type
-                if not game_type:
-                    tier_info = stat.get('tier_info', {})
-                    if isinstance(tier_info, dict):
-                        game_type = tier_info.get('queue_type', '').upper()
-                
-                logger.info(f"Stat {i}: game_type='{game_type}', tier_info={stat.get('tier_info')}")
-                
-                # Check for various Solo Queue identifiers or just take the first ranked one
-                if game_type in ['SOLORANKED', 'RANKED_SOLO_5X5', 'SOLO', 'RANKED_SOLO_5X5']:
-                    tier_info = stat.get('tier_info') or stat
-                    logger.info(f"tier_info keys: {list(tier_info.keys()) if isinstance(tier_info, dict) else tier_info}")
-                    
-                    tier = tier_info.get('tier', 'UNRANKED').upper()
-                    division = tier_info.get('division') or tier_info.get('rank') or ""
-                    lp = tier_info.get('lp', 0)
-                    wins = stat.get('win', 0)
-                    losses = stat.get('lose', 0)
-                    
-                    logger.info(f"Extracted: tier={tier}, division={division}, lp={lp}")
-                    return tier, self.division_to_roman(division), lp, wins, losses
-            
-            # If no specific queue type was matched, try to find any ranked data
-            for i, stat in enumerate(stats):
-                tier_info = stat.get('tier_info')
-                if tier_info and isinstance(tier_info, dict):
-                    tier = tier_info.get('tier', '').upper()
-                    if tier and tier != 'UNRANKED':
-                        division = tier_info.get('division') or tier_info.get('rank') or ""
-                        lp = tier_info.get('lp', 0)
-                        wins = stat.get('win', 0)
-                        losses = stat.get('lose', 0)
-                        logger.info(f"Found ranked data in stat {i}: {tier} {division} {lp}LP")
-                        return tier, self.division_to_roman(division), lp, wins, losses
-            
-            logger.warning(f"No SOLORANKED stats found in league_stats")
-            return "UNRANKED", "", 0, 0, 0
+                # No answer is not the same as unranked; callers must not store this
+                logger.warning("No profile_data found for summoner %s", summoner.summoner_id)
+                return None
+
+            result = self._summary_extractor.extract(profile_data)
+            if debug:
+                logger.debug("Extracted via layout=%s: %s", self._summary_extractor.layout, result)
+            return result
+        except OPGGUnavailable:
+            raise
         except Exception as e:
-            logger.error(f"Error fetching rank info: {e}", exc_info=True)
-            return "UNRANKED", "", 0, 0, 0
+            logger.error("Error fetching rank info: %s", e, exc_info=True)
+            return None
 
     async def get_win_loss(self, summoner: Summoner):
-        _, _, _, w, l = await self.get_rank_info(summoner)
+        _, _, _, w, l = await self.get_rank_info(summoner) or UNRANKED
         return w, l
 
+    @traced('opgg')
     async def renew_summoner(self, summoner: Summoner):
         """Request OP.GG to renew/refresh summoner data (Async)."""
         try:
             region_str = "jp"
             # Use the renewal endpoint as identified in the library
-            url = f"https://lol-web-api.op.gg/api/v1.0/internal/bypass/summoners/{region_str}/{summoner.summoner_id}/renewal"
+            url = f"{self._web_api_url}/v1.0/internal/bypass/summoners/{region_str}/{summoner.summoner_id}/renewal"
             
-            logger.info(f"Requesting data renewal for summoner {summoner.summoner_id} (URL: {url})")
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, headers=self._headers) as resp:
-                    logger.info(f"Renewal request status: {resp.status}")
-                    if resp.status in [200, 201, 202]:
-                        data = await resp.json()
-                        logger.info(f"Renewal successful: {data.get('data', {}).get('message', 'Success')}")
-                        return True
-                    else:
-                        logger.warning(f"Renewal request failed with status {resp.status}")
-                        return False
+            logger.debug("Requesting data renewal: summoner_id=%s url=%s", summoner.summoner_id, url)
+            # Best effort: a failed renewal only means slightly older data, so it is not retried
+            status, data = await self._request('renewal', 'POST', url, {}, max_attempts=1)
+            logger.debug("Renewal response: summoner_id=%s status=%s", summoner.summoner_id, status)
+            if status in [200, 201, 202]:
+                logger.debug("Renewal successful: %s", data.get('message', 'Success') if isinstance(data, dict) else 'Success')
+                return True
+            else:
+                logger.warning("Renewal request failed: summoner_id=%s status=%s", summoner.summoner_id, status)
+                return False
         except Exception as e:
             logger.error(f"Error in renew_summoner: {e}")
             return False
 
     def division_to_roman(self, division):
-        if not division:
-            return ""
-        if isinstance(division, int):
-            mapping = {1: "I", 2: "II", 3: "III", 4: "IV"}
-            return mapping.get(division, str(division))
-        
-        div_str = str(division).upper()
-        if div_str in ["I", "II", "III", "IV"]:
-            return div_str
-        
-        if div_str == "1": return "I"
-        if div_str == "2": return "II"
-        if div_str == "3": return "III"
-        if div_str == "4": return "IV"
-        return div_str
+        return division_to_roman(division)
 
-    async def get_tier_history(self, summoner_id: str, region: Region):
+    async def iter_tier_history(self, summoner_id: str, region: Region, chunk_size: int = 16384):
+        """Stream tier history entries (see tier_history.parse_entry) as the response arrives.
+
+        Yields nothing for a non-200 answer; raises OPGGUnavailable like the other calls.
+        """
         region_str = region.value.lower() if hasattr(region, 'value') else str(region).lower()
         # Use lol-api-summoner.op.gg as it's more reliable than lol-web-api.op.gg
-        url = f"https://lol-api-summoner.op.gg/api/{region_str}/summoners/{summoner_id}/tier-history"
-        headers = self._headers
+        url = f"{self._bypass_api_url}/{region_str}/summoners/{summoner_id}/tier-history"
+        logger.debug("Streaming tier history: %s", url)
+        async with self._open('tier_history', 'GET', url) as resp:
+            if resp.status != 200:
+                logger.error(f"Failed to fetch tier history: HTTP {resp.status}")
+                return
+            async for entry in tier_history.iter_array_items(resp.content.iter_chunked(chunk_size)):
+                point = tier_history.parse_entry(entry) if isinstance(entry, dict) else None
+                if point is not None:
+                    yield point
+
+    @traced('opgg')
+    async def get_tier_history(self, summoner_id: str, region: Region):
+        """Whole tier history as a list. Backfills should stream iter_tier_history instead."""
         try:
-            logger.info(f"Fetching tier history via aiohttp: {url}")
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=headers) as response:
-                    logger.info(f"Tier history response status: {response.status}")
-                    if response.status != 200:
-                        logger.error(f"Failed to fetch tier history: HTTP {response.status}")
-                        return []
-                    data = await response.json()
-                    history_list = data.get('data', [])
-                    results = []
-                    for entry in history_list:
-                        updated_at_str = entry.get('created_at')
-                        if not updated_at_str: continue
-                        
-                        # Try to find tier_info
-                        tier_info = entry.get('tier_info')
-                        if not tier_info:
-                            # Maybe it's flat in entry?
-                            tier_info = entry
-                        
-                        try:
-                            updated_at = datetime.fromisoformat(updated_at_str.replace('Z', '+00:00'))
-                        except Exception: continue
-                        
-                        tier = tier_info.get('tier', 'UNRANKED').upper()
-                        # Some versions use 'division', others 'rank'
-                        division = tier_info.get('division') or tier_info.get('rank') or ""
-                        lp = tier_info.get('lp', 0)
-                        
-                        results.append({
-                            'tier': tier,
-                            'rank': self.division_to_roman(division),
-                            'lp': lp,
-                            'wins': 0,
-                            'losses': 0,
-                            'updated_at': updated_at
-                        })
-                    return results
+            return [point async for point in self.iter_tier_history(summoner_id, region)]
+        except OPGGUnavailable:
+            raise
         except Exception as e:
             logger.error(f"Error in get_tier_history: {e}")
             return []
@@ -0,0 +1,176 @@
+"""
+Schema-aware extraction of solo-queue rank from OP.GG summary payloads.
+
+OP.GG has shipped several layouts for the summary endpoint over time:
+
+- `league_stats` at the top level of `data`
+- `league_stats` nested inside `data.summoner`
+- only `data.summoner.solo_tier_info` (no per-queue stats, no wins/losses)
+
+and each league_stats entry names its queue in one of `queue_info.game_type`,
+`queue_type` or `tier_info.queue_type`. `SummaryExtractor` remembers which
+layout and which queue-type key matched last time and tries those first, so
+the steady state is a direct lookup plus a single pass over the stats list.
+"""
+from typing import Optional, Tuple
+
+RankTuple = Tuple[str, str, int, int, int]
+
+UNRANKED: RankTuple = ("UNRANKED", "", 0, 0, 0)
+
+SOLO_QUEUE_TYPES = frozenset(['SOLORANKED', 'RANKED_SOLO_5X5', 'SOLO'])
+
+_ROMAN = {1: "I", 2: "II", 3: "III", 4: "IV", "1": "I", "2": "II", "3": "III", "4": "IV"}
+
+
+def division_to_roman(division) -> str:
+    if not division:
+        return ""
+    if isinstance(division, int):
+        return _ROMAN.get(division, str(division))
+    div_str = str(division).upper()
+    return _ROMAN.get(div_str, div_str)
+
+
+def tier_tuple(tier_info: dict, wins: int = 0, losses: int = 0, default_tier: str = 'UNRANKED') -> RankTuple:
+    """Build (tier, rank, lp, wins, losses) from a tier_info mapping."""
+    division = tier_info.get('division') or tier_info.get('rank') or ""
+    return (
+        tier_info.get('tier', default_tier).upper(),
+        division_to_roman(division),
+        tier_info.get('lp', 0),
+        wins,
+        losses,
+    )
+
+
+# Layout ids, in the precedence order the original probing used
+TOP_LEVEL, NESTED, SOLO_TIER_INFO = range(3)
+LAYOUT_NAMES = ('league_stats', 'summoner.league_stats', 'summoner.solo_tier_info')
+
+
+def _locate(data: dict, layout_id: int):
+    """Return the stats list (or solo tier_info dict) for one layout, or None if it doesn't apply."""
+    if layout_id == TOP_LEVEL:
+        return data.get('league_stats') or None
+    summoner = data.get('summoner')
+    if summoner.__class__ is not dict:
+        return None
+    return summoner.get('league_stats' if layout_id == NESTED else 'solo_tier_info') or None
+
+
+# --- Queue-type accessors for a single league_stats entry ---
+
+def _queue_info_game_type(stat: dict) -> str:
+    queue_info = stat.get('queue_info')
+    return (queue_info.get('game_type') or '') if queue_info.__class__ is dict else ''
+
+
+def _queue_type(stat: dict) -> str:
+    return stat.get('queue_type') or ''
+
+
+def _tier_info_queue_type(stat: dict) -> str:
+    tier_info = stat.get('tier_info')
+    return (tier_info.get('queue_type') or '') if tier_info.__class__ is dict else ''
+
+
+QUEUE_ACCESSORS = (_queue_info_game_type, _queue_type, _tier_info_queue_type)
+
+
+def _game_type(stat: dict) -> str:
+    for accessor in QUEUE_ACCESSORS:
+        game_type = accessor(stat)
+        if game_type:
+            return game_type.upper()
+    return ''
+
+
+class SummaryExtractor:
+    """Extracts (tier, rank, lp, wins, losses) from `data` of the summary endpoint.
+
+    The API serves one layout at a time, so the layout and queue-type key that
+    matched are cached and read directly on later payloads. A payload the cached
+    layout doesn't match goes back through detection in the original precedence
+    order. The stats list is scanned once, reading the learned queue-type key
+    inline and only probing the other keys for entries that lack it.
+    """
+
+    def __init__(self):
+        self._layout_id = None
+        self._queue_key = None
+
+    @property
+    def layout(self) -> Optional[str]:
+        if self._layout_id is None:
+            return None
+        name = LAYOUT_NAMES[self._layout_id]
+        if self._layout_id == SOLO_TIER_INFO:
+            return name
+        return f"{name}[{self._queue_key or 'tier_info.queue_type'}]"
+
+    def _learn(self, data: dict):
+        for layout_id in (TOP_LEVEL, NESTED, SOLO_TIER_INFO):
+            found = _locate(data, layout_id)
+            if found is None:
+                continue
+            self._layout_id = layout_id
+            self._queue_key = None
+            if layout_id != SOLO_TIER_INFO:
+                for stat in found:
+                    if _queue_info_game_type(stat):
+                        self._queue_key = 'queue_info'
+                        break
+                    if _queue_type(stat):
+                        self._queue_key = 'queue_type'
+                        break
+            return found
+        return None
+
+    def extract(self, data: dict) -> RankTuple:
+        if data.__class__ is not dict:
+            return UNRANKED
+
+        layout_id = self._layout_id
+        if layout_id == TOP_LEVEL:
+            found = data.get('league_stats')
+        elif layout_id is None:
+            found = None
+        else:
+            found = _locate(data, layout_id)
+        if not found:
+            found = self._learn(data)
+            if found is None:
+                return UNRANKED
+            layout_id = self._layout_id
+
+        if layout_id == SOLO_TIER_INFO:
+            return tier_tuple(found)
+
+        # Single pass: the solo queue entry wins, otherwise the first ranked entry of any queue
+        queue_key = self._queue_key
+        fallback = None
+        for stat in found:
+            if queue_key == 'queue_info':
+                queue_info = stat.get('queue_info')
+                game_type = queue_info.get('game_type') if queue_info.__class__ is dict else None
+            elif queue_key == 'queue_type':
+                game_type = stat.get('queue_type')
+            else:
+                game_type = None
+            if game_type:
+                if game_type not in SOLO_QUEUE_TYPES:
+                    game_type = game_type.upper()
+            else:
+                game_type = _game_type(stat)
+            if game_type in SOLO_QUEUE_TYPES:
+                return tier_tuple(stat.get('tier_info') or stat, stat.get('win', 0), stat.get('lose', 0))
+            if fallback is None:
+                tier_info = stat.get('tier_info')
+                if tier_info.__class__ is dict:
+                    tier = tier_info.get('tier')
+                    if tier and tier.upper() != 'UNRANKED':
+                        fallback = stat
+        if fallback is not None:
+            return tier_tuple(fallback['tier_info'], fallback.get('win', 0), fallback.get('lose', 0), default_tier='')
+        return UNRANKED
@@ -0,0 +1,187 @@
+"""
+Retry, adaptive concurrency and circuit breaking for OP.GG requests.
+
+- Backoff: capped exponential backoff with full jitter; a `Retry-After` from the
+  server is treated as a floor for the next attempt.
+- AdaptiveLimiter: AIMD limit on in-flight requests. Each success while the
+  limit is saturated adds 1/limit (about +1 per round trip), each 429 halves it.
+  Throttles from requests that started before the last decrease are ignored, so
+  one burst of 429s only halves the limit once.
+- CircuitBreaker: opens after consecutive upstream failures (5xx, timeouts,
+  connection errors, 429 storms) and rejects requests until a cool-down has
+  passed, then lets a single probe through. A failed probe doubles the
+  cool-down up to a ceiling.
+"""
+import asyncio
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Optional
+
+from src.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class OPGGUnavailable(Exception):
+    """OP.GG could not answer: retries were exhausted or the circuit is open."""
+
+
+class CircuitOpenError(OPGGUnavailable):
+    """Raised without contacting OP.GG while the circuit breaker is open."""
+
+    def __init__(self, retry_in: float):
+        super().__init__(f"OP.GG circuit open, retrying in {retry_in:.0f}s")
+        self.retry_in = retry_in
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class Backoff:
+    def __init__(self, base: float = 0.5, cap: float = 30.0, max_attempts: int = 4, rng: random.Random = None):
+        self.base = base
+        self.cap = cap
+        self.max_attempts = max_attempts
+        self._rng = rng or random.Random()
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Delay before retry number `attempt` (0-based)."""
+        if retry_after is not None:
+            return min(self.cap, retry_after) + self._rng.uniform(0, self.base)
+        return self._rng.uniform(0, min(self.cap, self.base * (2 ** attempt)))
+
+
+class AdaptiveLimiter:
+    def __init__(self, initial: float = 2, minimum: float = 1, maximum: float = 8, decrease: float = 0.5):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.limit = float(max(minimum, min(maximum, initial)))
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._cond: Optional[asyncio.Condition] = None
+        metrics.opgg_concurrency_limit.set(self.limit)
+
+    def _condition(self) -> asyncio.Condition:
+        # Created lazily so the limiter binds to the loop that first uses it
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    async def acquire(self) -> float:
+        """Wait for a slot. Returns the start time to pass to on_throttle()."""
+        cond = self._condition()
+        async with cond:
+            await cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        return time.monotonic()
+
+    async def release(self):
+        cond = self._condition()
+        async with cond:
+            self.in_flight -= 1
+            cond.notify_all()
+
+    def on_success(self):
+        # Only grow while saturated; an idle limiter says nothing about capacity
+        if self.in_flight >= int(self.limit) and self.limit < self.maximum:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            metrics.opgg_concurrency_limit.set(self.limit)
+
+    def on_throttle(self, started: float):
+        if started < self._last_decrease or self.limit <= self.minimum:
+            return
+        self.limit = max(self.minimum, self.limit * self.decrease)
+        self._last_decrease = time.monotonic()
+        metrics.opgg_concurrency_limit.set(self.limit)
+        logger.warning("OP.GG throttled (429), concurrency limit now %.2f", self.limit)
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, max_reset_timeout: float = 600.0):
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        metrics.opgg_circuit_open.set(0)
+
+    @property
+    def retry_in(self) -> float:
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def before_request(self):
+        """Raise CircuitOpenError unless a request may be sent now."""
+        if self.state == self.OPEN:
+            remaining = self.retry_in
+            if remaining > 0:
+                raise CircuitOpenError(remaining)
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+            logger.info("OP.GG circuit half-open, sending a probe request")
+        if self.state == self.HALF_OPEN:
+            if self._probe_in_flight:
+                raise CircuitOpenError(self.reset_timeout)
+            self._probe_in_flight = True
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info("OP.GG circuit closed")
+        self.state = self.CLOSED
+        self.failures = 0
+        self.reset_timeout = self.base_reset_timeout
+        self._probe_in_flight = False
+        metrics.opgg_circuit_open.set(0)
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN:
+            self.reset_timeout = min(self.max_reset_timeout, self.reset_timeout * 2)
+            self._open()
+        elif self.state == self.CLOSED and self.failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+        metrics.opgg_circuit_open.set(1)
+        logger.warning("OP.GG circuit open after %d consecutive failures, pausing for %.0fs",
+                       self.failures, self.reset_timeout)
+
+    async def wait_until_ready(self) -> float:
+        """Sleep until requests may be sent again. Returns the seconds waited."""
+        waited = 0.0
+        while (self.state == self.OPEN and self.retry_in > 0) or (self.state == self.HALF_OPEN and self._probe_in_flight):
+            delay = self.retry_in if self.state == self.OPEN else 1.0
+            await asyncio.sleep(delay)
+            waited += delay
+        return waited
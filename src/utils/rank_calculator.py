@@ -147,3 +147,41 @@ def pad_string(s, width):
     s_str = str(s)
     current_w = get_display_width(s_str)
     return s_str + (" " * max(0, width - current_w))
+
+# Discord rejects messages longer than this many characters
+DISCORD_MESSAGE_LIMIT = 2000
+
+def format_text_table(headers, rows):
+    """Lines of a monospace table (header, rule, rows) whose columns line up by display width."""
+    widths = [max(get_display_width(c) for c in col) for col in zip(headers, *rows)]
+
+    def line(cells):
+        return "  ".join(pad_string(c, w) for c, w in zip(cells, widths)).rstrip()
+
+    return [line(headers), "  ".join("-" * w for w in widths)] + [line(r) for r in rows]
+
+def split_code_blocks(lines, title: str = "", header_lines: int = 2, limit: int = DISCORD_MESSAGE_LIMIT):
+    """
+    Pack table lines into as few code-block messages as fit Discord's limit.
+    The first `header_lines` lines are repeated at the top of every block and
+    `title` goes before the first one.
+    """
+    header, body = lines[:header_lines], lines[header_lines:]
+    # Opening and closing fences plus the header lines, each with its newline
+    block_size = len("```\n") + len("```") + sum(len(h) + 1 for h in header)
+    messages = []
+    prefix = f"{title}\n" if title else ""
+    current = list(header)
+    size = len(prefix) + block_size
+    for l in body:
+        # A single over-long line is cut rather than producing an unsendable message
+        l = l[:limit - len(prefix) - block_size - 1]
+        if size + len(l) + 1 > limit and len(current) > len(header):
+            messages.append(prefix + "```\n" + "\n".join(current) + "\n```")
+            prefix = ""
+            current = list(header)
+            size = block_size
+        current.append(l)
+        size += len(l) + 1
+    messages.append(prefix + "```\n" + "\n".join(current) + "\n```")
+    return messages
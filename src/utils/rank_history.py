@@ -0,0 +1,162 @@
+"""
+Compact in-memory rank history.
+
+History used to travel as `[dict(r) for r in rows]`: a dict, a date and a
+handful of str/int objects per user per day, looked up by key on every use.
+A UserHistory keeps one user's days as parallel typed arrays instead (date
+ordinals, tier and division codes, LP, the graph's numeric rank value, wins
+and losses), filled straight from query rows, so a 180-day server report holds
+a few arrays per user rather than thousands of dicts. Scalar code (diff text,
+table cells) gets a `RankPoint`, a `__slots__` object that also answers
+`point['tier']`, so the rank_calculator helpers accept it like a row.
+"""
+from array import array
+from bisect import bisect_left
+from datetime import date
+from typing import Dict, Iterable, List, Optional
+
+TIERS = (
+    "IRON", "BRONZE", "SILVER", "GOLD", "PLATINUM",
+    "EMERALD", "DIAMOND", "MASTER", "GRANDMASTER", "CHALLENGER",
+)
+DIVISIONS = ("IV", "III", "II", "I")
+APEX_TIERS = frozenset(("MASTER", "GRANDMASTER", "CHALLENGER"))
+
+_TIER_INDEX = {t: i for i, t in enumerate(TIERS)}
+_DIVISION_INDEX = {d: i for i, d in enumerate(DIVISIONS)}
+
+# Codes stored in the tier/division columns. They start as TIERS / DIVISIONS and
+# grow with any other stored value (e.g. 'UNRANKED', ''), so every row round-trips.
+_tier_names = list(TIERS)
+_division_names = list(DIVISIONS)
+_tier_codes = dict(_TIER_INDEX)
+_division_codes = dict(_DIVISION_INDEX)
+
+
+def _code(value: str, names: list, codes: dict) -> int:
+    code = codes.get(value)
+    if code is None:
+        code = codes[value] = len(names)
+        names.append(value)
+    return code
+
+
+def rank_value(tier: str, division: str, lp: int) -> int:
+    """Single numeric value for plotting, on the same scale as graph_generator.rank_to_numeric."""
+    tier_idx = _TIER_INDEX.get((tier or "").upper())
+    if tier_idx is None:
+        return 0
+    if TIERS[tier_idx] in APEX_TIERS:
+        return tier_idx * 400 + lp
+    return tier_idx * 400 + _DIVISION_INDEX.get(division, 0) * 100 + lp
+
+
+class RankPoint:
+    """One day of a user's history."""
+    __slots__ = ('fetch_date', 'tier', 'rank', 'lp', 'wins', 'losses')
+
+    def __init__(self, fetch_date: date, tier: str, rank: str, lp: int, wins: int = 0, losses: int = 0):
+        self.fetch_date = fetch_date
+        self.tier = tier
+        self.rank = rank
+        self.lp = lp
+        self.wins = wins
+        self.losses = losses
+
+    def __getitem__(self, key: str):
+        return getattr(self, key)
+
+    def __repr__(self):
+        return f"RankPoint({self.fetch_date}, {self.tier} {self.rank} {self.lp}LP, {self.wins}W/{self.losses}L)"
+
+
+class UserHistory:
+    """One user's history as parallel columns, in ascending date order (one entry per day)."""
+    __slots__ = ('riot_id', 'ordinals', 'tiers', 'ranks', 'lps', 'values', 'wins', 'losses')
+
+    def __init__(self, riot_id: str = ""):
+        self.riot_id = riot_id
+        self.ordinals = array('l')
+        # Tier / division codes (see _code)
+        self.tiers = array('h')
+        self.ranks = array('h')
+        self.lps = array('i')
+        self.values = array('i')
+        self.wins = array('i')
+        self.losses = array('i')
+
+    @classmethod
+    def from_rows(cls, riot_id: str, rows: Iterable) -> 'UserHistory':
+        """Build from rank_history rows (asyncpg Records or dicts) ordered by fetch_date."""
+        history = cls(riot_id)
+        for r in rows:
+            history.append(r['fetch_date'], r['tier'], r['rank'], r['lp'], r['wins'], r['losses'])
+        return history
+
+    def append(self, fetch_date: date, tier: str, rank: str, lp: int, wins: int = 0, losses: int = 0):
+        tier = tier or ""
+        rank = rank or ""
+        lp = lp or 0
+        self.ordinals.append(fetch_date.toordinal())
+        self.tiers.append(_code(tier, _tier_names, _tier_codes))
+        self.ranks.append(_code(rank, _division_names, _division_codes))
+        self.lps.append(lp)
+        self.values.append(rank_value(tier, rank, lp))
+        self.wins.append(wins or 0)
+        self.losses.append(losses or 0)
+
+    def __len__(self) -> int:
+        return len(self.ordinals)
+
+    def date(self, i: int) -> date:
+        return date.fromordinal(self.ordinals[i])
+
+    def dates(self) -> List[date]:
+        return [date.fromordinal(o) for o in self.ordinals]
+
+    def point(self, i: int) -> RankPoint:
+        return RankPoint(date.fromordinal(self.ordinals[i]), _tier_names[self.tiers[i]], _division_names[self.ranks[i]],
+                         self.lps[i], self.wins[i], self.losses[i])
+
+    def points(self) -> List[RankPoint]:
+        return [self.point(i) for i in range(len(self))]
+
+    def index(self, d: date) -> Optional[int]:
+        """Position of the entry for day `d`, or None."""
+        o = d.toordinal()
+        i = bisect_left(self.ordinals, o)
+        return i if i < len(self.ordinals) and self.ordinals[i] == o else None
+
+    def at(self, d: date) -> Optional[RankPoint]:
+        i = self.index(d)
+        return self.point(i) if i is not None else None
+
+    def take(self, indices: Iterable[int]) -> 'UserHistory':
+        """A new history with only the entries at `indices` (ascending)."""
+        indices = list(indices)
+        result = UserHistory(self.riot_id)
+        for name in UserHistory.__slots__[1:]:
+            column = getattr(self, name)
+            setattr(result, name, array(column.typecode, [column[i] for i in indices]))
+        return result
+
+    def since(self, start: date) -> 'UserHistory':
+        """Entries on or after `start`."""
+        first = bisect_left(self.ordinals, start.toordinal())
+        result = UserHistory(self.riot_id)
+        for name in UserHistory.__slots__[1:]:
+            setattr(result, name, getattr(self, name)[first:])
+        return result
+
+
+def group_rows(rows: Iterable) -> Dict[tuple, UserHistory]:
+    """Split rows ordered by (discord_id, riot_id, fetch_date) into {(discord_id, riot_id): UserHistory}."""
+    histories = {}
+    key = history = None
+    for r in rows:
+        k = (r['discord_id'], r['riot_id'])
+        if k != key:
+            key = k
+            history = histories[k] = UserHistory(r['riot_id'])
+        history.append(r['fetch_date'], r['tier'], r['rank'], r['lp'], r['wins'], r['losses'])
+    return histories
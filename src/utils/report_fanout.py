@@ -0,0 +1,77 @@
+"""
+Render-once fan-out for scheduled reports.
+
+Schedules that fire together often want the same report: same server, period,
+output type and renderer, just a different channel. Each job used to refresh,
+query and render on its own. Jobs now `submit` their channel under that render
+key instead. The first job of a key starts a batch; jobs for the same key that
+arrive while it is still refreshing or rendering join it. Once the payload is
+ready the batch closes, and the same bytes are posted to every joined channel
+concurrently. A job due after that starts a new batch.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ReportMessage:
+    """One message of a report payload: text, plus an image when `data` is set."""
+    content: str
+    data: Optional[bytes] = None
+    filename: Optional[str] = None
+
+
+@dataclass
+class _Batch:
+    targets: List[Any] = field(default_factory=list)
+    task: Optional[asyncio.Task] = None
+
+
+class ReportFanout:
+    def __init__(self, render: Callable[[Hashable], Awaitable[Optional[List[ReportMessage]]]],
+                 deliver: Callable[[Any, List[ReportMessage]], Awaitable[None]]):
+        """`render(key)` builds the messages for a render key (None: nothing to post);
+        `deliver(target, messages)` posts them to one target."""
+        self.render = render
+        self.deliver = deliver
+        self._open = {}
+
+    @property
+    def busy(self) -> bool:
+        """Whether any report is being refreshed or rendered right now."""
+        return bool(self._open)
+
+    async def submit(self, key: Hashable, target) -> int:
+        """Post the report for `key` to `target`, sharing the render with jobs due at the same time.
+
+        Returns once this batch has been delivered everywhere, with the number of
+        targets it went to.
+        """
+        batch = self._open.get(key)
+        if batch is None:
+            batch = self._open[key] = _Batch()
+            batch.task = asyncio.create_task(self._run(key, batch))
+        batch.targets.append(target)
+        return await asyncio.shield(batch.task)
+
+    async def _run(self, key: Hashable, batch: _Batch) -> int:
+        try:
+            # Jobs fired by the same scheduler tick are already queued; let them join before any work starts
+            await asyncio.sleep(0)
+            messages = await self.render(key)
+        finally:
+            if self._open.get(key) is batch:
+                del self._open[key]
+        if not messages:
+            return 0
+        if len(batch.targets) > 1:
+            logger.info(f"Report {key} rendered once for {len(batch.targets)} channels")
+        results = await asyncio.gather(*(self.deliver(t, messages) for t in batch.targets), return_exceptions=True)
+        for target, result in zip(batch.targets, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to post report {key} to {target}: {result}", exc_info=result)
+        return len(batch.targets)
@@ -0,0 +1,148 @@
+"""
+Multi-process sharding and leader election.
+
+Each process runs a subset of the bot's Discord shards (SHARD_COUNT total,
+SHARD_IDS for this process) and only owns the guilds on those shards, using
+Discord's own routing: shard_id = (guild_id >> 22) % shard_count. Per-guild
+work (scheduled reports, resuming a guild's /fetch all) runs in the owning
+process only.
+
+Global jobs (the nightly collection, resuming global runs, queue cleanup) run
+in whichever process holds a Postgres session-level advisory lock. The lock is
+tied to the holder's connection, so it is released as soon as that process dies
+and another process picks it up on its next attempt. A process that takes over
+runs its `on_elected` hook, so it resumes whatever global work the old leader left
+unfinished. Fetch work itself is
+spread over all processes by the shared fetch queue.
+"""
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, Optional, Sequence
+
+from src.database import db
+from src.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary, but fixed: every process must contend for the same key
+LEADER_LOCK_KEY = 0x4C4F4C41
+
+
+class ShardConfig:
+    def __init__(self, shard_count: Optional[int] = None, shard_ids: Optional[Sequence[int]] = None):
+        self.shard_count = shard_count
+        self.shard_ids = list(shard_ids) if shard_ids is not None else None
+
+    @classmethod
+    def from_env(cls) -> "ShardConfig":
+        count = os.getenv('SHARD_COUNT')
+        ids = os.getenv('SHARD_IDS')
+        shard_count = int(count) if count else None
+        shard_ids = [int(i) for i in ids.split(',') if i.strip()] if ids else None
+        if shard_ids is not None and shard_count is None:
+            raise ValueError("SHARD_IDS requires SHARD_COUNT")
+        return cls(shard_count, shard_ids)
+
+    @property
+    def partitioned(self) -> bool:
+        """True when this process only runs some of the shards."""
+        return self.shard_count is not None and self.shard_ids is not None
+
+    def owns_guild(self, guild_id: int) -> bool:
+        if not self.partitioned:
+            return True
+        # Legacy rows migrated with server_id 0 land on shard 0
+        return ((guild_id or 0) >> 22) % self.shard_count in self.shard_ids
+
+    def __repr__(self):
+        return f"ShardConfig(shard_count={self.shard_count}, shard_ids={self.shard_ids})"
+
+
+shard_config = ShardConfig.from_env()
+
+
+class LeaderElection:
+    def __init__(self, key: int = LEADER_LOCK_KEY, interval: float = 15.0,
+                 on_elected: Optional[Callable[[], Awaitable]] = None):
+        """`on_elected()` runs in the background whenever the election loop takes over leadership.
+
+        It does not run for an `elect()` called directly (the startup election); the
+        caller handles that case itself.
+        """
+        self.key = key
+        self.interval = interval
+        self.on_elected = on_elected
+        self._conn = None
+        self._task: Optional[asyncio.Task] = None
+        self._hook_task: Optional[asyncio.Task] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._conn is not None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        for task in (self._task, self._hook_task):
+            if task:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._task = self._hook_task = None
+        if self._conn is not None:
+            try:
+                await self._conn.execute("SELECT pg_advisory_unlock($1)", self.key)
+            finally:
+                await self._release()
+
+    async def _release(self):
+        conn, self._conn = self._conn, None
+        metrics.leader.set(0)
+        if conn is not None:
+            await db.pool.release(conn)
+
+    async def elect(self) -> bool:
+        """One election round: try to take the lock, or confirm we still hold it."""
+        try:
+            if self._conn is None:
+                conn = await db.pool.acquire()
+                try:
+                    acquired = await conn.fetchval("SELECT pg_try_advisory_lock($1)", self.key)
+                except Exception:
+                    await db.pool.release(conn)
+                    raise
+                if acquired:
+                    self._conn = conn
+                    metrics.leader.set(1)
+                    logger.info("Acquired leader lock; this process runs global jobs")
+                else:
+                    await db.pool.release(conn)
+            else:
+                # The lock lives as long as this session; make sure it still does
+                await self._conn.fetchval("SELECT 1")
+        except Exception as e:
+            if self._conn is not None:
+                logger.warning(f"Lost leader lock: {e}")
+                try:
+                    await self._release()
+                except Exception:
+                    pass
+            else:
+                logger.error(f"Leader election error: {e}")
+        return self.is_leader
+
+    async def _run(self):
+        while True:
+            was_leader = self.is_leader
+            if await self.elect() and not was_leader and self.on_elected:
+                # In the background: the hook may take long, and the lock needs its heartbeat meanwhile
+                self._hook_task = asyncio.create_task(self._elected())
+            await asyncio.sleep(self.interval)
+
+    async def _elected(self):
+        try:
+            await self.on_elected()
+        except Exception as e:
+            logger.error(f"Leader takeover hook failed: {e}", exc_info=True)
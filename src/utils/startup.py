@@ -0,0 +1,93 @@
+"""
+Staged, concurrent bot startup.
+
+`setup_hook` used to connect the pool, run the migrations, load the cogs (the
+scheduler reading every schedule in `cog_load`) and sync commands one after
+another, and discord.py only opens the gateway once it returns. Now each piece
+of that work is a named stage started as a task: `setup_hook` returns right
+away so the gateway connects while the stages run, and a stage that needs
+another one awaits it (`await startup.wait('database')`).
+
+`ready` is set once every stage has finished; the command tree's
+interaction_check turns interactions away until then. When the gateway is
+also up (or a stage failed), one log line reports when each stage started and
+how long it took, including any wait for the stages it depends on.
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StartupError(RuntimeError):
+    """A stage this one depends on failed."""
+
+
+class Startup:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.ready = asyncio.Event()
+        # stage -> (start offset, duration) in seconds from `started`
+        self.timings: Dict[str, Tuple[float, float]] = {}
+        # milestone -> offset, for events that are instants rather than work (login, gateway)
+        self.milestones: Dict[str, float] = {}
+        self.failed: Dict[str, BaseException] = {}
+        self._stages: Dict[str, asyncio.Task] = {}
+        self._reported = False
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def stage(self, name: str, work: Awaitable) -> asyncio.Task:
+        """Run `work` as a named stage in the background."""
+        task = asyncio.create_task(self._run(name, work), name=f"startup:{name}")
+        self._stages[name] = task
+        return task
+
+    async def _run(self, name: str, work: Awaitable):
+        start = self.elapsed()
+        try:
+            return await work
+        except Exception as e:
+            self.failed[name] = e
+            logger.error(f"Startup stage '{name}' failed: {e}", exc_info=not isinstance(e, StartupError))
+            raise
+        finally:
+            self.timings[name] = (start, self.elapsed() - start)
+
+    async def wait(self, name: str):
+        """Wait for a stage; raises StartupError if it failed."""
+        try:
+            return await asyncio.shield(self._stages[name])
+        except Exception as e:
+            raise StartupError(f"startup stage '{name}' failed") from e
+
+    def mark(self, milestone: str):
+        """Record an instant (first time only) and log the report if startup is complete."""
+        self.milestones.setdefault(milestone, self.elapsed())
+        self._maybe_report()
+
+    async def finish(self) -> bool:
+        """Wait for every stage started so far; set `ready` if none failed. Returns whether it did."""
+        await asyncio.gather(*self._stages.values(), return_exceptions=True)
+        self.milestones.setdefault('stages_done', self.elapsed())
+        if not self.failed:
+            self.ready.set()
+        self._maybe_report()
+        return not self.failed
+
+    def _maybe_report(self):
+        # On failure there may never be a gateway_ready; report what happened anyway
+        if self._reported or 'stages_done' not in self.milestones or not (
+                'gateway_ready' in self.milestones or self.failed):
+            return
+        self._reported = True
+        logger.info(self.report())
+
+    def report(self) -> str:
+        parts = [f"{name} {start:.2f}s+{duration:.2f}s" + (" FAILED" if name in self.failed else "")
+                 for name, (start, duration) in sorted(self.timings.items(), key=lambda kv: kv[1][0])]
+        parts += [f"{name} at {offset:.2f}s" for name, offset in sorted(self.milestones.items(), key=lambda kv: kv[1])]
+        return "Startup timing: " + ", ".join(parts)
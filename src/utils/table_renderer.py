@@ -0,0 +1,182 @@
+"""
+Fast report-table renderer drawing directly with Pillow.
+
+Same signature and look as graph_generator.generate_report_image (the
+matplotlib `ax.table` renderer), but the layout is computed in one pass from
+cached per-glyph advances of the bundled Japanese font instead of letting
+matplotlib measure every cell and then lay the figure out again for
+`bbox_inches='tight'`. A 50-user table renders in tens of milliseconds.
+"""
+import io
+import os
+from functools import lru_cache
+from typing import Any, List
+
+from PIL import Image, ImageDraw, ImageFont
+
+from src.utils import image_encoding
+
+FONT_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'assets', 'fonts', 'JapaneseFont.otf')
+
+# Same palette as the matplotlib renderer
+BACKGROUND = '#34495e'
+HEADER_COLOR = '#2c3e50'
+ROW_COLORS = ['#34495e', '#2c3e50']
+EDGE_COLOR = '#7f8c8d'
+TEXT_COLOR = (255, 255, 255)
+
+WIDTH = 1400
+MARGIN = 24
+TITLE_SIZE = 30
+TITLE_GAP = 28
+FONT_SIZE = 18
+ROW_HEIGHT = 40
+CELL_PADDING = 10
+ELLIPSIS = '…'
+# Rendered strings kept per font size; cleared when full
+MASK_CACHE_SIZE = 4096
+
+# Glyphs every report uses; measured up front so a render rarely touches FreeType for layout
+_COMMON_GLYPHS = (
+    ''.join(chr(c) for c in range(0x20, 0x7F))
+    + '日付ランク前比戦績勝全員定期レポート⇒±↑↓→…'
+)
+
+
+class FontMetrics:
+    """A font plus caches of glyph advances and rendered glyphs.
+
+    Rasterising with this CFF font costs about half a millisecond per draw
+    call, which dominated the render. Each glyph is rasterised once instead,
+    and strings are composed from those masks (and cached, since reports repeat
+    many cells), so measuring and drawing a cell is mostly dict lookups.
+    """
+
+    def __init__(self, size: int):
+        if os.path.exists(FONT_PATH):
+            self.font = ImageFont.truetype(FONT_PATH, size)
+        else:
+            self.font = ImageFont.load_default(size)
+        self.ascent, self.descent = self.font.getmetrics()
+        self._advances = {}
+        self._glyphs = {}
+        self._masks = {}
+        for ch in _COMMON_GLYPHS:
+            self.advance(ch)
+
+    def advance(self, ch: str) -> float:
+        width = self._advances.get(ch)
+        if width is None:
+            width = self._advances[ch] = self.font.getlength(ch)
+        return width
+
+    def width(self, text: str) -> float:
+        # Sum of advances; ignores kerning, which this font barely uses and a table cell can absorb
+        return sum(self.advance(ch) for ch in text)
+
+    def fit(self, text: str, max_width: float) -> str:
+        """`text`, cut with an ellipsis if it doesn't fit in `max_width` pixels."""
+        if self.width(text) <= max_width:
+            return text
+        budget = max_width - self.advance(ELLIPSIS)
+        used = 0.0
+        for i, ch in enumerate(text):
+            used += self.advance(ch)
+            if used > budget:
+                return text[:i] + ELLIPSIS
+        return text
+
+    def _glyph(self, ch: str):
+        """(mask, left, top) of one glyph relative to its baseline origin."""
+        glyph = self._glyphs.get(ch)
+        if glyph is None:
+            left, top, right, bottom = self.font.getbbox(ch, anchor='ls')
+            mask = Image.new('L', (max(1, right - left), max(1, bottom - top)), 0)
+            if right > left and bottom > top:
+                ImageDraw.Draw(mask).text((-left, -top), ch, font=self.font, fill=255, anchor='ls')
+            glyph = self._glyphs[ch] = (mask, left, top)
+        return glyph
+
+    def mask(self, text: str) -> Image.Image:
+        """Alpha mask of `text`, as tall as the font's ascent + descent, with the baseline at `ascent`."""
+        mask = self._masks.get(text)
+        if mask is None:
+            mask = Image.new('L', (int(self.width(text)) + 1, self.ascent + self.descent), 0)
+            x = 0.0
+            for ch in text:
+                glyph, left, top = self._glyph(ch)
+                # "Over" compositing of white through the glyph, so overlapping edges stay correct
+                mask.paste(255, (round(x) + left, self.ascent + top), glyph)
+                x += self.advance(ch)
+            if len(self._masks) >= MASK_CACHE_SIZE:
+                self._masks.clear()
+            self._masks[text] = mask
+        return mask
+
+    def draw(self, image: Image.Image, x: float, y_mid: float, text: str, fill, align: str = 'center'):
+        """Paste `text` vertically centred on `y_mid`, either centred on or starting at `x`."""
+        mask = self.mask(text)
+        if align == 'center':
+            x -= mask.width / 2
+        image.paste(fill, (round(x), round(y_mid - mask.height / 2)), mask)
+
+
+@lru_cache(maxsize=None)
+def metrics_for(size: int) -> FontMetrics:
+    return FontMetrics(size)
+
+
+def generate_report_image(headers: List[str], data: List[List[Any]], title: str, col_widths: List[float] = None) -> io.BytesIO:
+    """
+    Generate a clean table image using Pillow.
+    """
+    if not data:
+        return None
+
+    if col_widths is None:
+        col_widths = [0.15] + [0.08] * (len(headers) - 4) + [0.22, 0.22, 0.1]
+    total = sum(col_widths)
+    table_width = WIDTH - 2 * MARGIN
+    # Integer column edges, so rounding never leaves a gap before the last border
+    edges = [MARGIN]
+    acc = 0.0
+    for w in col_widths:
+        acc += w
+        edges.append(MARGIN + round(table_width * acc / total))
+
+    text_font = metrics_for(FONT_SIZE)
+    title_font = metrics_for(TITLE_SIZE)
+    table_top = MARGIN + title_font.ascent + title_font.descent + TITLE_GAP
+    rows = [headers] + data
+    height = table_top + ROW_HEIGHT * len(rows) + MARGIN
+
+    image = Image.new('RGB', (WIDTH, height), BACKGROUND)
+    draw = ImageDraw.Draw(image)
+
+    title_font.draw(image, WIDTH / 2, MARGIN + (title_font.ascent + title_font.descent) / 2,
+                    title_font.fit(title, table_width), TEXT_COLOR)
+
+    for r, row in enumerate(rows):
+        top = table_top + r * ROW_HEIGHT
+        fill = HEADER_COLOR if r == 0 else ROW_COLORS[r % len(ROW_COLORS)]
+        draw.rectangle((edges[0], top, edges[-1], top + ROW_HEIGHT), fill=fill)
+        mid = top + ROW_HEIGHT // 2
+        for c, value in enumerate(row[:len(edges) - 1]):
+            left, right = edges[c], edges[c + 1]
+            # Centred text may use the padding; only what would cross the border is cut
+            text = text_font.fit(str(value), right - left - (2 * CELL_PADDING if c == 0 else 2))
+            if r > 0 and c == 0:
+                # Riot ID is left-aligned, like the matplotlib renderer
+                text_font.draw(image, left + CELL_PADDING, mid, text, TEXT_COLOR, align='left')
+            else:
+                text_font.draw(image, (left + right) / 2, mid, text, TEXT_COLOR)
+
+    # Grid in one pass instead of an outline per cell
+    bottom = table_top + ROW_HEIGHT * len(rows)
+    for r in range(len(rows) + 1):
+        y = table_top + r * ROW_HEIGHT
+        draw.line((edges[0], y, edges[-1], y), fill=EDGE_COLOR, width=1)
+    for x in edges:
+        draw.line((x, table_top, x, bottom), fill=EDGE_COLOR, width=1)
+
+    return image_encoding.encode_image(image, "report_table")
@@ -0,0 +1,163 @@
+"""
+Streaming parse of OP.GG tier-history responses.
+
+The tier-history body is `{"data": [entry, entry, ...]}` and can hold years of
+entries. `iter_array_items` decodes the `data` array one entry at a time as the
+response chunks arrive, keeping only the undecoded tail in memory, and
+`daily_points` collapses each day's entries to the last one, so the backfill
+pipeline never holds more than one day plus one chunk regardless of history
+length.
+"""
+import codecs
+import json
+import re
+from datetime import datetime
+from typing import AsyncIterable, AsyncIterator, Optional
+
+from src.utils.opgg_parser import division_to_roman
+
+_WHITESPACE_AND_COMMAS = re.compile(r'[\s,]*')
+# Strings (whole, escapes included) and brackets: enough to track nesting while looking for the key
+_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"|[{}\[\]]')
+# After a string: group 1 is the colon if it was a property key, group 2 the next character ('' if none yet)
+_AFTER_STRING = re.compile(r'\s*(?:(:)\s*)?(\S?)')
+# Elements are decoded with the stdlib, not the client's json_loads (orjson): orjson
+# only takes complete documents, and finding each element's end in Python first
+# measured ~8x slower (0.63 s vs 0.07 s for 20k entries) than raw_decode's C scanner.
+# The speedup json_loads brings applies to the non-streamed, whole-body endpoints.
+_decoder = json.JSONDecoder()
+
+
+async def iter_array_items(chunks: AsyncIterable[bytes], key: str = 'data') -> AsyncIterator:
+    """Yield the elements of the top-level `key` array of a JSON document streamed as bytes.
+
+    Only a `key` property of the outermost object counts; same-named keys in
+    nested objects (e.g. `{"meta": {"data": [...]}}`) are skipped. Yields
+    nothing if the key is missing or not an array; raises ValueError on a
+    truncated array.
+    """
+    key_token = json.dumps(key)
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    chunk_iter = chunks.__aiter__()
+    buf = ''
+    pos = 0
+    eof = False
+
+    async def read_more():
+        nonlocal buf, pos, eof
+        try:
+            chunk = await chunk_iter.__anext__()
+            text = utf8.decode(chunk)
+        except StopAsyncIteration:
+            eof = True
+            text = utf8.decode(b'', final=True)
+        # Drop everything already consumed so memory stays bounded by one chunk plus one item
+        buf = buf[pos:] + text
+        pos = 0
+
+    # 1. Find the opening bracket of the array, tracking nesting so only the outermost object's key matches
+    depth = 0
+    while True:
+        match = _TOKEN.search(buf, pos)
+        quote = buf.find('"', pos)
+        if match is None or (quote != -1 and quote < match.start()):
+            # No complete token yet, or a string still open at the end of the buffer
+            if eof:
+                return
+            pos = quote if quote != -1 else len(buf)
+            await read_more()
+            continue
+        token = match.group()
+        if token[0] != '"':
+            depth += 1 if token in '{[' else -1
+            pos = match.end()
+            continue
+        if depth != 1 or token != key_token:
+            pos = match.end()
+            continue
+        after = _AFTER_STRING.match(buf, match.end())
+        if not after.group(2) and not eof:
+            # What follows the string hasn't arrived yet
+            pos = match.start()
+            await read_more()
+            continue
+        if not after.group(1):
+            # A string value that happens to equal the key
+            pos = match.end()
+            continue
+        if after.group(2) != '[':
+            # null, or not an array
+            return
+        pos = after.end()
+        break
+
+    # 2. Decode one element at a time
+    while True:
+        pos = _WHITESPACE_AND_COMMAS.match(buf, pos).end()
+        if pos >= len(buf):
+            if eof:
+                raise ValueError("truncated JSON array")
+            await read_more()
+            continue
+        if buf[pos] == ']':
+            return
+        try:
+            item, end = _decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise ValueError("truncated or invalid JSON array element")
+            await read_more()
+            continue
+        if end >= len(buf) and not eof:
+            # A bare number may continue in the next chunk
+            await read_more()
+            continue
+        pos = end
+        yield item
+
+
+def parse_entry(entry: dict) -> Optional[dict]:
+    """One tier-history entry as {tier, rank, lp, wins, losses, updated_at}, or None if unusable."""
+    updated_at_str = entry.get('created_at')
+    if not updated_at_str or not isinstance(updated_at_str, str):
+        return None
+
+    # Try to find tier_info; some versions keep it flat in the entry
+    tier_info = entry.get('tier_info') or entry
+    if not isinstance(tier_info, dict):
+        return None
+
+    try:
+        updated_at = datetime.fromisoformat(updated_at_str.replace('Z', '+00:00'))
+    except Exception:
+        return None
+
+    # Some versions use 'division', others 'rank'
+    division = tier_info.get('division') or tier_info.get('rank') or ""
+    return {
+        'tier': str(tier_info.get('tier') or 'UNRANKED').upper(),
+        'rank': division_to_roman(division),
+        'lp': tier_info.get('lp', 0),
+        'wins': 0,
+        'losses': 0,
+        'updated_at': updated_at,
+    }
+
+
+async def daily_points(points: AsyncIterable[dict]) -> AsyncIterator[dict]:
+    """Collapse consecutive same-day points to the latest one of that day.
+
+    OP.GG returns history in time order, so each day's entries are adjacent;
+    if a day ever reappears later it is yielded again. add_rank_history_batch
+    collapses such repeats within a batch (keeping the first, or the last when
+    refreshing) and ON CONFLICT settles them across batches the same way.
+    """
+    current = None
+    async for point in points:
+        if current is not None and point['updated_at'].date() != current['updated_at'].date():
+            yield current
+            current = None
+        if current is None or point['updated_at'] >= current['updated_at']:
+            current = point
+    if current is not None:
+        yield current
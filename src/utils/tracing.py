@@ -0,0 +1,257 @@
+"""
+Lightweight span/trace facility for slash commands and scheduled jobs.
+
+A trace is started with `trace(name)` around an interaction or job; any
+`span(name)` opened while it is active (in the same task or in tasks spawned
+from it) is recorded against it through a context variable. When the trace
+ends, a one-line breakdown grouped by span category (the part of the span name
+before the first '.') is logged, e.g.
+
+    trace /graph 1532.4ms | opgg=812.0ms(3) render=401.7ms(1) upload=230.1ms(1) db=61.2ms(4)
+
+Set TRACE_EXPORT_PATH to additionally append each finished trace as an
+OTLP/JSON line to that file. No external collector is required. Serialising
+and writing happen on a background thread, like the log listener's I/O. A trace
+keeps at most TRACE_MAX_SPANS spans for export; later spans still count in the
+breakdown but are dropped (a nightly collection opens thousands).
+"""
+import contextvars
+import functools
+import json
+import logging
+import atexit
+import os
+import queue
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+_listeners: List[Callable[['Span'], None]] = []
+
+MAX_SPANS = int(os.getenv('TRACE_MAX_SPANS', '2000'))
+
+
+class Span:
+    __slots__ = ('name', 'span_id', 'parent', 'start_ns', 'end_ns', 'attributes', 'error')
+
+    def __init__(self, name: str, parent: Optional['Span'] = None, attributes: dict = None):
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent = parent
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes or {}
+        self.error = None
+
+    @property
+    def parent_id(self) -> Optional[str]:
+        return self.parent.span_id if self.parent else None
+
+    @property
+    def category(self) -> str:
+        return self.name.split('.', 1)[0]
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+
+class Trace:
+    def __init__(self, name: str, attributes: dict = None):
+        self.trace_id = secrets.token_hex(16)
+        self.root = Span(name, attributes=attributes)
+        # Kept for export, up to MAX_SPANS; the breakdown is accumulated as spans finish
+        self.spans: List[Span] = []
+        self.dropped = 0
+        self._totals = {}
+
+    def record(self, s: Span):
+        """Add a finished span to the breakdown, and to `spans` while under MAX_SPANS."""
+        # Skip spans nested inside a span of the same category to avoid double counting
+        parent = s.parent
+        while parent is not None and parent is not self.root:
+            if parent.category == s.category:
+                break
+            parent = parent.parent
+        else:
+            total, count = self._totals.get(s.category, (0.0, 0))
+            self._totals[s.category] = (total + s.duration_ms, count + 1)
+        if len(self.spans) < MAX_SPANS:
+            self.spans.append(s)
+        else:
+            self.dropped += 1
+
+    def breakdown(self) -> dict:
+        """Total duration and call count per span category (top-level spans of each category only)."""
+        return dict(self._totals)
+
+    def summary_line(self) -> str:
+        parts = [
+            f"{cat}={total:.1f}ms({count})"
+            for cat, (total, count) in sorted(self.breakdown().items(), key=lambda kv: kv[1][0], reverse=True)
+        ]
+        status = " ERROR" if self.root.error else ""
+        dropped = f" ({self.dropped} spans not exported)" if self.dropped else ""
+        return f"trace {self.root.name} {self.root.duration_ms:.1f}ms{status} | " + (" ".join(parts) or "no spans") + dropped
+
+
+def add_listener(callback: Callable[[Span], None]):
+    """Register a callback invoked with every finished span (including trace roots)."""
+    _listeners.append(callback)
+
+
+def _notify(s: Span):
+    for callback in _listeners:
+        try:
+            callback(s)
+        except Exception as e:
+            logger.debug("Span listener failed: %s", e)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def trace(name: str, **attributes):
+    """Start a new trace. Logs the per-category breakdown when it finishes.
+
+    If a trace is already active (e.g. `/fetch all` running the collection job),
+    this records a nested span instead so the outer breakdown stays complete.
+    """
+    if _current_trace.get() is not None:
+        with span(name, **attributes):
+            yield _current_trace.get()
+        return
+    t = Trace(name, attributes)
+    trace_token = _current_trace.set(t)
+    span_token = _current_span.set(t.root)
+    try:
+        yield t
+    except BaseException as e:
+        t.root.error = repr(e)
+        raise
+    finally:
+        t.root.end_ns = time.time_ns()
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        _notify(t.root)
+        logger.info(t.summary_line())
+        _exporter.export(t)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Record a timed stage in the current trace. A no-op timer when no trace is active."""
+    t = _current_trace.get()
+    parent = _current_span.get()
+    s = Span(name, parent, attributes)
+    token = _current_span.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.error = repr(e)
+        raise
+    finally:
+        s.end_ns = time.time_ns()
+        _current_span.reset(token)
+        if t is not None:
+            t.record(s)
+        _notify(s)
+
+
+def traced(category: str):
+    """Decorator wrapping an async function in a span named '<category>.<function name>'."""
+    def decorator(func):
+        span_name = f"{category}.{func.__name__}"
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(span_name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class _FileExporter:
+    """Appends finished traces to a file as OTLP/JSON (one ExportTraceServiceRequest per line).
+
+    `export` only enqueues; a daemon thread serialises and writes, off the event loop.
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+
+    def export(self, t: Trace):
+        if not self.path:
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+        # Spans a spawned task finishes after the trace ended are appended later; export what is there now
+        self._queue.put((t, len(t.spans)))
+
+    def stop(self):
+        """Write what is queued and stop the thread."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            try:
+                line = json.dumps(self._to_otlp(*item), ensure_ascii=False)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line + "\n")
+            except Exception as e:
+                logger.warning(f"Failed to export trace: {e}")
+
+    @staticmethod
+    def _otlp_span(t: Trace, s: Span) -> dict:
+        data = {
+            "traceId": t.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": 1,
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns or s.start_ns),
+            "attributes": [
+                {"key": k, "value": {"stringValue": str(v)}} for k, v in s.attributes.items()
+            ],
+            "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+        }
+        if s.parent_id:
+            data["parentSpanId"] = s.parent_id
+        return data
+
+    def _to_otlp(self, t: Trace, span_count: int) -> dict:
+        root = self._otlp_span(t, t.root)
+        if t.dropped:
+            root["attributes"].append({"key": "spans.dropped", "value": {"intValue": str(t.dropped)}})
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "lolanalyzer"}}]},
+                "scopeSpans": [{
+                    "scope": {"name": __name__},
+                    "spans": [root] + [self._otlp_span(t, s) for s in t.spans[:span_count]],
+                }],
+            }]
+        }
+
+
+_exporter = _FileExporter(os.getenv('TRACE_EXPORT_PATH'))
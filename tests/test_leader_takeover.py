@@ -0,0 +1,97 @@
+"""
+A process that becomes leader after startup resumes the global collection run
+the previous leader left RUNNING.
+
+Runs without Postgres or Discord: the pool, the db queries and the collection
+itself are replaced on the test's own objects.
+"""
+import asyncio
+import os
+import sys
+from datetime import date
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.database import db
+from src.cogs import scheduler as scheduler_module
+from src.cogs.scheduler import Scheduler
+
+
+class FakeConnection:
+    def __init__(self, lock_results):
+        self.lock_results = lock_results
+
+    async def fetchval(self, query, *args):
+        if "pg_try_advisory_lock" in query:
+            return self.lock_results.pop(0) if self.lock_results else True
+        return 1
+
+    async def execute(self, query, *args):
+        return "SELECT 1"
+
+
+class FakePool:
+    """Hands out one connection; the advisory lock is refused until `lock_results` says otherwise."""
+
+    def __init__(self, lock_results):
+        self.conn = FakeConnection(lock_results)
+
+    async def acquire(self):
+        return self.conn
+
+    async def release(self, conn):
+        pass
+
+
+def test_new_leader_resumes_running_global_run(monkeypatch):
+    run = {'id': 7, 'server_id': None, 'fetch_date': date.today(), 'backfill': False}
+    resumed = []
+
+    async def get_unfinished_collection_runs():
+        # The run stays RUNNING until a leader resumes it
+        return [] if resumed else [run]
+
+    async def get_job_runs():
+        return {}
+
+    monkeypatch.setattr(db, 'pool', FakePool([False, False, True]))
+    monkeypatch.setattr(db, 'get_unfinished_collection_runs', get_unfinished_collection_runs)
+    monkeypatch.setattr(db, 'get_job_runs', get_job_runs)
+    monkeypatch.setattr(scheduler_module.metrics.leader, 'set', lambda value: None)
+
+    async def scenario():
+        cog = Scheduler(SimpleNamespace())
+        cog.leader.interval = 0.01
+
+        async def fetch_all_users_rank(backfill=False, server_id=None, resume_run=None, **kwargs):
+            resumed.append(resume_run['id'])
+
+        async def prerender_reports(report_date):
+            pass
+
+        cog.fetch_all_users_rank = fetch_all_users_rank
+        cog.prerender_reports = prerender_reports
+        try:
+            # Startup: another process holds the lock, so the global run is left alone
+            assert not await cog.leader.elect()
+            await cog.resume_collection_runs()
+            assert resumed == []
+
+            # The other leader dies; the election loop takes the lock and resumes its run
+            cog.leader.start()
+            for _ in range(100):
+                if resumed:
+                    break
+                await asyncio.sleep(0.01)
+            assert cog.leader.is_leader
+            assert resumed == [7]
+
+            # Holding the lock on later rounds doesn't resume again
+            await asyncio.sleep(0.05)
+            assert resumed == [7]
+        finally:
+            await cog.leader.stop()
+            cog.scheduler.shutdown(wait=False)
+
+    asyncio.run(scenario())